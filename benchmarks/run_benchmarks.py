@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""Bộ benchmark cho các đường huấn luyện và dự đoán của mô hình CNN.
+
+Các nhóm benchmark (mỗi nhóm chạy trong một tiến trình riêng để không ảnh
+hưởng lẫn nhau, kết quả là trung vị của nhiều lần đo):
+    data_loading   đọc batch pickle so với cache uint8 (memory-map)
+    augmentation   ImageDataGenerator.flow so với BatchAugmenter và tf.data
+    train_step     thời gian mỗi bước huấn luyện và ước lượng thời gian một epoch
+    predict        độ trễ model.predict với batch 1/32/256
+    cold_start     thời gian import TensorFlow, tải file .keras và dự đoán lần đầu
+
+Kết quả được ghi ra JSON. Nếu có file baseline, mỗi chỉ số được so sánh với
+baseline và bị đánh dấu hồi quy khi chậm hơn quá ngưỡng (mặc định 10%); khi đó
+script kết thúc với mã lỗi 1.
+
+Cách chạy (từ thư mục gốc của repo):
+    python benchmarks/run_benchmarks.py --save-baseline      # ghi benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py                       # so sánh với baseline
+    python benchmarks/run_benchmarks.py --only predict --repeats 10
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'src')
+sys.path.insert(0, SRC_DIR)
+
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+RESULTS_PATH = os.path.join(BENCHMARK_DIR, 'results.json')
+PREDICT_BATCH_SIZES = [1, 32, 256]
+
+
+def _median_time(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def _load_data(args):
+    """load_data với cache riêng khi dùng thư mục dữ liệu khác mặc định."""
+    import cifar10_local
+    cache_dir = cifar10_local.CACHE_DIR
+    if os.path.abspath(args.data_dir) != os.path.abspath(cifar10_local.DATA_DIR):
+        key = hashlib.md5(os.path.abspath(args.data_dir).encode('utf-8')).hexdigest()[:12]
+        cache_dir = os.path.join(tempfile.gettempdir(), 'cifar-10-cache-' + key)
+    return cifar10_local.load_data(args.data_dir, cache_dir)
+
+
+def bench_data_loading(args):
+    import cifar10_local
+
+    def load_pickle():
+        parts = [cifar10_local.load_batch(os.path.join(args.data_dir, name))
+                 for name in cifar10_local.TRAIN_BATCHES + cifar10_local.TEST_BATCHES]
+        return np.concatenate([images for images, _ in parts])
+
+    # Cache tạm (~180 MB) được xóa khi đo xong
+    with tempfile.TemporaryDirectory(prefix='cifar-cache-') as cache_dir:
+        build_s = _median_time(lambda: cifar10_local.build_cache(args.data_dir, cache_dir), 1)
+
+        def load_cached():
+            (x_train, _), (x_test, _) = cifar10_local.load_data(args.data_dir, cache_dir)
+            # Đọc hết dữ liệu để so sánh công bằng với pickle (memory-map chỉ đọc khi chạm tới)
+            return int(x_train.sum(dtype=np.uint64)) + int(x_test.sum(dtype=np.uint64))
+
+        return {'pickle_load_s': _median_time(load_pickle, args.repeats),
+                'cache_build_s': build_s,
+                'cached_load_s': _median_time(load_cached, args.repeats)}
+
+
+def bench_augmentation(args):
+    import tensorflow as tf
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    import input_pipeline
+    from augment_config import AUGMENT_CONFIG
+    from batch_augment import BatchAugmenter
+
+    (x_train, y_train), _ = _load_data(args)
+    y_train = tf.keras.utils.to_categorical(y_train, 10)
+    batch_size = 32
+    steps = args.steps
+
+    def images_per_sec(batches):
+        iterator = iter(batches)
+        next(iterator)
+        seconds = _median_time(lambda: [next(iterator) for _ in range(steps)], args.repeats)
+        return steps * batch_size / seconds
+
+    datagen = ImageDataGenerator(rescale=1. / 255, **AUGMENT_CONFIG)
+    return {
+        'datagen_images_per_sec': images_per_sec(datagen.flow(x_train, y_train, batch_size=batch_size)),
+        'batch_augmenter_images_per_sec': images_per_sec(
+            BatchAugmenter().flow(x_train, y_train, batch_size=batch_size)),
+        'tf_data_images_per_sec': images_per_sec(
+            input_pipeline.make_train_dataset(x_train, y_train, batch_size=batch_size).repeat()),
+    }
+
+
+def bench_train_step(args):
+    import tensorflow as tf
+
+    import cnn_model
+    import input_pipeline
+    from training import ThroughputLogger
+
+    (x_train, y_train), _ = _load_data(args)
+    y_train = tf.keras.utils.to_categorical(y_train, 10)
+    batch_size = 32
+    tf.keras.utils.set_random_seed(0)
+    model = cnn_model.compile_model(cnn_model.build_model(x_train.shape[1:], 10))
+    train_ds = input_pipeline.make_train_dataset(x_train, y_train, batch_size=batch_size, seed=0).repeat()
+    logger = ThroughputLogger(batch_size, verbose=False)
+    history = model.fit(train_ds, epochs=args.repeats, steps_per_epoch=args.steps,
+                        callbacks=[logger], verbose=0)
+    step_ms = float(np.median(history.history['step_time_ms']))
+    # Thời gian một epoch CIFAR-10 đầy đủ (50000 ảnh) ước lượng từ thời gian mỗi bước
+    return {'step_time_ms': step_ms,
+            'epoch_time_s': step_ms / 1000. * int(np.ceil(50000. / batch_size)),
+            'compile_time_s': history.history['compile_time_s'][0]}
+
+
+def bench_predict(args):
+    model = _load_model(args.model)
+    results = {}
+    for batch_size in PREDICT_BATCH_SIZES:
+        x = np.random.default_rng(0).random((batch_size, 32, 32, 3), dtype=np.float32)
+        model.predict(x, verbose=0)
+        results['predict_b%d_ms' % batch_size] = _median_time(
+            lambda: model.predict(x, verbose=0), args.repeats) * 1000.
+    return results
+
+
+def bench_cold_start(args):
+    # Chạy trong một tiến trình Python mới để đo đúng thời gian khởi động
+    code = ('import time; t0 = time.perf_counter(); import tensorflow as tf; t1 = time.perf_counter(); '
+            'm = tf.keras.models.load_model(%r); t2 = time.perf_counter(); '
+            'import numpy as np; m.predict(np.zeros((1, 32, 32, 3), "float32"), verbose=0); '
+            't3 = time.perf_counter(); print(t1 - t0, t2 - t1, t3 - t2)')
+    path = _model_file(args.model)
+    samples = []
+    for _ in range(args.repeats):
+        output = subprocess.run([sys.executable, '-c', code % path], check=True,
+                                capture_output=True, text=True).stdout
+        samples.append([float(v) for v in output.strip().splitlines()[-1].split()])
+    import_s, load_s, first_predict_s = np.median(samples, axis=0)
+    return {'import_tf_s': float(import_s), 'model_load_s': float(load_s),
+            'first_predict_s': float(first_predict_s),
+            'total_cold_start_s': float(import_s + load_s + first_predict_s)}
+
+
+BENCHMARKS = OrderedDict([
+    ('data_loading', bench_data_loading),
+    ('augmentation', bench_augmentation),
+    ('train_step', bench_train_step),
+    ('predict', bench_predict),
+    ('cold_start', bench_cold_start),
+])
+
+
+def _model_file(model_path):
+    """
+    Trả về file mô hình cần đo. Nếu chưa có mô hình đã huấn luyện, lưu một mô hình
+    mới cùng kiến trúc (cùng kích thước file và thời gian tải) vào thư mục tạm.
+    """
+    if os.path.isfile(model_path):
+        return model_path
+    import cnn_model
+    path = os.path.join(tempfile.gettempdir(), 'benchmark_cnn_model.keras')
+    cnn_model.compile_model(cnn_model.build_model()).save(path)
+    return path
+
+
+def _load_model(model_path):
+    import tensorflow as tf
+    return tf.keras.models.load_model(_model_file(model_path))
+
+
+def higher_is_better(metric):
+    return metric.endswith('_per_sec')
+
+
+def compare(results, baseline, threshold=0.10):
+    """
+    So sánh kết quả với baseline.
+    Returns:
+        Danh sách (benchmark, metric, baseline, hiện tại, thay đổi tương đối, hồi quy?).
+    """
+    rows = []
+    for name, metrics in results['results'].items():
+        for metric, value in metrics.items():
+            base = baseline.get('results', {}).get(name, {}).get(metric)
+            if base is None or base == 0:
+                continue
+            change = (value - base) / base
+            worse = -change if higher_is_better(metric) else change
+            rows.append((name, metric, base, value, change, worse > threshold))
+    return rows
+
+
+def run_all(names, args):
+    """Chạy từng nhóm benchmark trong một tiến trình con và gom kết quả."""
+    results = OrderedDict()
+    for name in names:
+        print('Đang chạy %s...' % name)
+        command = [sys.executable, os.path.abspath(__file__), '--child', name,
+                   '--repeats', str(args.repeats), '--steps', str(args.steps),
+                   '--data-dir', args.data_dir, '--model', args.model]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results[name] = json.loads(output.strip().splitlines()[-1])
+
+    import tensorflow as tf
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'tensorflow': tf.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeats': args.repeats,
+            'steps': args.steps,
+        },
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    import cifar10_local
+    from predictor import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Chỉ chạy các nhóm này')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--steps', type=int, default=20, help='Số bước/batch mỗi lần đo')
+    parser.add_argument('--data-dir', default=cifar10_local.DATA_DIR)
+    parser.add_argument('--model', default=os.path.join(os.path.dirname(SRC_DIR), MODEL_PATH))
+    parser.add_argument('--output', default=RESULTS_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='Ghi kết quả làm baseline mới')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Ngưỡng hồi quy (tỉ lệ)')
+    parser.add_argument('--child', choices=list(BENCHMARKS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(BENCHMARKS[args.child](args)))
+        sys.exit(0)
+
+    results = run_all(args.only or list(BENCHMARKS), args)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Kết quả: %s' % args.output)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Đã lưu baseline: %s' % args.baseline)
+        sys.exit(0)
+
+    if not os.path.isfile(args.baseline):
+        for name, metrics in results['results'].items():
+            for metric, value in metrics.items():
+                print('%-14s %-32s %12.4f' % (name, metric, value))
+        print('Chưa có baseline, chạy với --save-baseline để tạo.')
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline, args.threshold)
+    print('%-14s %-32s %12s %12s %9s' % ('Nhóm', 'Chỉ số', 'Baseline', 'Hiện tại', 'Thay đổi'))
+    for name, metric, base, value, change, regressed in rows:
+        print('%-14s %-32s %12.4f %12.4f %+8.1f%%%s' % (name, metric, base, value, 100. * change,
+                                                       '  HỒI QUY' if regressed else ''))
+    regressions = sum(1 for row in rows if row[-1])
+    if regressions:
+        print('%d chỉ số hồi quy quá %.0f%%.' % (regressions, 100. * args.threshold))
+        sys.exit(1)
+    print('Không có hồi quy.')
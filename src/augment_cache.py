@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""Tính trước N epoch ảnh tăng cường và lưu trên đĩa để các lần huấn luyện sau chỉ cần đọc lại.
+
+Với seed cố định, mỗi lần chạy `datagen.flow` / `BatchAugmenter` đều tính lại
+đúng những phép biến đổi affine giống nhau. Ở đây mỗi epoch được tạo một lần bằng
+`BatchAugmenter` (seed riêng cho từng epoch), làm tròn về uint8 và ghi thành file
+.npy memory-map theo thứ tự đã xáo trộn của epoch đó:
+    data/cifar-10-augmented/<khóa>/epoch-000.u8.npy, order-000.npy, ..., meta.json
+Khóa là hash của thông số tăng cường, seed, số epoch và nội dung x_train, nên khi
+thông số thay đổi thì khóa đổi theo và cache cũ (cùng dữ liệu và seed nhưng khác
+thông số) bị xóa. meta.json được ghi cuối cùng: có meta.json nghĩa là cache đã hoàn chỉnh.
+
+Khi huấn luyện, `make_cached_dataset` đọc tuần tự từng epoch (epoch thứ e dùng file
+e mod N), không tốn chi phí tăng cường nào; chỉ còn chuẩn hóa về [0, 1] theo batch.
+
+Cách chạy:
+    python augment_cache.py --epochs 10 --seed 0
+    python augment_cache.py --epochs 10 --seed 0 --report
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import cifar10_local
+import input_pipeline
+from augment_config import AUGMENT_CONFIG
+from batch_augment import BatchAugmenter
+from prediction_cache import hash_array
+
+CACHE_ROOT = os.path.join(os.path.dirname(cifar10_local.CACHE_DIR), 'cifar-10-augmented')
+FORMAT_VERSION = 1
+_META_FILE = 'meta.json'
+
+
+def cache_key(x, config=AUGMENT_CONFIG, seed=0, num_epochs=10, data_hash=None):
+    """Khóa của cache: hash của thông số tăng cường, seed, số epoch và dữ liệu."""
+    description = json.dumps({'version': FORMAT_VERSION, 'config': config, 'seed': seed, 'num_epochs': num_epochs,
+                              'data': data_hash or hash_array(x)}, sort_keys=True)
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()[:16]
+
+
+def _epoch_files(cache_dir, epoch):
+    return (os.path.join(cache_dir, 'epoch-%03d.u8.npy' % epoch),
+            os.path.join(cache_dir, 'order-%03d.npy' % epoch))
+
+
+def load_meta(cache_dir):
+    """Đọc meta.json của cache, None nếu cache chưa hoàn chỉnh."""
+    path = os.path.join(cache_dir, _META_FILE)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _remove_stale(root, config, data_hash, seed):
+    # Cache của cùng dữ liệu và seed nhưng khác thông số tăng cường là cache cũ; cache chỉ
+    # khác số epoch vẫn được giữ lại
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        meta = load_meta(path)
+        if meta and meta['data_hash'] == data_hash and meta['seed'] == seed and meta['config'] != config:
+            shutil.rmtree(path)
+
+
+def materialize(x, num_epochs=10, config=AUGMENT_CONFIG, seed=0, root=CACHE_ROOT, chunk_size=2048,
+                remove_stale=True, verbose=True):
+    """
+    Tạo cache N epoch tăng cường của x (nếu chưa có) và trả về thư mục cache.
+    Args:
+        x: Ảnh uint8 (N, H, W, C), ví dụ x_train memory-map.
+        num_epochs: Số epoch được tính trước.
+        config: Thông số tăng cường dữ liệu.
+        seed: Seed; epoch e dùng BatchAugmenter(seed=[seed, e]) và thứ tự xáo trộn riêng.
+        root: Thư mục chứa các cache.
+        chunk_size: Số ảnh được biến đổi mỗi lần (giới hạn bộ nhớ).
+        remove_stale: Xóa cache của cùng dữ liệu và seed nhưng khác thông số tăng cường.
+    Returns:
+        Đường dẫn thư mục cache.
+    """
+    data_hash = hash_array(x)
+    key = cache_key(x, config, seed, num_epochs, data_hash)
+    cache_dir = os.path.join(root, key)
+    if remove_stale:
+        # So sánh với config đọc từ meta.json nên đưa về cùng dạng JSON
+        _remove_stale(root, json.loads(json.dumps(config)), data_hash, seed)
+    if load_meta(cache_dir) is not None:
+        return cache_dir
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    start = time.perf_counter()
+    n = len(x)
+    for epoch in range(num_epochs):
+        images_path, order_path = _epoch_files(cache_dir, epoch)
+        augmenter = BatchAugmenter(config, seed=[seed, epoch])
+        order = augmenter.rng.permutation(n).astype(np.int32)
+        # Ghi vào file tạm rồi đổi tên, để tiến trình khác không đọc phải file ghi dở
+        images = np.lib.format.open_memmap(images_path + '.tmp', mode='w+', dtype=np.uint8, shape=x.shape)
+        for offset in range(0, n, chunk_size):
+            idx = order[offset:offset + chunk_size]
+            # Đọc theo thứ tự tăng dần rồi đặt lại đúng vị trí trong epoch
+            sorted_pos = np.argsort(idx)
+            batch = np.empty((len(idx),) + x.shape[1:], dtype=x.dtype)
+            batch[sorted_pos] = x[idx[sorted_pos]]
+            augmented = augmenter.random_transform_batch(batch)
+            images[offset:offset + len(idx)] = np.clip(np.rint(augmented), 0, 255).astype(np.uint8)
+        images.flush()
+        del images
+        os.replace(images_path + '.tmp', images_path)
+        with open(order_path + '.tmp', 'wb') as f:
+            np.save(f, order)
+        os.replace(order_path + '.tmp', order_path)
+        if verbose:
+            print('Epoch %d/%d đã được tính trước (%.1f s)' % (epoch + 1, num_epochs, time.perf_counter() - start))
+
+    meta = {'version': FORMAT_VERSION, 'config': config, 'seed': seed, 'num_epochs': num_epochs,
+            'num_samples': n, 'image_shape': list(x.shape[1:]), 'data_hash': data_hash,
+            'build_seconds': time.perf_counter() - start}
+    meta_tmp = os.path.join(cache_dir, _META_FILE + '.tmp')
+    with open(meta_tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_tmp, os.path.join(cache_dir, _META_FILE))
+    return cache_dir
+
+
+def cache_size_bytes(cache_dir):
+    return sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+
+
+def make_cached_dataset(cache_dir, y, batch_size=32, rescale=1. / 255, first_epoch=0):
+    """
+    Tạo tf.data.Dataset đọc các epoch đã tính trước, thay cho `make_train_dataset(augment=True)`.
+    Mỗi lần Keras duyệt lại dataset (mỗi epoch của model.fit) sẽ đọc file epoch tiếp theo,
+    quay vòng khi số epoch huấn luyện lớn hơn số epoch trong cache.
+    Args:
+        cache_dir: Thư mục trả về bởi `materialize`.
+        y: Nhãn theo thứ tự của x gốc (one-hot hoặc chỉ số lớp).
+        batch_size: Kích thước batch.
+        rescale: Hệ số chuẩn hóa áp dụng trên từng batch.
+        first_epoch: Epoch bắt đầu (ví dụ initial_epoch khi huấn luyện tiếp).
+    Returns:
+        tf.data.Dataset sinh ra các cặp (ảnh float32, nhãn) theo batch.
+    """
+    meta = load_meta(cache_dir)
+    if meta is None:
+        raise IOError('Cache chưa hoàn chỉnh: %s' % cache_dir)
+    y = np.asarray(y)
+    epochs = itertools.count(first_epoch)
+
+    def generate():
+        images_path, order_path = _epoch_files(cache_dir, next(epochs) % meta['num_epochs'])
+        images = np.load(images_path, mmap_mode='r')
+        labels = y[np.load(order_path)]
+        for start in range(0, len(images), batch_size):
+            # Ảnh đã nằm sẵn theo thứ tự xáo trộn của epoch: đọc tuần tự từng đoạn liền nhau
+            yield np.asarray(images[start:start + batch_size]), labels[start:start + batch_size]
+
+    ds = tf.data.Dataset.from_generator(generate, output_signature=(
+        tf.TensorSpec((None,) + tuple(meta['image_shape']), tf.uint8),
+        tf.TensorSpec((None,) + y.shape[1:], tf.as_dtype(y.dtype))))
+    ds = ds.map(lambda images, labels: (tf.cast(images, tf.float32) * rescale, labels),
+                num_parallel_calls=input_pipeline.AUTOTUNE)
+    return ds.prefetch(input_pipeline.AUTOTUNE)
+
+
+def _epoch_seconds(dataset, num_batches):
+    start = time.perf_counter()
+    for _ in dataset.take(num_batches):
+        pass
+    return time.perf_counter() - start
+
+
+def tradeoff_report(x, y, num_epochs=10, config=AUGMENT_CONFIG, seed=0, batch_size=32, root=CACHE_ROOT):
+    """
+    So sánh chi phí tạo cache (thời gian, dung lượng đĩa) với thời gian mỗi epoch khi tăng
+    cường trực tiếp (BatchAugmenter, tf.data) và khi đọc từ cache.
+    Returns:
+        dict các số đo, gồm số lần chạy cần thiết để hoàn vốn thời gian tạo cache.
+    """
+    cache_dir = materialize(x, num_epochs, config, seed, root, verbose=False)
+    meta = load_meta(cache_dir)
+    num_batches = int(np.ceil(len(x) / float(batch_size)))
+
+    generator = BatchAugmenter(config, seed=seed).flow(x, y, batch_size=batch_size)
+    start = time.perf_counter()
+    for _ in range(num_batches):
+        next(generator)
+    online = {'BatchAugmenter': time.perf_counter() - start}
+    online['tf.data augment'] = _epoch_seconds(
+        input_pipeline.make_train_dataset(x, y, batch_size=batch_size, seed=seed, config=config), num_batches)
+    # Lần đầu đọc epoch 0 từ đĩa vào page cache; lần đo tạo lại dataset để đọc lại đúng
+    # epoch 0 (mỗi lần duyệt một dataset sẽ chuyển sang file epoch tiếp theo)
+    _epoch_seconds(make_cached_dataset(cache_dir, y, batch_size), num_batches)
+    cached = _epoch_seconds(make_cached_dataset(cache_dir, y, batch_size), num_batches)
+
+    size = cache_size_bytes(cache_dir)
+    result = {'num_epochs': num_epochs, 'build_seconds': meta['build_seconds'], 'disk_bytes': size,
+              'cached_epoch_seconds': cached, 'online_epoch_seconds': online}
+    print('Tạo cache %d epoch: %.1f s, %.1f MB trên đĩa (%.1f MB/epoch)' % (
+        num_epochs, meta['build_seconds'], size / 1e6, size / 1e6 / num_epochs))
+    print('%-20s %12s %12s' % ('Nguồn dữ liệu', 's/epoch', 'ảnh/giây'))
+    for name, seconds in list(online.items()) + [('cache', cached)]:
+        print('%-20s %12.2f %12.1f' % (name, seconds, len(x) / seconds))
+    saved = online['BatchAugmenter'] - cached
+    if saved > 0:
+        # Một lần chạy duyệt hết num_epochs epoch của cache
+        result['break_even_runs'] = meta['build_seconds'] / (saved * num_epochs)
+        print('Tiết kiệm %.2f s/epoch so với BatchAugmenter; hoàn vốn sau %.2f lần chạy %d epoch' % (
+            saved, result['break_even_runs'], num_epochs))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--epochs', type=int, default=10, help='Số epoch được tính trước')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--root', default=CACHE_ROOT)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--report', action='store_true', help='In so sánh dung lượng đĩa / thời gian')
+    args = parser.parse_args()
+
+    (x_train, y_train), _ = cifar10_local.load_data()
+    y_train = tf.keras.utils.to_categorical(y_train, 10)
+    if args.report:
+        tradeoff_report(x_train, y_train, args.epochs, seed=args.seed, batch_size=args.batch_size, root=args.root)
+    else:
+        path = materialize(x_train, args.epochs, seed=args.seed, root=args.root)
+        print('Cache: %s (%.1f MB)' % (path, cache_size_bytes(path) / 1e6))
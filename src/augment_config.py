@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""Thông số tăng cường dữ liệu dùng chung.
+
+Giống với các tham số của `ImageDataGenerator` ở mục 3.2, để các pipeline
+khác (tf.data, NumPy) sinh ra cùng một phân phối biến đổi.
+"""
+
+AUGMENT_CONFIG = {
+    'rotation_range': 5,  # Xoay ngẫu nhiên trong khoảng 5 độ
+    'width_shift_range': 0.05,  # Dịch ngang ngẫu nhiên 5% chiều rộng ảnh
+    'height_shift_range': 0.05,  # Dịch dọc ngẫu nhiên 5% chiều cao ảnh
+    'shear_range': 0.05,  # Biến dạng hình học (độ)
+    'zoom_range': 0.05,  # Phóng to hoặc thu nhỏ ngẫu nhiên
+    'fill_mode': 'nearest',
+    'horizontal_flip': True,  # Lật ảnh theo chiều ngang
+}
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Tăng cường dữ liệu theo batch bằng NumPy.
+
+`datagen.random_transform` dựng và áp dụng một ma trận affine cho từng ảnh qua
+scipy. Ở đây tham số biến đổi của cả batch được sinh một lần, sau đó toàn bộ
+mảng (N, 32, 32, 3) được nội suy song tuyến bằng các phép gather vector hóa,
+cùng chế độ lấp biên 'nearest' và lật ngang như `ImageDataGenerator`.
+"""
+
+import time
+
+import numpy as np
+
+from augment_config import AUGMENT_CONFIG
+
+
+def sample_transforms(n, height, width, rng, config=AUGMENT_CONFIG):
+    """
+    Sinh ngẫu nhiên tham số biến đổi cho n ảnh, cùng phân phối với
+    `ImageDataGenerator.get_random_transform`.
+    Args:
+        n: Số ảnh.
+        height, width: Kích thước ảnh.
+        rng: np.random.Generator.
+        config: Thông số tăng cường dữ liệu.
+    Returns:
+        matrices: Mảng (n, 2, 3), ánh xạ tọa độ (x, y) của ảnh ra về ảnh vào.
+        flip: Mảng bool (n,) đánh dấu ảnh cần lật ngang.
+    """
+    theta = np.deg2rad(rng.uniform(-config['rotation_range'], config['rotation_range'], n))
+    tx = rng.uniform(-config['height_shift_range'], config['height_shift_range'], n) * height
+    ty = rng.uniform(-config['width_shift_range'], config['width_shift_range'], n) * width
+    shear = np.deg2rad(rng.uniform(-config['shear_range'], config['shear_range'], n))
+    zx = rng.uniform(1. - config['zoom_range'], 1. + config['zoom_range'], n)
+    zy = rng.uniform(1. - config['zoom_range'], 1. + config['zoom_range'], n)
+    if config['horizontal_flip']:
+        flip = rng.random(n) < 0.5
+    else:
+        flip = np.zeros(n, dtype=bool)
+
+    # M = rotation . shift . shear . zoom, khai triển sẵn cho từng phần tử
+    cos_t, sin_t = np.cos(theta), np.sin(theta)
+    cos_s, sin_s = np.cos(shear), np.sin(shear)
+    matrices = np.empty((n, 2, 3), dtype=np.float32)
+    matrices[:, 0, 0] = cos_t * zx
+    matrices[:, 0, 1] = (-cos_t * sin_s - sin_t * cos_s) * zy
+    matrices[:, 1, 0] = sin_t * zx
+    matrices[:, 1, 1] = (-sin_t * sin_s + cos_t * cos_s) * zy
+    m02 = cos_t * tx - sin_t * ty
+    m12 = sin_t * tx + cos_t * ty
+
+    # Đưa tâm ảnh về gốc tọa độ trước khi biến đổi (transform_matrix_offset_center)
+    o_x = height / 2. - 0.5
+    o_y = width / 2. - 0.5
+    matrices[:, 0, 2] = m02 + o_x - matrices[:, 0, 0] * o_x - matrices[:, 0, 1] * o_y
+    matrices[:, 1, 2] = m12 + o_y - matrices[:, 1, 0] * o_x - matrices[:, 1, 1] * o_y
+    return matrices, flip
+
+
+def apply_transforms(x, matrices, flip=None):
+    """
+    Áp dụng biến đổi affine (nội suy song tuyến, lấp biên 'nearest') cho cả batch.
+    Args:
+        x: Batch ảnh (N, H, W, C), uint8 hoặc float.
+        matrices: Mảng (N, 2, 3) từ `sample_transforms`.
+        flip: Mảng bool (N,) hoặc None.
+    Returns:
+        Batch ảnh float32 (N, H, W, C).
+    """
+    x = np.asarray(x)
+    n, height, width, channels = x.shape
+    rows, cols = np.meshgrid(np.arange(height, dtype=np.float32),
+                             np.arange(width, dtype=np.float32), indexing='ij')
+    # Tọa độ điểm lấy mẫu trên ảnh vào cho mọi điểm ảnh ra: (N, H, W)
+    src_x = (matrices[:, 0, 0, None, None] * cols + matrices[:, 0, 1, None, None] * rows
+             + matrices[:, 0, 2, None, None])
+    src_y = (matrices[:, 1, 0, None, None] * cols + matrices[:, 1, 1, None, None] * rows
+             + matrices[:, 1, 2, None, None])
+    # Chế độ 'nearest': kẹp tọa độ vào trong ảnh tương đương lặp lại điểm ảnh biên
+    np.clip(src_x, 0, width - 1, out=src_x)
+    np.clip(src_y, 0, height - 1, out=src_y)
+
+    x0 = np.floor(src_x)
+    y0 = np.floor(src_y)
+    wx = src_x - x0
+    wy = src_y - y0
+    x0 = x0.astype(np.int32)
+    y0 = y0.astype(np.int32)
+    x1 = np.minimum(x0 + 1, width - 1)
+    y1 = np.minimum(y0 + 1, height - 1)
+
+    # Chỉ số phẳng và trọng số của 4 điểm lân cận, dùng chung cho mọi kênh màu
+    base = (np.arange(n, dtype=np.int32) * (height * width))[:, None, None]
+    corners = [
+        (base + y0 * width + x0, (1. - wx) * (1. - wy)),
+        (base + y0 * width + x1, wx * (1. - wy)),
+        (base + y1 * width + x0, (1. - wx) * wy),
+        (base + y1 * width + x1, wx * wy),
+    ]
+
+    # Gather trên từng mặt phẳng kênh liền mạch (np.take 1 chiều nhanh hơn
+    # fancy indexing theo hàng (N*H*W, C))
+    planes = np.moveaxis(np.asarray(x, dtype=np.float32), -1, 0).reshape(channels, -1)
+    out = np.empty((n, height, width, channels), dtype=np.float32)
+    for c in range(channels):
+        plane = planes[c]
+        index, weight = corners[0]
+        value = plane.take(index) * weight
+        for index, weight in corners[1:]:
+            value += plane.take(index) * weight
+        out[..., c] = value
+
+    if flip is not None and flip.any():
+        out[flip] = out[flip, :, ::-1]
+    return out
+
+
+class BatchAugmenter(object):
+    """
+    Thay thế `ImageDataGenerator` cho tăng cường dữ liệu theo batch.
+    Args:
+        config: Thông số tăng cường dữ liệu.
+        seed: Seed cho bộ sinh số ngẫu nhiên, None để ngẫu nhiên.
+    """
+
+    def __init__(self, config=AUGMENT_CONFIG, seed=None):
+        if config.get('fill_mode', 'nearest') != 'nearest':
+            raise ValueError("Chỉ hỗ trợ fill_mode='nearest'.")
+        self.config = config
+        self.rng = np.random.default_rng(seed)
+
+    def random_transform_batch(self, x):
+        """Biến đổi ngẫu nhiên một batch ảnh (N, H, W, C), trả về float32."""
+        matrices, flip = sample_transforms(len(x), x.shape[1], x.shape[2], self.rng, self.config)
+        return apply_transforms(np.asarray(x), matrices, flip)
+
+    def flow(self, x, y, batch_size=32, shuffle=True):
+        """
+        Sinh vô hạn các batch (ảnh đã biến đổi, nhãn), giống `datagen.flow`.
+        """
+        n = len(x)
+        while True:
+            order = self.rng.permutation(n) if shuffle else np.arange(n)
+            for start in range(0, n, batch_size):
+                # Sắp xếp chỉ số để đọc mảng (có thể là memory-map) theo thứ tự
+                idx = np.sort(order[start:start + batch_size])
+                yield self.random_transform_batch(x[idx]), y[idx]
+
+
+def benchmark(x, num_images=2048, batch_size=256):
+    """
+    So sánh tốc độ và thống kê đầu ra (trung bình, độ lệch chuẩn theo kênh)
+    giữa `datagen.random_transform` và `BatchAugmenter`.
+    Returns:
+        dict tên -> (ảnh/giây, trung bình theo kênh, độ lệch chuẩn theo kênh).
+    """
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    x = np.asarray(x[:num_images], dtype=np.float32)
+    datagen = ImageDataGenerator(**AUGMENT_CONFIG)
+    start = time.perf_counter()
+    reference = np.stack([datagen.random_transform(img) for img in x])
+    datagen_speed = len(x) / (time.perf_counter() - start)
+
+    augmenter = BatchAugmenter(seed=0)
+    start = time.perf_counter()
+    batched = np.concatenate([augmenter.random_transform_batch(x[i:i + batch_size])
+                              for i in range(0, len(x), batch_size)])
+    batch_speed = len(x) / (time.perf_counter() - start)
+
+    results = {
+        'datagen.random_transform': (datagen_speed, reference.mean(axis=(0, 1, 2)),
+                                     reference.std(axis=(0, 1, 2))),
+        'BatchAugmenter': (batch_speed, batched.mean(axis=(0, 1, 2)), batched.std(axis=(0, 1, 2))),
+    }
+    for name, (speed, mean, std) in results.items():
+        print('%-25s %10.1f ảnh/giây  mean=%s  std=%s' % (
+            name, speed, np.round(mean, 4), np.round(std, 4)))
+    return results
+
+
+if __name__ == '__main__':
+    import cifar10_local
+
+    (x_train, _), _ = cifar10_local.load_data()
+    benchmark(x_train.astype('float32') / 255)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Dự đoán hàng loạt cho thư mục ảnh hoặc danh sách file.
+
+`predict_image` giải mã và resize từng ảnh trên luồng gọi. Ở đây:
+- ảnh JPEG được giải mã bằng draft mode của PIL (giải mã DCT ở 1/2, 1/4, 1/8
+  độ phân giải) nên ảnh lớn giải mã nhanh hơn nhiều lần;
+- giải mã và resize chạy song song trong thread pool (hoặc process pool);
+- ảnh được đưa vào mô hình theo batch kích thước cố định (Predictor);
+- kết quả được ghi dần ra CSV (hoặc Parquet nếu có pyarrow) sau mỗi batch.
+Chỉ có tối đa `prefetch` batch đang được giải mã cùng lúc nên bộ nhớ không phụ
+thuộc vào số lượng ảnh.
+
+Cách chạy:
+    python bulk_predict.py thu_muc_anh/ --output ket_qua.csv
+    python bulk_predict.py danh_sach.txt --output ket_qua.parquet --processes
+"""
+
+import argparse
+import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from image_io import IMAGE_EXTENSIONS, load_image_array
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Cùng đường dẫn với predictor.MODEL_PATH; predictor (và TensorFlow) chỉ được import khi cần
+# Predictor, nên list_images / decode_batches dùng được mà không cần TensorFlow
+MODEL_PATH = os.path.join('saved_models', 'keras_cifar10_trained_model.keras')
+
+
+def list_images(source):
+    """
+    Danh sách file ảnh: duyệt đệ quy nếu source là thư mục, hoặc đọc manifest
+    (mỗi dòng một đường dẫn, tương đối so với thư mục của manifest).
+    """
+    if os.path.isdir(source):
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(dirpath, name)
+    else:
+        root = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            for line in f:
+                path = line.strip()
+                if path and not path.startswith('#'):
+                    yield os.path.join(root, path)
+
+
+def _decode(path, size):
+    # Hàm cấp module để dùng được với process pool
+    try:
+        return load_image_array(path, size, draft=True), None
+    except Exception as e:
+        # Mọi lỗi của bộ giải mã (file hỏng, DecompressionBombError, ...) chỉ được ghi cho file đó
+        return None, '%s: %s' % (type(e).__name__, e)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def decode_batches(paths, batch_size=256, size=(32, 32), executor=None, prefetch=2):
+    """
+    Giải mã song song và trả về lần lượt từng batch.
+    Yields:
+        (paths, images, errors): ảnh uint8 của các file giải mã được và dict path -> lỗi.
+    """
+    pending = deque()
+    chunks = _chunks(paths, batch_size)
+
+    def submit():
+        chunk = next(chunks, None)
+        if chunk is not None:
+            pending.append((chunk, [executor.submit(_decode, path, size) for path in chunk]))
+
+    for _ in range(prefetch):
+        submit()
+    while pending:
+        chunk, futures = pending.popleft()
+        submit()
+        good_paths, images, errors = [], [], {}
+        for path, future in zip(chunk, futures):
+            image, error = future.result()
+            if error is None:
+                good_paths.append(path)
+                images.append(image)
+            else:
+                errors[path] = error
+        images = np.stack(images) if images else np.zeros((0, size[1], size[0], 3), dtype=np.uint8)
+        yield good_paths, images, errors
+
+
+class ResultWriter(object):
+    """
+    Ghi kết quả dự đoán theo từng batch ra CSV hoặc Parquet (theo phần mở rộng của file).
+    Cột: path, label, name, confidence, error.
+    """
+
+    COLUMNS = ['path', 'label', 'name', 'confidence', 'error']
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        if self.parquet:
+            if pyarrow is None:
+                raise ImportError('Cần cài đặt pyarrow để ghi Parquet.')
+            self._schema = pyarrow.schema([('path', pyarrow.string()), ('label', pyarrow.int32()),
+                                           ('name', pyarrow.string()), ('confidence', pyarrow.float32()),
+                                           ('error', pyarrow.string())])
+            self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+        else:
+            self._file = open(path, 'w', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.COLUMNS)
+
+    def write(self, rows):
+        """Ghi một batch các bộ (path, label, name, confidence, error)."""
+        if self.parquet:
+            columns = list(zip(*rows)) if rows else [[] for _ in self.COLUMNS]
+            table = pyarrow.Table.from_arrays([pyarrow.array(column, type=field.type)
+                                               for column, field in zip(columns, self._schema)],
+                                              schema=self._schema)
+            self._writer.write_table(table)
+        else:
+            self._writer.writerows(rows)
+            self._file.flush()
+
+    def close(self):
+        if self.parquet:
+            self._writer.close()
+        else:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def bulk_predict(source, output, model_path=MODEL_PATH, batch_size=256, num_workers=None,
+                 processes=False, prefetch=2, predictor=None):
+    """
+    Dự đoán mọi ảnh trong thư mục/manifest `source` và ghi ra `output`.
+    Args:
+        source: Thư mục ảnh hoặc file manifest.
+        output: File .csv hoặc .parquet.
+        model_path: Đường dẫn mô hình (khi không truyền predictor).
+        batch_size: Kích thước batch giải mã và dự đoán.
+        num_workers: Số luồng/tiến trình giải mã (mặc định bằng số lõi CPU).
+        processes: Dùng process pool thay cho thread pool.
+        prefetch: Số batch được giải mã trước.
+        predictor: Predictor đã khởi tạo.
+    Returns:
+        dict gồm số ảnh, số lỗi, thời gian và số ảnh/giây.
+    """
+    own_predictor = predictor is None
+    if own_predictor:
+        from predictor import Predictor
+        predictor = Predictor(model_path, batch_size=batch_size)
+    size = (predictor.input_shape[1], predictor.input_shape[0])
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    count = failed = 0
+    start = time.perf_counter()
+    try:
+        with pool(num_workers or os.cpu_count()) as executor, ResultWriter(output) as writer:
+            for paths, images, errors in decode_batches(list_images(source), batch_size, size,
+                                                        executor, prefetch):
+                rows = [(path, None, None, None, error) for path, error in errors.items()]
+                if len(images):
+                    probs = predictor.predict_proba(images)
+                    indices = np.argmax(probs, axis=1)
+                    confidences = probs[np.arange(len(indices)), indices]
+                    rows.extend((path, int(i), predictor.labels[i], float(c), None)
+                                for path, i, c in zip(paths, indices, confidences))
+                writer.write(rows)
+                count += len(paths)
+                failed += len(errors)
+    finally:
+        if own_predictor:
+            predictor.close()
+    elapsed = time.perf_counter() - start
+    result = {'images': count, 'errors': failed, 'seconds': elapsed,
+              'images_per_sec': count / elapsed if elapsed else 0.}
+    print('Đã dự đoán %d ảnh (%d lỗi) trong %.1f s: %.1f ảnh/giây -> %s' % (
+        count, failed, elapsed, result['images_per_sec'], output))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='Thư mục ảnh hoặc file manifest')
+    parser.add_argument('--output', required=True, help='File kết quả .csv hoặc .parquet')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--processes', action='store_true', help='Giải mã bằng process pool')
+    args = parser.parse_args()
+
+    bulk_predict(args.source, args.output, args.model, args.batch_size, args.workers, args.processes)
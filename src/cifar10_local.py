@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Đọc tập dữ liệu CIFAR-10 trực tiếp từ thư mục `data/cifar-10-batches-py`.
+
+Thay cho `cifar10.load_data()` (tải lại file nén ở mỗi lần chạy):
+- Lần đầu: giải nén các batch pickle (data_batch_1..5, test_batch) thành một
+  file ảnh uint8 liền mạch (.npy) cùng một mảng nhãn.
+- Các lần sau: mở lại file đó bằng memory-map, gần như tức thời và các tiến
+  trình (worker) dùng chung trang bộ nhớ của hệ điều hành thay vì mỗi tiến
+  trình giữ một bản sao float32 riêng.
+"""
+
+import json
+import os
+import pickle
+
+import numpy as np
+
+# Danh sách các lớp (nhãn)
+LABELS = ['Airplane', 'Automobile', 'Bird', 'Cat', 'Deer', 'Dog', 'Frog', 'Horse', 'Ship', 'Truck']
+
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(_ROOT_DIR, 'data', 'cifar-10-batches-py')
+CACHE_DIR = os.path.join(_ROOT_DIR, 'data', 'cifar-10-cache')
+
+TRAIN_BATCHES = ['data_batch_%d' % i for i in range(1, 6)]
+TEST_BATCHES = ['test_batch']
+
+_IMAGES_FILE = 'images.u8.npy'
+_LABELS_FILE = 'labels.u8.npy'
+_META_FILE = 'meta.json'
+
+
+def load_batch(path):
+    """
+    Đọc một batch pickle của CIFAR-10.
+    Returns:
+        images: Mảng uint8 (N, 32, 32, 3).
+        labels: Mảng uint8 (N,).
+    """
+    with open(path, 'rb') as f:
+        batch = pickle.load(f, encoding='bytes')
+    data = batch[b'data']
+    labels = batch[b'labels']
+    # Dữ liệu gốc lưu theo thứ tự (N, 3, 32, 32), chuyển về (N, 32, 32, 3) như Keras
+    images = np.asarray(data, dtype=np.uint8).reshape(-1, 3, 32, 32).transpose(0, 2, 3, 1)
+    return images, np.asarray(labels, dtype=np.uint8)
+
+
+def load_label_names(data_dir=DATA_DIR):
+    """Đọc tên lớp từ batches.meta (chữ thường, ví dụ 'airplane')."""
+    with open(os.path.join(data_dir, 'batches.meta'), 'rb') as f:
+        meta = pickle.load(f, encoding='bytes')
+    return [name.decode('utf-8') for name in meta[b'label_names']]
+
+
+def _cache_is_valid(cache_dir):
+    return all(os.path.isfile(os.path.join(cache_dir, name))
+               for name in (_IMAGES_FILE, _LABELS_FILE, _META_FILE))
+
+
+def build_cache(data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    Chuyển các batch pickle thành file cache uint8 dùng cho memory-map.
+    Ảnh train và test được ghi liền nhau trong cùng một file; meta.json lưu
+    số lượng mẫu của từng phần.
+    Args:
+        data_dir: Thư mục chứa các batch pickle.
+        cache_dir: Thư mục ghi file cache.
+    Returns:
+        Đường dẫn thư mục cache.
+    """
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    batches = TRAIN_BATCHES + TEST_BATCHES
+    parts = [load_batch(os.path.join(data_dir, name)) for name in batches]
+    sizes = [len(labels) for _, labels in parts]
+    total = sum(sizes)
+
+    # Ghi vào file tạm rồi đổi tên, để tiến trình khác không đọc phải file ghi dở
+    images_tmp = os.path.join(cache_dir, _IMAGES_FILE + '.tmp')
+    labels_tmp = os.path.join(cache_dir, _LABELS_FILE + '.tmp')
+    images = np.lib.format.open_memmap(images_tmp, mode='w+', dtype=np.uint8,
+                                       shape=(total, 32, 32, 3))
+    labels = np.empty((total,), dtype=np.uint8)
+    offset = 0
+    for (batch_images, batch_labels), size in zip(parts, sizes):
+        images[offset:offset + size] = batch_images
+        labels[offset:offset + size] = batch_labels
+        offset += size
+    images.flush()
+    del images
+    with open(labels_tmp, 'wb') as f:
+        np.save(f, labels)
+
+    num_train = sum(sizes[:len(TRAIN_BATCHES)])
+    meta = {'num_train': num_train, 'num_test': total - num_train}
+    meta_tmp = os.path.join(cache_dir, _META_FILE + '.tmp')
+    with open(meta_tmp, 'w') as f:
+        json.dump(meta, f)
+
+    os.replace(images_tmp, os.path.join(cache_dir, _IMAGES_FILE))
+    os.replace(labels_tmp, os.path.join(cache_dir, _LABELS_FILE))
+    # meta.json được ghi cuối cùng: có meta.json nghĩa là cache đã hoàn chỉnh
+    os.replace(meta_tmp, os.path.join(cache_dir, _META_FILE))
+    return cache_dir
+
+
+def load_data(data_dir=DATA_DIR, cache_dir=CACHE_DIR, mmap=True):
+    """
+    Tải CIFAR-10 từ thư mục cục bộ, cùng định dạng với `cifar10.load_data()`.
+    Args:
+        data_dir: Thư mục chứa các batch pickle.
+        cache_dir: Thư mục cache uint8, được tạo ở lần gọi đầu tiên.
+        mmap: True để mở ảnh ở chế độ memory-map chỉ đọc; False để đọc hẳn vào RAM.
+    Returns:
+        (x_train, y_train), (x_test, y_test): Ảnh uint8 (N, 32, 32, 3) và nhãn uint8 (N, 1).
+    """
+    if not _cache_is_valid(cache_dir):
+        build_cache(data_dir, cache_dir)
+
+    with open(os.path.join(cache_dir, _META_FILE)) as f:
+        meta = json.load(f)
+    images = np.load(os.path.join(cache_dir, _IMAGES_FILE), mmap_mode='r' if mmap else None)
+    labels = np.load(os.path.join(cache_dir, _LABELS_FILE)).reshape(-1, 1)
+
+    num_train = meta['num_train']
+    x_train, x_test = images[:num_train], images[num_train:]
+    y_train, y_test = labels[:num_train], labels[num_train:]
+    return (x_train, y_train), (x_test, y_test)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Phân loại nhanh một vài ảnh bằng mô hình đã lưu (thay cho mục 5.5 của notebook).
+
+Chỉ import những gì cần để dự đoán: NumPy, PIL và backend của mô hình. TensorFlow
+chỉ được import khi dùng file .keras; với `--tflite`, mô hình chạy trên
+interpreter TFLite nhẹ (ai-edge-litert hoặc tflite-runtime, xem tflite_runner.py)
+nên thời gian từ lúc khởi động tới dự đoán đầu tiên chỉ còn dưới một giây.
+
+Cách chạy:
+    python classify.py anh1.jpg anh2.png
+    python classify.py anh1.jpg --tflite --timing
+    python classify.py anh1.jpg --tflite saved_models/tflite/cifar10_cnn_int8.tflite
+"""
+
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import os
+
+import numpy as np
+
+from cifar10_local import LABELS
+from image_io import load_image_array
+
+# Cùng đường dẫn với predictor.MODEL_PATH và các file do tflite_export.py xuất ra
+MODEL_PATH = os.path.join('saved_models', 'keras_cifar10_trained_model.keras')
+TFLITE_MODEL_PATH = os.path.join('saved_models', 'tflite', 'cifar10_cnn_float32.tflite')
+
+
+def load_classifier(model_path=MODEL_PATH, tflite_path=None, num_threads=None):
+    """
+    Tải mô hình và trả về hàm nhận ảnh uint8 (N, 32, 32, 3), trả về xác suất (N, số lớp).
+    Args:
+        model_path: File .keras (khi không dùng TFLite).
+        tflite_path: File .tflite; nếu có thì dùng interpreter TFLite.
+        num_threads: Số luồng của interpreter TFLite.
+    """
+    if tflite_path:
+        from tflite_runner import TFLiteRunner
+        runner = TFLiteRunner(tflite_path, num_threads)
+        return runner.predict_proba
+
+    import tensorflow as tf
+    model = tf.keras.models.load_model(model_path, compile=False)
+
+    def predict_proba(images):
+        return model(images.astype(np.float32) / 255., training=False).numpy()
+    return predict_proba
+
+
+def classify(paths, model_path=MODEL_PATH, tflite_path=None, num_threads=None, labels=LABELS):
+    """
+    Dự đoán lớp cho danh sách file ảnh.
+    Returns:
+        (danh sách (đường dẫn, tên lớp, xác suất), dict thời gian từng giai đoạn tính bằng giây).
+    """
+    timings = {'import': time.perf_counter() - _START}
+    start = time.perf_counter()
+    predict_proba = load_classifier(model_path, tflite_path, num_threads)
+    timings['load_model'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    images = np.stack([load_image_array(path) for path in paths])
+    timings['decode'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    probs = predict_proba(images)
+    timings['predict'] = time.perf_counter() - start
+    timings['time_to_first_prediction'] = time.perf_counter() - _START
+
+    indices = np.argmax(probs, axis=1)
+    results = [(path, labels[i], float(probs[n, i])) for n, (path, i) in enumerate(zip(paths, indices))]
+    return results, timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--model', default=MODEL_PATH, help='File .keras')
+    parser.add_argument('--tflite', nargs='?', const=TFLITE_MODEL_PATH,
+                        help='Dùng interpreter TFLite (mặc định %s)' % TFLITE_MODEL_PATH)
+    parser.add_argument('--threads', type=int)
+    parser.add_argument('--timing', action='store_true', help='In thời gian từng giai đoạn')
+    args = parser.parse_args()
+
+    results, timings = classify(args.images, args.model, args.tflite, args.threads)
+    for path, name, confidence in results:
+        print('%s: %s (%.2f%%)' % (path, name, confidence * 100))
+    if args.timing:
+        for stage, seconds in timings.items():
+            print('%-26s %8.3f s' % (stage, seconds))
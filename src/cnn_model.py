@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Kiến trúc mô hình CNN của mục 3, dùng chung cho notebook và các script khác."""
+
+import tensorflow as tf
+from tensorflow.keras.models import Sequential
+from tensorflow.keras.layers import Dense, Dropout, Activation, Flatten, BatchNormalization
+from tensorflow.keras.layers import Conv2D, MaxPooling2D, SeparableConv2D, GlobalAveragePooling2D
+from tensorflow.keras.regularizers import l2
+
+
+# Số filter của 6 lớp Conv2D (2 lớp mỗi block) và số nơ-ron của lớp kết nối đầy đủ
+FILTERS = (32, 64, 64, 128, 128, 256)
+DENSE_UNITS = 512
+
+
+def build_model(input_shape=(32, 32, 3), num_classes=10, filters=FILTERS, dense_units=DENSE_UNITS,
+                weight_decay=0.001, conv_dropout=0.25, dense_dropout=0.4):
+    """
+    Xây dựng mô hình CNN: 3 block Conv-BN-ReLU, lớp kết nối đầy đủ 512 và lớp softmax.
+    Args:
+        input_shape: Kích thước ảnh đầu vào.
+        num_classes: Số lớp.
+        filters: Số filter của 6 lớp Conv2D (mặc định là kiến trúc gốc).
+        dense_units: Số nơ-ron của lớp Dense ẩn.
+        weight_decay: Hệ số l2 của kernel các lớp Conv2D/Dense ẩn.
+        conv_dropout: Tỉ lệ Dropout sau mỗi block Conv.
+        dense_dropout: Tỉ lệ Dropout sau lớp Dense ẩn.
+    Returns:
+        Mô hình Sequential (chưa compile).
+    """
+    model = Sequential()
+
+    # Block 1
+    model.add(Conv2D(filters[0], (3, 3), padding='same', kernel_regularizer=l2(weight_decay),
+                     input_shape=input_shape))
+    model.add(BatchNormalization())
+    model.add(Activation('relu'))
+    model.add(Conv2D(filters[1], (3, 3), kernel_regularizer=l2(weight_decay)))
+    model.add(BatchNormalization())
+    model.add(Activation('relu'))
+    model.add(MaxPooling2D(pool_size=(2, 2)))
+    model.add(Dropout(conv_dropout))
+
+    # Block 2
+    model.add(Conv2D(filters[2], (3, 3), padding='same', kernel_regularizer=l2(weight_decay)))
+    model.add(BatchNormalization())
+    model.add(Activation('relu'))
+    model.add(Conv2D(filters[3], (3, 3), kernel_regularizer=l2(weight_decay)))
+    model.add(BatchNormalization())
+    model.add(Activation('relu'))
+    model.add(MaxPooling2D(pool_size=(2, 2)))
+    model.add(Dropout(conv_dropout))
+
+    # Block 3
+    model.add(Conv2D(filters[4], (3, 3), padding='same', kernel_regularizer=l2(weight_decay)))
+    model.add(BatchNormalization())
+    model.add(Activation('relu'))
+    model.add(Conv2D(filters[5], (3, 3), kernel_regularizer=l2(weight_decay)))
+    model.add(BatchNormalization())
+    model.add(Activation('relu'))
+    model.add(MaxPooling2D(pool_size=(2, 2)))
+    model.add(Dropout(conv_dropout))
+
+    # Fully Connected Layer
+    model.add(Flatten())
+    model.add(Dense(dense_units, kernel_regularizer=l2(weight_decay)))
+    model.add(BatchNormalization())
+    model.add(Activation('relu'))
+    model.add(Dropout(dense_dropout))
+
+    # Output Layer (softmax luôn tính bằng float32 để ổn định khi dùng mixed precision)
+    model.add(Dense(num_classes, activation='softmax', dtype='float32'))
+    return model
+
+
+def build_student(input_shape=(32, 32, 3), num_classes=10, filters=(32, 64, 128), separable=True,
+                  global_pool=True, dense_units=256):
+    """
+    Mô hình nhỏ (student) dùng cho distillation, cùng dạng block Conv-BN-ReLU x2 + MaxPooling.
+    Args:
+        input_shape: Kích thước ảnh đầu vào.
+        num_classes: Số lớp.
+        filters: Số filter của từng block.
+        separable: Dùng SeparableConv2D (depthwise + pointwise) cho các lớp conv, trừ lớp đầu tiên.
+        global_pool: Dùng GlobalAveragePooling2D thay cho Flatten + Dense(dense_units).
+        dense_units: Số nơ-ron của lớp Dense ẩn khi global_pool=False.
+    Returns:
+        Mô hình Sequential (chưa compile).
+    """
+    model = Sequential()
+    first = True
+    for block_filters in filters:
+        for _ in range(2):
+            if first:
+                model.add(Conv2D(block_filters, (3, 3), padding='same', kernel_regularizer=l2(0.001),
+                                 input_shape=input_shape))
+                first = False
+            elif separable:
+                model.add(SeparableConv2D(block_filters, (3, 3), padding='same',
+                                          pointwise_regularizer=l2(0.001)))
+            else:
+                model.add(Conv2D(block_filters, (3, 3), padding='same', kernel_regularizer=l2(0.001)))
+            model.add(BatchNormalization())
+            model.add(Activation('relu'))
+        model.add(MaxPooling2D(pool_size=(2, 2)))
+
+    if global_pool:
+        model.add(GlobalAveragePooling2D())
+    else:
+        model.add(Flatten())
+        model.add(Dense(dense_units, kernel_regularizer=l2(0.001)))
+        model.add(BatchNormalization())
+        model.add(Activation('relu'))
+    model.add(Dropout(0.25))
+    model.add(Dense(num_classes, activation='softmax', dtype='float32'))
+    return model
+
+
+def compile_model(model, learning_rate=0.0001, jit_compile=False, loss_scale=False):
+    """
+    Compile mô hình với RMSprop và categorical crossentropy như mục 3.1.
+    Args:
+        model: Mô hình cần compile.
+        learning_rate: Tốc độ học của RMSprop.
+        jit_compile: Biên dịch bước huấn luyện bằng XLA.
+        loss_scale: Bọc optimizer bằng LossScaleOptimizer (cần cho mixed_float16).
+    Returns:
+        Mô hình đã compile.
+    """
+    opt = tf.keras.optimizers.RMSprop(learning_rate=learning_rate)
+    if loss_scale:
+        opt = tf.keras.mixed_precision.LossScaleOptimizer(opt)
+    model.compile(loss='categorical_crossentropy',
+                  optimizer=opt,
+                  metrics=['accuracy'],
+                  jit_compile=jit_compile)
+    return model
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Huấn luyện mô hình nhỏ (student) bằng knowledge distillation từ mô hình đã huấn luyện (teacher).
+
+Teacher là `keras_cifar10_trained_model.keras` (6 lớp Conv2D + Dense(512)); student
+được xây dựng bằng `cnn_model.build_student`: ít filter hơn, SeparableConv2D và
+GlobalAveragePooling2D thay cho Flatten + Dense(512).
+1. Logits của teacher trên tập huấn luyện được tính một lần và lưu vào
+   saved_models/distill/ (khóa theo hash của file mô hình và của dữ liệu), các
+   lần chạy sau chỉ đọc lại file .npy.
+2. Student học trên nhãn ghép [one-hot, logits teacher] với hàm mất mát
+   alpha * CE(nhãn thật) + (1 - alpha) * T^2 * KL(softmax(teacher / T) || softmax(student / T)).
+3. Báo cáo so sánh số tham số, FLOPs, độ trễ CPU và độ chính xác của teacher và student.
+Logits được tính trên ảnh gốc nên student học không tăng cường dữ liệu (ảnh tăng
+cường sẽ không khớp với logits đã lưu).
+
+Cách chạy:
+    python distillation.py --epochs 20 --temperature 4 --alpha 0.1
+    python distillation.py --filters 16 32 64 --no-separable
+"""
+
+import argparse
+import os
+
+import numpy as np
+import tensorflow as tf
+
+import cnn_model
+import input_pipeline
+from channel_slimming import count_flops, latency_ms
+from predictor import MODEL_PATH
+from prediction_cache import hash_array, hash_file
+
+DISTILL_DIR = os.path.join('saved_models', 'distill')
+STUDENT_PATH = os.path.join('saved_models', 'keras_cifar10_student.keras')
+EPSILON = 1e-7
+
+
+def teacher_logits(teacher_path, x, cache_dir=DISTILL_DIR, batch_size=256):
+    """
+    Logits của teacher cho ảnh x, tính một lần rồi lưu vào cache_dir.
+    Mô hình kết thúc bằng softmax nên logits được lấy lại bằng log(xác suất); hai cách
+    chỉ khác nhau một hằng số trên mỗi ảnh nên softmax(logits / T) không đổi.
+    Returns:
+        Mảng float32 (N, số lớp).
+    """
+    key = '%s-%s' % (hash_file(teacher_path)[:16], hash_array(x)[:16])
+    path = os.path.join(cache_dir, 'teacher_logits-%s.npy' % key)
+    if os.path.exists(path):
+        return np.load(path)
+
+    teacher = tf.keras.models.load_model(teacher_path, compile=False)
+    probs = teacher.predict(input_pipeline.make_eval_dataset(x, batch_size=batch_size), verbose=0)
+    logits = np.log(np.clip(probs, EPSILON, 1.)).astype(np.float32)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    tmp_path = path + '.tmp.npy'
+    np.save(tmp_path, logits)
+    os.replace(tmp_path, path)
+    return logits
+
+
+def distillation_loss(num_classes, temperature=4., alpha=0.1):
+    """
+    Hàm mất mát cho nhãn ghép y_true = [one-hot, logits teacher] và đầu ra softmax của student.
+    Args:
+        num_classes: Số lớp (độ dài phần one-hot).
+        temperature: Nhiệt độ T làm mềm phân phối của teacher và student.
+        alpha: Trọng số của cross-entropy với nhãn thật.
+    """
+    def loss(y_true, y_pred):
+        labels, logits = y_true[:, :num_classes], y_true[:, num_classes:]
+        log_probs = tf.math.log(tf.clip_by_value(y_pred, EPSILON, 1.))
+        hard = -tf.reduce_sum(labels * log_probs, axis=-1)
+        soft_teacher = tf.nn.softmax(logits / temperature)
+        log_soft_student = tf.nn.log_softmax(log_probs / temperature)
+        kl = tf.reduce_sum(soft_teacher * (tf.math.log(soft_teacher + EPSILON) - log_soft_student), axis=-1)
+        return alpha * hard + (1. - alpha) * temperature ** 2 * kl
+    return loss
+
+
+def distillation_accuracy(num_classes):
+    """Độ chính xác theo phần one-hot của nhãn ghép."""
+    def accuracy(y_true, y_pred):
+        return tf.cast(tf.equal(tf.argmax(y_true[:, :num_classes], -1), tf.argmax(y_pred, -1)), tf.float32)
+    return accuracy
+
+
+def distill(teacher_path, x_train, y_train, student=None, epochs=20, batch_size=64, temperature=4.,
+            alpha=0.1, learning_rate=0.001, validation_data=None, cache_dir=DISTILL_DIR, verbose=2):
+    """
+    Huấn luyện student từ logits của teacher.
+    Args:
+        teacher_path: File .keras của teacher.
+        x_train, y_train: Ảnh uint8 và nhãn one-hot.
+        student: Mô hình student chưa compile (mặc định `cnn_model.build_student()`).
+        epochs: Số epoch.
+        temperature, alpha: Xem `distillation_loss`.
+        learning_rate: Learning rate của RMSprop.
+        validation_data: (x, y one-hot) để theo dõi độ chính xác.
+        cache_dir: Thư mục cache logits của teacher.
+    Returns:
+        (student đã compile lại bằng `cnn_model.compile_model`, History).
+    """
+    num_classes = y_train.shape[-1]
+    if student is None:
+        student = cnn_model.build_student(x_train.shape[1:], num_classes)
+    logits = teacher_logits(teacher_path, x_train, cache_dir)
+    targets = np.concatenate([np.asarray(y_train, np.float32), logits], axis=1)
+
+    student.compile(loss=distillation_loss(num_classes, temperature, alpha),
+                    optimizer=tf.keras.optimizers.RMSprop(learning_rate=learning_rate),
+                    metrics=[distillation_accuracy(num_classes)])
+    train_ds = input_pipeline.make_train_dataset(x_train, targets, batch_size=batch_size, augment=False)
+    val_ds = None
+    if validation_data is not None:
+        x_val, y_val = validation_data
+        # Chỉ dùng để theo dõi val_accuracy: không tính logits teacher cho tập validation
+        val_targets = np.concatenate([np.asarray(y_val, np.float32),
+                                      np.zeros((len(y_val), num_classes), np.float32)], axis=1)
+        val_ds = input_pipeline.make_eval_dataset(x_val, val_targets)
+    history = student.fit(train_ds, epochs=epochs, validation_data=val_ds, verbose=verbose)
+
+    # Compile lại với hàm mất mát chuẩn để lưu/tải mô hình không cần custom_objects
+    return cnn_model.compile_model(student, learning_rate=learning_rate), history
+
+
+def compare(teacher, student, x_test, y_test):
+    """
+    In và trả về bảng so sánh teacher / student: tham số, MFLOPs, độ trễ CPU (b=1, b=64), độ chính xác.
+    """
+    import evaluation
+
+    rows = []
+    for name, model in (('teacher', teacher), ('student', student)):
+        rows.append({'name': name, 'params': int(model.count_params()), 'flops': count_flops(model),
+                     'latency_b1_ms': latency_ms(model, 1), 'latency_b64_ms': latency_ms(model, 64, repeats=20),
+                     'accuracy': evaluation.evaluate_model(model, x_test, y_test).accuracy})
+
+    print('%-8s %10s %10s %10s %10s %10s' % ('Mô hình', 'Tham số', 'MFLOPs', 'ms (b=1)', 'ms (b=64)', 'accuracy'))
+    for row in rows:
+        print('%-8s %10d %10.1f %10.2f %10.2f %10.4f' % (row['name'], row['params'], row['flops'] / 1e6,
+                                                          row['latency_b1_ms'], row['latency_b64_ms'],
+                                                          row['accuracy']))
+    teacher_row, student_row = rows
+    print('Student: %.1fx ít tham số, %.1fx ít FLOPs, nhanh hơn %.1fx (b=1), độ chính xác %+.4f' % (
+        teacher_row['params'] / float(student_row['params']), teacher_row['flops'] / float(student_row['flops']),
+        teacher_row['latency_b1_ms'] / student_row['latency_b1_ms'],
+        student_row['accuracy'] - teacher_row['accuracy']))
+    return rows
+
+
+if __name__ == '__main__':
+    import cifar10_local
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--teacher', default=MODEL_PATH)
+    parser.add_argument('--output', default=STUDENT_PATH)
+    parser.add_argument('--filters', type=int, nargs='+', default=[32, 64, 128], help='Số filter của từng block')
+    parser.add_argument('--no-separable', action='store_true', help='Dùng Conv2D thường thay cho SeparableConv2D')
+    parser.add_argument('--flatten', action='store_true', help='Dùng Flatten + Dense thay cho GlobalAveragePooling2D')
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--temperature', type=float, default=4.)
+    parser.add_argument('--alpha', type=float, default=0.1)
+    parser.add_argument('--lr', type=float, default=0.001)
+    args = parser.parse_args()
+
+    (x_train, y_train), (x_test, y_test) = cifar10_local.load_data()
+    y_train = tf.keras.utils.to_categorical(y_train, 10)
+    y_test = tf.keras.utils.to_categorical(y_test, 10)
+    student = cnn_model.build_student(x_train.shape[1:], 10, tuple(args.filters),
+                                      separable=not args.no_separable, global_pool=not args.flatten)
+    student, _ = distill(args.teacher, x_train, y_train, student, args.epochs, args.batch_size,
+                         args.temperature, args.alpha, args.lr, validation_data=(x_test, y_test))
+    student.save(args.output)
+    print('Đã lưu student tại %s' % args.output)
+    compare(tf.keras.models.load_model(args.teacher), student, x_test, y_test)
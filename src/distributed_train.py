@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""Huấn luyện song song dữ liệu trên nhiều tiến trình CPU (một hoặc nhiều máy).
+
+Dùng `tf.distribute.MultiWorkerMirroredStrategy`: mỗi worker là một tiến trình,
+giữ một bản sao mô hình của mục 3 và đồng bộ gradient bằng all-reduce. Mỗi
+worker chỉ đọc phần dữ liệu của mình (shard theo chỉ số worker) với batch
+cục bộ cố định; tốc độ học được nhân theo batch toàn cục:
+    lr = 0.0001 * global_batch / 32
+
+Chạy một worker trong cụm nhiều máy (cùng danh sách host trên mọi máy):
+    python distributed_train.py --worker-hosts m1:12345,m2:12345 --worker-index 0
+
+Đo hiệu suất mở rộng trên máy hiện tại với 1, 2, 4, 8 worker:
+    python distributed_train.py --scaling --steps 50
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+BASE_LEARNING_RATE = 0.0001
+BASE_BATCH_SIZE = 32
+
+
+def _free_ports(count):
+    sockets = [socket.socket() for _ in range(count)]
+    for s in sockets:
+        s.bind(('localhost', 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def train_worker(worker_hosts, worker_index, epochs=1, per_worker_batch=32, steps_per_epoch=None,
+                 augment=True, threads=None):
+    """
+    Chạy một worker. Cần được gọi trong một tiến trình riêng cho mỗi worker.
+    Args:
+        worker_hosts: Danh sách 'host:port' của mọi worker.
+        worker_index: Chỉ số của worker này.
+        epochs: Số epoch.
+        per_worker_batch: Kích thước batch trên mỗi worker.
+        steps_per_epoch: Số bước mỗi epoch (None để chạy hết phần dữ liệu của worker).
+        augment: Bật tăng cường dữ liệu.
+        threads: Số luồng tính toán của TensorFlow trong tiến trình này.
+    Returns:
+        dict lịch sử huấn luyện (loss, accuracy, step_time_ms, images_per_sec, test_accuracy).
+    """
+    # TF_CONFIG phải có trước khi khởi tạo strategy
+    os.environ['TF_CONFIG'] = json.dumps({
+        'cluster': {'worker': list(worker_hosts)},
+        'task': {'type': 'worker', 'index': worker_index},
+    })
+    import tensorflow as tf
+    import cifar10_local
+    import cnn_model
+    import input_pipeline
+    from training import ThroughputLogger
+
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+    num_workers = len(worker_hosts)
+    strategy = tf.distribute.MultiWorkerMirroredStrategy()
+    global_batch = per_worker_batch * strategy.num_replicas_in_sync
+    learning_rate = BASE_LEARNING_RATE * global_batch / BASE_BATCH_SIZE
+
+    (x_train, y_train), (x_test, y_test) = cifar10_local.load_data()
+    y_train = tf.keras.utils.to_categorical(y_train, 10)
+    y_test = tf.keras.utils.to_categorical(y_test, 10)
+
+    # Shard theo worker: mỗi worker chỉ đọc 1/N dữ liệu. Dataset được batch theo batch
+    # toàn cục và tắt auto-shard; strategy chia lại thành batch cục bộ per_worker_batch.
+    train_ds = input_pipeline.make_train_dataset(
+        x_train[worker_index::num_workers], y_train[worker_index::num_workers],
+        batch_size=global_batch, augment=augment, seed=worker_index).repeat()
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+    train_ds = train_ds.with_options(options)
+    if steps_per_epoch is None:
+        steps_per_epoch = len(x_train) // global_batch
+
+    with strategy.scope():
+        model = cnn_model.build_model(x_train.shape[1:], 10)
+        optimizer = tf.keras.optimizers.RMSprop(learning_rate=learning_rate)
+        loss_fn = tf.keras.losses.CategoricalCrossentropy(reduction='none')
+        train_accuracy = tf.keras.metrics.CategoricalAccuracy()
+
+    def step_fn(images, labels):
+        with tf.GradientTape() as tape:
+            predictions = model(images, training=True)
+            # Chia cho batch toàn cục để tổng gradient sau all-reduce đúng bằng trung bình
+            loss = tf.nn.compute_average_loss(loss_fn(labels, predictions), global_batch_size=global_batch)
+            loss += tf.nn.scale_regularization_loss(tf.add_n(model.losses))
+        gradients = tape.gradient(loss, model.trainable_variables)
+        optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+        train_accuracy.update_state(labels, predictions)
+        return loss
+
+    @tf.function
+    def train_step(iterator):
+        losses = strategy.run(step_fn, args=next(iterator))
+        return strategy.reduce(tf.distribute.ReduceOp.SUM, losses, axis=None)
+
+    # Vòng lặp huấn luyện riêng thay cho model.fit: Keras 3 không nhận batch PerReplica
+    # của MultiWorkerMirroredStrategy khi có nhiều worker
+    iterator = iter(strategy.experimental_distribute_dataset(train_ds))
+    logger = ThroughputLogger(global_batch, verbose=worker_index == 0)
+    history = {'loss': [], 'accuracy': [], 'step_time_ms': [], 'images_per_sec': []}
+    logger.on_train_begin()
+    for epoch in range(epochs):
+        logger.on_epoch_begin(epoch)
+        train_accuracy.reset_state()
+        total_loss = 0.
+        for step in range(steps_per_epoch):
+            logger.on_train_batch_begin(step)
+            total_loss += float(train_step(iterator))
+            logger.on_train_batch_end(step)
+        logs = {'loss': total_loss / steps_per_epoch, 'accuracy': float(train_accuracy.result())}
+        logger.on_epoch_end(epoch, logs)
+        for key in history:
+            history[key].append(logs.get(key))
+
+    # Đánh giá cục bộ trên tập test (trọng số giống nhau trên mọi worker)
+    correct = 0
+    for images, labels in input_pipeline.make_eval_dataset(x_test, y_test):
+        predictions = model(images, training=False)
+        correct += int(tf.reduce_sum(tf.cast(
+            tf.equal(tf.argmax(predictions, 1), tf.argmax(labels, 1)), tf.int32)))
+    history['test_accuracy'] = [correct / float(len(x_test))]
+    if worker_index == 0:
+        print('Worker: %d, batch toàn cục: %d, learning rate: %g, test accuracy: %.4f' % (
+            num_workers, global_batch, learning_rate, history['test_accuracy'][0]))
+    return history
+
+
+def run_local_cluster(num_workers, steps=50, per_worker_batch=32):
+    """
+    Khởi chạy num_workers tiến trình trên localhost và trả về số ảnh/giây toàn cục
+    (đo ở worker 0, bỏ qua bước đầu tiên chứa thời gian khởi tạo).
+    """
+    ports = _free_ports(num_workers)
+    hosts = ','.join('localhost:%d' % port for port in ports)
+    threads = max(1, (os.cpu_count() or 1) // num_workers)
+    processes = []
+    for index in range(num_workers):
+        command = [sys.executable, __file__, '--worker-hosts', hosts, '--worker-index', str(index),
+                   '--steps', str(steps), '--per-worker-batch', str(per_worker_batch),
+                   '--threads', str(threads), '--json']
+        processes.append(subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                          text=True))
+    outputs = [process.communicate()[0] for process in processes]
+    for process in processes:
+        if process.returncode != 0:
+            raise RuntimeError('Worker kết thúc với mã lỗi %d' % process.returncode)
+    return json.loads(outputs[0].strip().splitlines()[-1])['images_per_sec']
+
+
+def scaling_report(worker_counts=(1, 2, 4, 8), steps=50, per_worker_batch=32):
+    """
+    Đo thông lượng với số worker khác nhau (batch cục bộ cố định) và hiệu suất mở rộng
+        efficiency(n) = throughput(n) / (n * throughput(1)).
+    Returns:
+        dict số worker -> (ảnh/giây, hiệu suất).
+    """
+    results = {}
+    baseline = None
+    for num_workers in worker_counts:
+        start = time.perf_counter()
+        speed = run_local_cluster(num_workers, steps, per_worker_batch)
+        if baseline is None:
+            baseline = speed / worker_counts[0]
+        results[num_workers] = (speed, speed / (num_workers * baseline))
+        print('%d worker: %.1f ảnh/giây, hiệu suất %.1f%% (%.1f s)' % (
+            num_workers, speed, results[num_workers][1] * 100., time.perf_counter() - start))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--worker-hosts', help="Danh sách 'host:port' phân cách bằng dấu phẩy")
+    parser.add_argument('--worker-index', type=int, default=0)
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--steps', type=int, help='Số bước mỗi epoch')
+    parser.add_argument('--per-worker-batch', type=int, default=32)
+    parser.add_argument('--threads', type=int)
+    parser.add_argument('--scaling', action='store_true', help='Đo hiệu suất mở rộng 1/2/4/8 worker')
+    parser.add_argument('--json', action='store_true', help='In kết quả dạng JSON (dùng nội bộ)')
+    args = parser.parse_args()
+
+    if args.scaling:
+        scaling_report(steps=args.steps or 50, per_worker_batch=args.per_worker_batch)
+    else:
+        hosts = args.worker_hosts.split(',') if args.worker_hosts else ['localhost:%d' % _free_ports(1)[0]]
+        history = train_worker(hosts, args.worker_index, args.epochs, args.per_worker_batch,
+                               args.steps, threads=args.threads)
+        if args.json:
+            print(json.dumps({'images_per_sec': history['images_per_sec'][-1]}))
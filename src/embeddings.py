@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""Trích xuất embedding 512 chiều và tìm ảnh tương tự / ảnh trùng bằng chỉ mục láng giềng gần đúng.
+
+Embedding là đầu ra của khối Dense(512) -> BatchNormalization -> ReLU (ngay trước
+Dropout và lớp softmax). `export_embeddings` chạy mô hình theo batch và ghi dần
+embedding ra một file .npy float16 memory-map (N, 512), nên bộ nhớ không phụ thuộc
+vào số lượng ảnh; với thư mục ảnh, danh sách đường dẫn được ghi kèm (<file>.paths.txt).
+
+`IVFIndex` là chỉ mục inverted file viết bằng NumPy: các vector (chuẩn hóa L2, so
+sánh bằng cosine) được chia vào nlist cụm k-means; mỗi truy vấn chỉ so sánh với
+các vector thuộc nprobe cụm có tâm gần nhất thay vì toàn bộ tập dữ liệu. Vector
+được đọc theo từng đoạn và lưu dạng float16 theo thứ tự cụm (tùy chọn trong file
+.npy memory-map), nên chỉ mục không cần bản sao float32 của cả tập embedding.
+
+Cách chạy:
+    python embeddings.py export thu_muc_anh/ --output saved_models/embeddings/anh.f16.npy
+    python embeddings.py export cifar --output saved_models/embeddings/cifar_train.f16.npy
+    python embeddings.py benchmark saved_models/embeddings/cifar_train.f16.npy --nlist 128 --nprobe 1 4 16
+    python embeddings.py duplicates saved_models/embeddings/anh.f16.npy --threshold 0.98
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+EMBEDDING_DIR = os.path.join('saved_models', 'embeddings')
+
+
+def embedding_model(model):
+    """
+    Mô hình con trả về đầu vào của lớp softmax: đầu ra của lớp cuối cùng trước lớp đầu ra
+    (bỏ qua Dropout). Với mô hình gốc đó là ReLU sau Dense(512) / BatchNormalization; với
+    mô hình đã gộp bằng fold_batchnorm là chính lớp Dense(512, activation='relu').
+    """
+    import tensorflow as tf
+    from tensorflow.keras.layers import Dropout
+
+    hidden = [layer for layer in model.layers[:-1] if not isinstance(layer, Dropout)]
+    if not hidden or len(hidden[-1].output.shape) != 2:
+        raise ValueError('Mô hình không có lớp ẩn dạng vector ngay trước lớp đầu ra.')
+    return tf.keras.Model(model.inputs, hidden[-1].output)
+
+
+def _image_batches(source, batch_size, size):
+    # Ảnh từ mảng uint8 (N, H, W, C) hoặc từ thư mục/manifest (giải mã song song như bulk_predict)
+    if isinstance(source, np.ndarray):
+        for start in range(0, len(source), batch_size):
+            yield None, np.asarray(source[start:start + batch_size])
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+    from bulk_predict import decode_batches, list_images
+
+    with ThreadPoolExecutor(os.cpu_count()) as executor:
+        for paths, images, errors in decode_batches(list_images(source), batch_size, size, executor):
+            for path, error in errors.items():
+                print('Bỏ qua %s: %s' % (path, error))
+            yield paths, images
+
+
+def export_embeddings(model, source, output, batch_size=256):
+    """
+    Ghi embedding của mọi ảnh ra file .npy float16 (N, D) memory-map.
+    Args:
+        model: Mô hình phân loại đã tải.
+        source: Mảng ảnh uint8 (N, H, W, C), thư mục ảnh hoặc file manifest.
+        output: Đường dẫn file .npy.
+        batch_size: Kích thước batch.
+    Returns:
+        Mảng embedding float16 memory-map chỉ đọc.
+    """
+    import tensorflow as tf
+
+    model = embedding_model(model)
+    forward = tf.function(lambda images: model(tf.cast(images, tf.float32) / 255., training=False))
+    size = (model.input_shape[2], model.input_shape[1])
+    dim = model.output_shape[-1]
+    directory = os.path.dirname(output)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    # Số ảnh chưa biết trước với thư mục: ghi từng khối vào file thô rồi đóng gói thành .npy
+    raw_path = output + '.tmp'
+    count = 0
+    paths = []
+    with open(raw_path, 'wb') as f:
+        for batch_paths, images in _image_batches(source, batch_size, size):
+            if not len(images):
+                continue
+            f.write(forward(images).numpy().astype(np.float16).tobytes())
+            count += len(images)
+            if batch_paths is not None:
+                paths.extend(batch_paths)
+
+    npy_tmp = output + '.tmp.npy'
+    embeddings = np.lib.format.open_memmap(npy_tmp, mode='w+', dtype=np.float16, shape=(count, dim))
+    raw = np.memmap(raw_path, dtype=np.float16, mode='r', shape=(count, dim)) if count else None
+    for start in range(0, count, 65536):
+        embeddings[start:start + 65536] = raw[start:start + 65536]
+    embeddings.flush()
+    del embeddings, raw
+    os.remove(raw_path)
+    if paths:
+        with open(output + '.paths.txt.tmp', 'w') as f:
+            f.write(''.join(path + '\n' for path in paths))
+        os.replace(output + '.paths.txt.tmp', output + '.paths.txt')
+    os.replace(npy_tmp, output)
+    return load_embeddings(output)
+
+
+def load_embeddings(path):
+    """Mở file embedding ở chế độ memory-map chỉ đọc."""
+    return np.load(path, mmap_mode='r')
+
+
+def normalize(vectors, chunk_size=65536):
+    """Chuẩn hóa L2 từng hàng thành float32 (đọc theo từng đoạn nên dùng được với memmap float16)."""
+    out = np.empty(vectors.shape, dtype=np.float32)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        out[start:start + chunk_size] = chunk / np.maximum(norms, 1e-12)
+    return out
+
+
+def _top_k(scores, k):
+    # Chỉ số k giá trị lớn nhất của từng hàng, xếp giảm dần
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def brute_force_search(vectors, queries, k=10, chunk_size=16384):
+    """
+    Tìm chính xác k láng giềng gần nhất (cosine) bằng nhân ma trận theo từng khối vector.
+    Args:
+        vectors: Mảng (N, D) chưa chuẩn hóa (ví dụ memmap float16); mỗi khối được chuẩn hóa khi đọc.
+        queries: Mảng (Q, D) đã chuẩn hóa bằng `normalize`.
+    Returns:
+        (chỉ số (Q, k), độ tương đồng (Q, k)).
+    """
+    indices = np.zeros((len(queries), 0), dtype=np.int64)
+    scores = np.zeros((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(vectors), chunk_size):
+        sims = queries @ normalize(vectors[start:start + chunk_size]).T
+        top = _top_k(sims, k)
+        # Gộp top-k của khối này với top-k của các khối trước
+        indices = np.concatenate([indices, start + top], axis=1)
+        scores = np.concatenate([scores, np.take_along_axis(sims, top, axis=1)], axis=1)
+        best = _top_k(scores, k)
+        indices, scores = np.take_along_axis(indices, best, axis=1), np.take_along_axis(scores, best, axis=1)
+    return indices, scores
+
+
+def kmeans(vectors, num_clusters, iterations=20, sample_size=65536, seed=0):
+    """
+    K-means (cosine) trên một mẫu ngẫu nhiên của vectors, khởi tạo bằng các điểm ngẫu nhiên.
+    Returns:
+        Tâm cụm float32 (num_clusters, D), đã chuẩn hóa L2.
+    """
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    num_clusters = min(num_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), num_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=num_clusters)
+        empty = counts == 0
+        # Cụm rỗng nhận một điểm ngẫu nhiên mới
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex(object):
+    """
+    Chỉ mục inverted file (IVF) cho tìm kiếm cosine gần đúng.
+    Các vector đã chuẩn hóa được lưu dạng float16 theo thứ tự cụm (trong bộ nhớ hoặc trong
+    file .npy memory-map) và chỉ được chuyển sang float32 từng cụm một khi tìm kiếm.
+    Args:
+        nlist: Số cụm k-means.
+        nprobe: Số cụm gần nhất được duyệt cho mỗi truy vấn (nhiều hơn: chính xác hơn, chậm hơn).
+    """
+
+    def __init__(self, nlist=128, nprobe=8):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self.vectors = None  # vector đã chuẩn hóa (float16), xếp theo cụm
+        self.ids = None  # chỉ số gốc của từng vector trong self.vectors
+        self.offsets = None  # cụm c gồm self.vectors[offsets[c]:offsets[c + 1]]
+
+    def build(self, vectors, iterations=20, seed=0, sample_size=65536, path=None, chunk_size=65536):
+        """
+        Huấn luyện k-means và chia các vector (float16/float32, chưa chuẩn hóa) vào từng cụm.
+        Vector được đọc và chuẩn hóa theo từng đoạn nên dùng được với memmap lớn hơn RAM.
+        Args:
+            sample_size: Số vector ngẫu nhiên dùng để huấn luyện k-means.
+            path: Nếu có, vector xếp theo cụm được ghi vào file .npy này (memory-map)
+                thay vì giữ trong bộ nhớ.
+        """
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))
+        self.centroids = kmeans(normalize(vectors[sample]), self.nlist, iterations, sample_size, seed)
+        self.nlist = len(self.centroids)
+        assignment = np.concatenate([np.argmax(normalize(vectors[start:start + chunk_size]) @ self.centroids.T,
+                                               axis=1) for start in range(0, len(vectors), chunk_size)])
+        self.ids = np.argsort(assignment, kind='stable').astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=self.nlist))])
+
+        shape = (len(vectors), vectors.shape[1])
+        if path:
+            self.vectors = np.lib.format.open_memmap(path + '.tmp.npy', mode='w+', dtype=np.float16, shape=shape)
+        else:
+            self.vectors = np.empty(shape, dtype=np.float16)
+        for start in range(0, len(self.ids), chunk_size):
+            self.vectors[start:start + chunk_size] = normalize(vectors[self.ids[start:start + chunk_size]])
+        if path:
+            self.vectors.flush()
+            del self.vectors
+            os.replace(path + '.tmp.npy', path)
+            self.vectors = np.load(path, mmap_mode='r')
+        return self
+
+    def _cluster(self, cluster):
+        # Vector float32 của một cụm
+        return np.asarray(self.vectors[self.offsets[cluster]:self.offsets[cluster + 1]], dtype=np.float32)
+
+    def _probe(self, queries, nprobe):
+        """
+        Duyệt theo cụm thay vì theo truy vấn: mọi truy vấn cùng duyệt một cụm được tính bằng một
+        phép nhân ma trận.
+        Yields:
+            (cluster, rows, slots, sims): chỉ số truy vấn, thứ tự của cụm trong các cụm được duyệt
+            của truy vấn đó và độ tương đồng (len(rows), số vector của cụm).
+        """
+        probes = _top_k(queries @ self.centroids.T, nprobe)
+        flat = probes.ravel()
+        order = np.argsort(flat, kind='stable')
+        clusters, starts = np.unique(flat[order], return_index=True)
+        for cluster, group in zip(clusters, np.split(order, starts[1:])):
+            if self.offsets[cluster] == self.offsets[cluster + 1]:
+                continue
+            rows, slots = np.divmod(group, nprobe)
+            yield cluster, rows, slots, queries[rows] @ self._cluster(cluster).T
+
+    def search(self, queries, k=10, nprobe=None, normalized=False):
+        """
+        Tìm k vector gần nhất cho từng truy vấn.
+        Returns:
+            (chỉ số gốc (Q, k), độ tương đồng cosine (Q, k)); thiếu ứng viên thì chỉ số là -1.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = np.asarray(queries, dtype=np.float32) if normalized else normalize(queries)
+        # top-k của mỗi cụm được ghi vào ô riêng của truy vấn rồi gộp lại
+        candidate_ids = np.full((len(queries), nprobe * k), -1, dtype=np.int64)
+        candidate_scores = np.full((len(queries), nprobe * k), -np.inf, dtype=np.float32)
+        for cluster, rows, slots, sims in self._probe(queries, nprobe):
+            top = _top_k(sims, k)
+            columns = slots[:, None] * k + np.arange(top.shape[1])
+            candidate_scores[rows[:, None], columns] = np.take_along_axis(sims, top, axis=1)
+            candidate_ids[rows[:, None], columns] = self.ids[self.offsets[cluster] + top]
+        best = _top_k(candidate_scores, k)
+        scores = np.take_along_axis(candidate_scores, best, axis=1)
+        indices = np.where(np.isfinite(scores), np.take_along_axis(candidate_ids, best, axis=1), -1)
+        return indices, scores
+
+    def range_search(self, queries, threshold, nprobe=None, normalized=False):
+        """
+        Tìm mọi vector có độ tương đồng >= threshold trong các cụm được duyệt của từng truy vấn.
+        Returns:
+            (chỉ số truy vấn, chỉ số gốc, độ tương đồng) dạng ba mảng cùng độ dài.
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = np.asarray(queries, dtype=np.float32) if normalized else normalize(queries)
+        found_rows, found_ids, found_scores = [], [], []
+        for cluster, rows, _, sims in self._probe(queries, nprobe):
+            hit_rows, hit_columns = np.nonzero(sims >= threshold)
+            found_rows.append(rows[hit_rows])
+            found_ids.append(self.ids[self.offsets[cluster] + hit_columns])
+            found_scores.append(sims[hit_rows, hit_columns])
+        if not found_rows:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.float32)
+        return np.concatenate(found_rows), np.concatenate(found_ids), np.concatenate(found_scores)
+
+    def save(self, path):
+        """
+        Ghi chỉ mục ra file .npz. Nếu vector nằm trong file .npy (build với path), chỉ đường
+        dẫn của file đó được lưu và `load` mở lại bằng memory-map.
+        """
+        tmp_path = path + '.tmp.npz'
+        if isinstance(self.vectors, np.memmap):
+            vectors = {'vectors_path': os.path.abspath(self.vectors.filename)}
+        else:
+            vectors = {'vectors': self.vectors}
+        np.savez(tmp_path, centroids=self.centroids, ids=self.ids, offsets=self.offsets, nprobe=self.nprobe,
+                 **vectors)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        index = cls(len(data['centroids']), int(data['nprobe']))
+        index.centroids, index.ids, index.offsets = data['centroids'], data['ids'], data['offsets']
+        if 'vectors_path' in data:
+            index.vectors = np.load(str(data['vectors_path']), mmap_mode='r')
+        else:
+            index.vectors = data['vectors']
+        return index
+
+
+def find_duplicates(index, threshold=0.98, nprobe=None, chunk_size=1024):
+    """
+    Tìm các cặp ảnh gần như trùng nhau (cosine >= threshold) bằng cách truy vấn chính các vector
+    trong chỉ mục, theo thứ tự cụm (từng khối chunk_size vector). Mọi ứng viên vượt ngưỡng trong
+    các cụm được duyệt đều được giữ, nên nhóm nhiều ảnh trùng nhau không bị mất cặp.
+    Returns:
+        Danh sách (i, j, độ tương đồng) với i < j, xếp theo độ tương đồng giảm dần.
+    """
+    pairs = {}
+    for start in range(0, len(index.ids), chunk_size):
+        queries = np.asarray(index.vectors[start:start + chunk_size], dtype=np.float32)
+        rows, found, scores = index.range_search(queries, threshold, nprobe, normalized=True)
+        for i, j, score in zip(index.ids[start + rows], found, scores):
+            if i != j:
+                pairs[(int(min(i, j)), int(max(i, j)))] = float(score)
+    return sorted(((i, j, s) for (i, j), s in pairs.items()), key=lambda item: -item[2])
+
+
+def benchmark(embeddings, nlist=128, nprobes=(1, 4, 16), k=10, num_queries=1000, seed=0):
+    """
+    So sánh IVFIndex với tìm kiếm vét cạn: recall@k và số truy vấn/giây.
+    Truy vấn là num_queries vector ngẫu nhiên của chính tập dữ liệu.
+    Returns:
+        Danh sách dict: method, nprobe, recall, queries_per_sec.
+    """
+    rng = np.random.default_rng(seed)
+    queries = normalize(embeddings[np.sort(rng.choice(len(embeddings), min(num_queries, len(embeddings)),
+                                                      replace=False))])
+
+    start = time.perf_counter()
+    index = IVFIndex(nlist).build(embeddings, seed=seed)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact, _ = brute_force_search(embeddings, queries, k)
+    rows = [{'method': 'vét cạn', 'nprobe': None, 'recall': 1.,
+             'queries_per_sec': len(queries) / (time.perf_counter() - start)}]
+    for nprobe in nprobes:
+        start = time.perf_counter()
+        found, _ = index.search(queries, k, nprobe, normalized=True)
+        elapsed = time.perf_counter() - start
+        recall = np.mean([len(np.intersect1d(a, b)) / float(k) for a, b in zip(found, exact)])
+        rows.append({'method': 'IVF', 'nprobe': nprobe, 'recall': float(recall),
+                     'queries_per_sec': len(queries) / elapsed})
+
+    print('%d vector x %d chiều, IVF nlist=%d (xây dựng %.1f s), %d truy vấn, k=%d' % (
+        len(embeddings), embeddings.shape[1], index.nlist, build_seconds, len(queries), k))
+    print('%-10s %7s %10s %14s' % ('Phương pháp', 'nprobe', 'recall@%d' % k, 'truy vấn/giây'))
+    for row in rows:
+        print('%-10s %7s %10.4f %14.1f' % (row['method'], '-' if row['nprobe'] is None else row['nprobe'],
+                                            row['recall'], row['queries_per_sec']))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help='Trích xuất embedding')
+    export.add_argument('source', help="Thư mục ảnh, file manifest hoặc 'cifar' (x_train)")
+    export.add_argument('--output', default=os.path.join(EMBEDDING_DIR, 'embeddings.f16.npy'),
+                        help='File .npy float16')
+    export.add_argument('--model', default=os.path.join('saved_models', 'keras_cifar10_trained_model.keras'))
+    export.add_argument('--batch-size', type=int, default=256)
+    bench = subparsers.add_parser('benchmark', help='So sánh IVF với vét cạn')
+    bench.add_argument('embeddings')
+    bench.add_argument('--nlist', type=int, default=128)
+    bench.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 16])
+    bench.add_argument('--k', type=int, default=10)
+    bench.add_argument('--queries', type=int, default=1000)
+    duplicates = subparsers.add_parser('duplicates', help='Tìm ảnh trùng')
+    duplicates.add_argument('embeddings')
+    duplicates.add_argument('--threshold', type=float, default=0.98)
+    duplicates.add_argument('--nlist', type=int, default=128)
+    duplicates.add_argument('--nprobe', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        import tensorflow as tf
+
+        source = args.source
+        if source == 'cifar':
+            import cifar10_local
+            (source, _), _ = cifar10_local.load_data()
+        result = export_embeddings(tf.keras.models.load_model(args.model), source, args.output, args.batch_size)
+        print('Đã ghi %d embedding %d chiều vào %s' % (result.shape + (args.output,)))
+    elif args.command == 'benchmark':
+        benchmark(load_embeddings(args.embeddings), args.nlist, args.nprobe, args.k, args.queries)
+    else:
+        index = IVFIndex(args.nlist, args.nprobe).build(load_embeddings(args.embeddings))
+        paths_file = args.embeddings + '.paths.txt'
+        names = None
+        if os.path.exists(paths_file):
+            with open(paths_file) as f:
+                names = [line.rstrip('\n') for line in f]
+        pairs = find_duplicates(index, args.threshold)
+        for i, j, score in pairs:
+            print('%.4f  %s  %s' % (score, names[i] if names else i, names[j] if names else j))
+        print('%d cặp ảnh trùng (cosine >= %g)' % (len(pairs), args.threshold))
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Đánh giá mô hình và phân tích lỗi từ một lần dự đoán duy nhất.
+
+Mô hình chỉ chạy một lần (theo batch) trên tập kiểm tra; loss, accuracy, ma trận
+nhầm lẫn, báo cáo theo lớp và các lỗi quan trọng nhất đều được tính từ mảng xác
+suất đó bằng các phép gather O(N):
+    true_confidences = probabilities[np.arange(N), true]
+thay cho np.diagonal(np.take(..., axis=1)) vốn tạo ma trận N x N.
+
+Cách chạy:
+    python evaluation.py --model saved_models/keras_cifar10_trained_model.keras
+"""
+
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+# Ngưỡng cắt xác suất giống categorical_crossentropy của Keras
+EPSILON = 1e-7
+
+Evaluation = namedtuple('Evaluation', ['loss', 'accuracy', 'probabilities', 'predicted', 'true',
+                                       'confidences', 'true_confidences', 'confusion'])
+
+
+def to_class_indices(y):
+    """Chuyển nhãn one-hot (N, C), (N, 1) hoặc (N,) thành mảng chỉ số lớp (N,)."""
+    y = np.asarray(y)
+    if y.ndim == 2 and y.shape[1] > 1:
+        return np.argmax(y, axis=1)
+    return y.reshape(-1).astype(np.int64)
+
+
+def evaluate_predictions(probabilities, y_true, num_classes=None, extra_loss=0.):
+    """
+    Tính toàn bộ chỉ số đánh giá từ mảng xác suất.
+    Args:
+        probabilities: Xác suất softmax (N, C).
+        y_true: Nhãn thật (one-hot hoặc chỉ số lớp).
+        num_classes: Số lớp; mặc định lấy theo probabilities.
+        extra_loss: Phần loss cộng thêm (ví dụ regularization L2 của mô hình).
+    Returns:
+        Evaluation.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float32)
+    true = to_class_indices(y_true)
+    num_classes = num_classes or probabilities.shape[1]
+    rows = np.arange(len(true))
+
+    predicted = np.argmax(probabilities, axis=1)
+    confidences = probabilities[rows, predicted]
+    true_confidences = probabilities[rows, true]
+
+    loss = float(-np.mean(np.log(np.clip(true_confidences, EPSILON, 1. - EPSILON)))) + extra_loss
+    accuracy = float(np.mean(predicted == true))
+    confusion = np.bincount(true * num_classes + predicted,
+                            minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+    return Evaluation(loss, accuracy, probabilities, predicted, true, confidences, true_confidences, confusion)
+
+
+def evaluate_model(model, x, y, batch_size=256, tta_views=1):
+    """
+    Chạy mô hình một lần trên x (ảnh uint8, chuẩn hóa trong pipeline) và đánh giá.
+    Loss gồm cả regularization của mô hình nên khớp với model.evaluate.
+    Args:
+        tta_views: Số phiên bản test-time augmentation của mỗi ảnh (xem tta.py); 1 để tắt.
+    Returns:
+        Evaluation.
+    """
+    if tta_views > 1:
+        import tta
+        probabilities = tta.predict_tta(model, x, tta_views, batch_size)
+    else:
+        import input_pipeline
+        probabilities = model.predict(input_pipeline.make_eval_dataset(x, batch_size=batch_size), verbose=0)
+    extra_loss = float(sum(np.asarray(loss) for loss in model.losses)) if model.losses else 0.
+    return evaluate_predictions(probabilities, y, extra_loss=extra_loss)
+
+
+def per_class_metrics(confusion):
+    """
+    Precision, recall, f1 và support của từng lớp từ ma trận nhầm lẫn.
+    Returns:
+        precision, recall, f1, support: Mảng (C,).
+    """
+    confusion = np.asarray(confusion, dtype=np.float64)
+    true_positive = np.diag(confusion)
+    support = confusion.sum(axis=1)
+    predicted_count = confusion.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted_count > 0, true_positive / predicted_count, 0.)
+        recall = np.where(support > 0, true_positive / support, 0.)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.)
+    return precision, recall, f1, support.astype(np.int64)
+
+
+def classification_report(evaluation, labels=None, digits=2):
+    """Báo cáo theo lớp (cùng định dạng với sklearn.metrics.classification_report)."""
+    precision, recall, f1, support = per_class_metrics(evaluation.confusion)
+    labels = labels or [str(i) for i in range(len(support))]
+    total = support.sum()
+    width = max(len(name) for name in labels + ['weighted avg'])
+    row = '%%%ds %%9.%df %%9.%df %%9.%df %%9d' % (width, digits, digits, digits)
+
+    lines = ['%*s %9s %9s %9s %9s' % (width, '', 'precision', 'recall', 'f1-score', 'support'), '']
+    for i, name in enumerate(labels):
+        lines.append(row % (name, precision[i], recall[i], f1[i], support[i]))
+    lines.append('')
+    lines.append('%*s %9s %9s %9.*f %9d' % (width, 'accuracy', '', '', digits, evaluation.accuracy, total))
+    lines.append(row % ('macro avg', precision.mean(), recall.mean(), f1.mean(), total))
+    weights = support / float(total)
+    lines.append(row % ('weighted avg', (precision * weights).sum(), (recall * weights).sum(),
+                        (f1 * weights).sum(), total))
+    return '\n'.join(lines)
+
+
+def most_important_errors(evaluation, k=10):
+    """
+    Các mẫu dự đoán sai có chênh lệch lớn nhất giữa xác suất của lớp dự đoán
+    và xác suất của lớp thật.
+    Returns:
+        Chỉ số mẫu (trong toàn bộ tập), sắp xếp giảm dần theo mức chênh lệch.
+    """
+    errors = np.flatnonzero(evaluation.predicted != evaluation.true)
+    delta = evaluation.confidences[errors] - evaluation.true_confidences[errors]
+    k = min(k, len(errors))
+    if k == 0:
+        return errors
+    top = np.argpartition(delta, len(delta) - k)[-k:]
+    return errors[top[np.argsort(delta[top])[::-1]]]
+
+
+if __name__ == '__main__':
+    import tensorflow as tf
+
+    import cifar10_local
+    from predictor import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--tta', type=int, default=1, help='Số phiên bản test-time augmentation')
+    args = parser.parse_args()
+
+    _, (x_test, y_test) = cifar10_local.load_data()
+    result = evaluate_model(tf.keras.models.load_model(args.model), x_test, y_test, args.batch_size, args.tta)
+    print('Test loss: %.4f' % result.loss)
+    print('Test accuracy: %.4f' % result.accuracy)
+    print(result.confusion)
+    print(classification_report(result, cifar10_local.LABELS))
+    for index in most_important_errors(result, args.top_k):
+        print('#%d: dự đoán %s (%.2f), nhãn thật %s (%.2f)' % (
+            index, cifar10_local.LABELS[result.predicted[index]], result.confidences[index],
+            cifar10_local.LABELS[result.true[index]], result.true_confidences[index]))
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Tối ưu mô hình cho suy luận: gộp BatchNormalization vào Conv2D/Dense và bỏ Dropout.
+
+Khi suy luận, BatchNormalization chỉ là một phép biến đổi tuyến tính theo kênh:
+    y = gamma * (x - mean) / sqrt(var + eps) + beta
+nên có thể gộp vào kernel và bias của lớp Conv2D/Dense đứng trước. Lớp
+Activation('relu') ngay sau đó cũng được gộp vào tham số activation của lớp.
+Dropout không có tác dụng khi suy luận nên được bỏ đi.
+
+Cách chạy:
+    python fold_batchnorm.py --model saved_models/keras_cifar10_trained_model.keras
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.layers import Activation, BatchNormalization, Conv2D, Dense, Dropout, Input
+from tensorflow.keras.models import Sequential
+
+from predictor import MODEL_PATH
+
+INFERENCE_MODEL_PATH = os.path.join('saved_models', 'keras_cifar10_inference_model.keras')
+
+
+def _fold_weights(layer, bn):
+    """Tính kernel và bias mới của `layer` sau khi gộp lớp BatchNormalization `bn`."""
+    weights = layer.get_weights()
+    kernel = weights[0]
+    bias = weights[1] if layer.use_bias else np.zeros(kernel.shape[-1], dtype=kernel.dtype)
+
+    bn_weights = list(bn.get_weights())
+    gamma = bn_weights.pop(0) if bn.scale else np.ones_like(bias)
+    beta = bn_weights.pop(0) if bn.center else np.zeros_like(bias)
+    mean, variance = bn_weights
+    scale = gamma / np.sqrt(variance + bn.epsilon)
+
+    # Kênh đầu ra là trục cuối của kernel ở cả Conv2D (kh, kw, in, out) lẫn Dense (in, out)
+    return kernel * scale, (bias - mean) * scale + beta
+
+
+def optimize_for_inference(model):
+    """
+    Tạo mô hình tương đương cho suy luận từ mô hình Sequential đã huấn luyện.
+    Args:
+        model: Mô hình Sequential (Conv2D/Dense -> BatchNormalization -> Activation ...).
+    Returns:
+        Mô hình Sequential mới, không còn BatchNormalization và Dropout.
+    """
+    layers = [layer for layer in model.layers if not isinstance(layer, Dropout)]
+    folded = Sequential(name=model.name + '_inference')
+    folded.add(Input(shape=model.input_shape[1:]))
+
+    i = 0
+    while i < len(layers):
+        layer = layers[i]
+        following = layers[i + 1:i + 3]
+        config = layer.get_config()
+        weights = layer.get_weights()
+        i += 1
+
+        if (isinstance(layer, (Conv2D, Dense)) and following
+                and isinstance(following[0], BatchNormalization)):
+            weights = list(_fold_weights(layer, following[0]))
+            config['use_bias'] = True
+            config['kernel_regularizer'] = None
+            i += 1
+            # Gộp luôn Activation đứng sau BatchNormalization nếu lớp đang tuyến tính
+            if (len(following) > 1 and isinstance(following[1], Activation)
+                    and config['activation'] == 'linear'):
+                config['activation'] = following[1].get_config()['activation']
+                i += 1
+
+        new_layer = layer.__class__.from_config(config)
+        folded.add(new_layer)
+        if weights:
+            new_layer.set_weights(weights)
+    return folded
+
+
+def max_abs_difference(model, folded, x, batch_size=256):
+    """Sai khác tuyệt đối lớn nhất giữa đầu ra hai mô hình trên ảnh uint8 x."""
+    diff = 0.
+    for start in range(0, len(x), batch_size):
+        batch = np.asarray(x[start:start + batch_size], dtype=np.float32) / 255.
+        diff = max(diff, float(np.max(np.abs(model.predict_on_batch(batch) - folded.predict_on_batch(batch)))))
+    return diff
+
+
+def benchmark(model, folded, x, batch_sizes=(1, 32, 256), repeats=20):
+    """
+    So sánh độ trễ (ms mỗi batch) của mô hình gốc và mô hình đã gộp BN.
+    Returns:
+        dict batch_size -> (ms mô hình gốc, ms mô hình gộp).
+    """
+    forward_fns = [tf.function(lambda images, m=m: m(images, training=False)) for m in (model, folded)]
+    results = {}
+    for batch_size in batch_sizes:
+        batch = tf.constant(np.asarray(x[:batch_size], dtype=np.float32) / 255.)
+        timings = []
+        for forward in forward_fns:
+            forward(batch)  # Trace trước khi đo
+            start = time.perf_counter()
+            for _ in range(repeats):
+                forward(batch).numpy()
+            timings.append((time.perf_counter() - start) / repeats * 1000.)
+        results[batch_size] = tuple(timings)
+
+    print('%-10s %15s %15s %10s' % ('Batch', 'Gốc (ms)', 'Gộp BN (ms)', 'Giảm'))
+    for batch_size, (original, optimized) in results.items():
+        print('%-10d %15.3f %15.3f %9.1f%%' % (batch_size, original, optimized,
+                                              (1. - optimized / original) * 100.))
+    return results
+
+
+if __name__ == '__main__':
+    import cifar10_local
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--output', default=INFERENCE_MODEL_PATH)
+    parser.add_argument('--tolerance', type=float, default=1e-4)
+    args = parser.parse_args()
+
+    _, (x_test, _) = cifar10_local.load_data()
+    model = tf.keras.models.load_model(args.model)
+    folded = optimize_for_inference(model)
+    print('Số lớp: %d -> %d' % (len(model.layers), len(folded.layers)))
+
+    diff = max_abs_difference(model, folded, x_test[:1000])
+    print('Sai khác lớn nhất của đầu ra: %.2e' % diff)
+    if diff > args.tolerance:
+        raise SystemExit('Sai khác vượt quá ngưỡng %.0e' % args.tolerance)
+
+    benchmark(model, folded, x_test)
+    folded.save(args.output)
+    print('Đã lưu mô hình suy luận tại %s' % args.output)
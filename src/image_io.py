@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Đọc và resize ảnh đầu vào cho mô hình, chỉ dùng NumPy và PIL.
+
+Tách khỏi predictor.py để các công cụ dự đoán nhẹ (classify.py) không phải
+import TensorFlow chỉ để giải mã ảnh.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp')
+
+# Lỗi có thể gặp khi giải mã một file ảnh hỏng, bị cắt cụt hoặc quá lớn
+DECODE_ERRORS = (OSError, ValueError, SyntaxError, EOFError, Image.DecompressionBombError)
+
+
+def load_image_array(source, size=(32, 32), draft=False):
+    """
+    Đọc một ảnh và resize về kích thước đầu vào của mô hình, giống `predict_image`.
+    Args:
+        source: Đường dẫn ảnh, nội dung file ảnh (bytes) hoặc mảng (H, W, 3) giá trị 0..255.
+        size: Kích thước (rộng, cao) sau khi resize.
+        draft: Với ảnh JPEG, giải mã trực tiếp ở độ phân giải giảm 1/2, 1/4 hoặc 1/8 (vẫn
+            không nhỏ hơn size) trước khi resize; nhanh hơn nhiều với ảnh lớn nhưng kết
+            quả hơi khác so với giải mã đầy đủ.
+    Returns:
+        Mảng uint8 (cao, rộng, 3).
+    """
+    if isinstance(source, np.ndarray):
+        array = source
+        if array.shape[:2] == (size[1], size[0]):
+            return np.asarray(array, dtype=np.uint8)
+        img = Image.fromarray(np.asarray(array, dtype=np.uint8))
+    elif isinstance(source, bytes):
+        img = Image.open(io.BytesIO(source))
+    else:
+        img = Image.open(source)
+    if draft and img.format == 'JPEG':
+        img.draft('RGB', size)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return np.asarray(img.resize(size), dtype=np.uint8)
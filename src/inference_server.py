@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""Dịch vụ HTTP dự đoán ảnh (asyncio), gom các yêu cầu đồng thời thành micro-batch.
+
+Các endpoint:
+    POST /predict  Nội dung yêu cầu là file ảnh (PNG/JPEG...), trả về JSON
+                   {"index": ..., "label": ..., "confidence": ...}.
+    GET  /stats    Độ trễ p50/p99 (ms), QPS và kích thước batch trung bình.
+
+Cách chạy:
+    python inference_server.py --port 8000 --max-batch 32 --max-wait-ms 5
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import time
+
+import numpy as np
+
+from image_io import load_image_array
+from predictor import MODEL_PATH, Predictor
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            500: 'Internal Server Error'}
+
+
+class LatencyStats(object):
+    """Thống kê độ trễ và thông lượng trên cửa sổ các yêu cầu gần nhất."""
+
+    def __init__(self, window=10000):
+        self.latencies = collections.deque(maxlen=window)
+        self.batch_sizes = collections.deque(maxlen=window)
+        self.count = 0
+        self.start_time = None
+
+    def add(self, latency):
+        if self.start_time is None:
+            # QPS tính từ lúc yêu cầu đầu tiên đến, không tính thời gian máy chủ chờ
+            self.start_time = time.perf_counter() - latency
+        self.latencies.append(latency)
+        self.count += 1
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start_time if self.start_time is not None else 0.
+        latencies = np.asarray(self.latencies) * 1000.
+        return {
+            'requests': self.count,
+            'qps': self.count / elapsed if elapsed > 0 else 0.,
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else None,
+        }
+
+
+class MicroBatcher(object):
+    """
+    Gom các yêu cầu dự đoán vào hàng đợi và chạy mô hình theo micro-batch.
+    Một batch được chạy khi đủ max_batch ảnh hoặc khi ảnh đầu tiên đã chờ max_wait_ms.
+    Args:
+        predictor: Predictor dùng để chạy mô hình.
+        max_batch: Số ảnh tối đa trong một batch.
+        max_wait_ms: Thời gian chờ tối đa để gom batch (ms).
+        stats: LatencyStats ghi nhận kích thước batch.
+    """
+
+    def __init__(self, predictor, max_batch=32, max_wait_ms=5., stats=None):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.
+        self.stats = stats
+        self.queue = None
+        self._task = None
+
+    def start(self):
+        """Tạo hàng đợi và tác vụ gom batch; phải gọi bên trong event loop đang chạy."""
+        # Hàng đợi được tạo trong loop đang chạy: trước Python 3.10, asyncio.Queue() gắn với
+        # loop mặc định lúc khởi tạo, khác với loop do asyncio.run tạo ra
+        self.queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def predict(self, image):
+        """Đưa một ảnh uint8 (32, 32, 3) vào hàng đợi và chờ vector xác suất."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((image, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            images = np.stack([image for image, _ in items])
+            try:
+                # Chạy mô hình ngoài event loop để vẫn nhận được yêu cầu mới
+                probs = await loop.run_in_executor(None, self.predictor.predict_proba, images)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            if self.stats is not None:
+                self.stats.batch_sizes.append(len(items))
+            for (_, future), prob in zip(items, probs):
+                if not future.done():
+                    future.set_result(prob)
+
+
+class InferenceServer(object):
+    """
+    Máy chủ HTTP/1.1 tối giản (hỗ trợ keep-alive) trên asyncio.
+    Args:
+        predictor: Predictor dùng để chạy mô hình.
+        max_batch, max_wait_ms: Cấu hình micro-batch.
+    """
+
+    def __init__(self, predictor, max_batch=32, max_wait_ms=5.):
+        self.predictor = predictor
+        self.stats = LatencyStats()
+        self.batcher = MicroBatcher(predictor, max_batch, max_wait_ms, self.stats)
+        self._size = (predictor.input_shape[1], predictor.input_shape[0])
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        self.batcher.start()
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print('Đang phục vụ tại http://%s:%d' % (host, port))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, payload = await self._dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                data = json.dumps(payload).encode('utf-8')
+                writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n'
+                              'Content-Length: %d\r\nConnection: %s\r\n\r\n' % (
+                                  status, _REASONS[status], len(data),
+                                  'keep-alive' if keep_alive else 'close')).encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        if path == '/stats':
+            return 200, self.stats.summary()
+        if path != '/predict':
+            return 404, {'error': 'không tìm thấy %s' % path}
+        if method != 'POST':
+            return 405, {'error': 'chỉ hỗ trợ POST'}
+
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            image = await loop.run_in_executor(None, load_image_array, body, self._size)
+        except Exception as e:
+            return 400, {'error': 'không đọc được ảnh: %s' % e}
+        try:
+            prob = await self.batcher.predict(image)
+        except Exception as e:
+            # Lỗi khi chạy mô hình: trả lời 500 thay vì đóng kết nối không phản hồi
+            return 500, {'error': 'lỗi khi dự đoán: %s' % e}
+        self.stats.add(time.perf_counter() - start)
+
+        index = int(np.argmax(prob))
+        return 200, {'index': index,
+                     'label': self.predictor.labels[index],
+                     'confidence': float(prob[index])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.)
+    args = parser.parse_args()
+
+    predictor = Predictor(args.model, batch_size=args.max_batch)
+    try:
+        asyncio.run(InferenceServer(predictor, args.max_batch, args.max_wait_ms).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
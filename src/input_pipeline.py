@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""Pipeline dữ liệu tf.data thay cho `datagen.flow(...)`.
+
+`ImageDataGenerator.flow` biến đổi từng ảnh bằng scipy trên một luồng Python,
+nên trên máy chỉ có CPU mô hình phải chờ dữ liệu. Ở đây toàn bộ batch được
+biến đổi affine cùng lúc bằng phép toán của TensorFlow, chạy song song
+(`num_parallel_calls`) và chuẩn bị trước (`prefetch`).
+
+Ảnh và nhãn có thể là mảng NumPy / memmap hoặc tensor đã tạo sẵn. Với mảng NumPy,
+mỗi batch được lấy theo chỉ số trực tiếp từ mảng (chỉ đọc các trang chứa batch đó),
+nên memmap của cifar10_local vẫn được chia sẻ qua page cache giữa các tiến trình thay
+vì bị chép thành một tensor riêng ở mỗi lần tạo pipeline.
+"""
+
+import math
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from augment_config import AUGMENT_CONFIG
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+
+def _uniform(shape, seed, low, high):
+    return tf.random.stateless_uniform(shape, seed=seed, minval=low, maxval=high)
+
+
+def random_affine_transforms(batch_size, height, width, seed, config=AUGMENT_CONFIG):
+    """
+    Sinh ngẫu nhiên ma trận biến đổi affine cho cả batch, theo cùng công thức
+    với `ImageDataGenerator.get_random_transform` / `apply_affine_transform`.
+    Args:
+        batch_size: Số ảnh trong batch (tensor vô hướng).
+        height, width: Kích thước ảnh (float32).
+        seed: Seed không trạng thái, tensor int64 dạng [2].
+        config: Thông số tăng cường dữ liệu.
+    Returns:
+        transforms: Tensor float32 (batch_size, 8) cho `ImageProjectiveTransformV3`.
+        flip: Tensor bool (batch_size,) đánh dấu ảnh cần lật ngang.
+    """
+    seeds = tf.random.experimental.stateless_split(seed, num=7)
+    shape = [batch_size]
+    rotation = config['rotation_range']
+    theta = _uniform(shape, seeds[0], -rotation, rotation) * (math.pi / 180.)
+    tx = _uniform(shape, seeds[1], -config['height_shift_range'], config['height_shift_range']) * height
+    ty = _uniform(shape, seeds[2], -config['width_shift_range'], config['width_shift_range']) * width
+    shear = _uniform(shape, seeds[3], -config['shear_range'], config['shear_range']) * (math.pi / 180.)
+    zoom = config['zoom_range']
+    zx = _uniform(shape, seeds[4], 1. - zoom, 1. + zoom)
+    zy = _uniform(shape, seeds[5], 1. - zoom, 1. + zoom)
+    if config['horizontal_flip']:
+        flip = _uniform(shape, seeds[6], 0., 1.) < 0.5
+    else:
+        flip = tf.zeros(shape, dtype=tf.bool)
+
+    # M = rotation . shift . shear . zoom, khai triển sẵn cho từng phần tử
+    cos_t, sin_t = tf.cos(theta), tf.sin(theta)
+    cos_s, sin_s = tf.cos(shear), tf.sin(shear)
+    m00 = cos_t * zx
+    m01 = (-cos_t * sin_s - sin_t * cos_s) * zy
+    m02 = cos_t * tx - sin_t * ty
+    m10 = sin_t * zx
+    m11 = (-sin_t * sin_s + cos_t * cos_s) * zy
+    m12 = sin_t * tx + cos_t * ty
+
+    # Đưa tâm ảnh về gốc tọa độ trước khi biến đổi (transform_matrix_offset_center)
+    o_x = height / 2. - 0.5
+    o_y = width / 2. - 0.5
+    a2 = m02 + o_x - m00 * o_x - m01 * o_y
+    b2 = m12 + o_y - m10 * o_x - m11 * o_y
+    zeros = tf.zeros(shape)
+    # Ma trận được xây dựng theo tọa độ (x, y) giống Keras, trùng với quy ước
+    # (cột, hàng) của ImageProjectiveTransformV3
+    transforms = tf.stack([m00, m01, a2, m10, m11, b2, zeros, zeros], axis=1)
+    return transforms, flip
+
+
+def augment_batch(images, seed, config=AUGMENT_CONFIG):
+    """
+    Tăng cường dữ liệu cho cả batch ảnh (N, H, W, C) float32.
+    Args:
+        images: Batch ảnh.
+        seed: Seed không trạng thái, tensor int64 dạng [2].
+        config: Thông số tăng cường dữ liệu.
+    Returns:
+        Batch ảnh đã biến đổi, cùng kích thước.
+    """
+    shape = tf.shape(images)
+    height = tf.cast(shape[1], tf.float32)
+    width = tf.cast(shape[2], tf.float32)
+    transforms, flip = random_affine_transforms(shape[0], height, width, seed, config)
+    images = tf.raw_ops.ImageProjectiveTransformV3(
+        images=images,
+        transforms=transforms,
+        output_shape=shape[1:3],
+        fill_value=0.,
+        interpolation='BILINEAR',
+        fill_mode=config['fill_mode'].upper())
+    return tf.where(flip[:, None, None, None], tf.reverse(images, axis=[2]), images)
+
+
+def _as_source(data):
+    # Giữ nguyên tensor và mảng NumPy / memmap (không chép), các kiểu khác chuyển thành mảng
+    return data if isinstance(data, (tf.Tensor, np.ndarray)) else np.asarray(data)
+
+
+def _gather(data, indices):
+    """Lấy các hàng theo chỉ số của cả batch: tf.gather với tensor, chỉ mục NumPy với mảng / memmap."""
+    if isinstance(data, tf.Tensor):
+        return tf.gather(data, indices)
+    rows = tf.numpy_function(lambda batch_indices: np.asarray(data[batch_indices]), [indices],
+                             tf.as_dtype(data.dtype), stateful=False)
+    rows.set_shape([None] + list(data.shape[1:]))
+    return rows
+
+
+def _gather_batch(x, indices, rescale):
+    # Chuẩn hóa ngay trên từng batch: dữ liệu gốc vẫn giữ ở dạng uint8
+    return tf.cast(_gather(x, indices), tf.float32) * rescale
+
+
+def make_train_dataset(x, y, batch_size=32, augment=True, shuffle=True, seed=None,
+                       num_parallel_calls=AUTOTUNE, prefetch=AUTOTUNE, config=AUGMENT_CONFIG,
+                       rescale=1. / 255):
+    """
+    Tạo tf.data.Dataset cho `model.fit`, thay cho `datagen.flow(x, y, batch_size)`.
+    Args:
+        x: Ảnh uint8 (N, 32, 32, 3): mảng NumPy / memmap (không bị chép) hoặc tensor tạo sẵn.
+        y: Nhãn (one-hot hoặc chỉ số lớp), mảng hoặc tensor.
+        batch_size: Kích thước batch.
+        augment: Bật tăng cường dữ liệu.
+        shuffle: Xáo trộn dữ liệu ở mỗi epoch.
+        seed: Seed cố định để mọi lần chạy cho cùng thứ tự và cùng phép biến đổi;
+            None để ngẫu nhiên và cho phép các batch song song trả về không theo thứ tự.
+        num_parallel_calls: Số batch được biến đổi song song.
+        prefetch: Số batch chuẩn bị trước.
+        config: Thông số tăng cường dữ liệu.
+        rescale: Hệ số chuẩn hóa áp dụng trên từng batch (mặc định đưa về [0, 1]).
+    Returns:
+        tf.data.Dataset sinh ra các cặp (ảnh float32, nhãn) theo batch.
+    """
+    # Lấy ảnh theo chỉ số của cả batch bằng một lần gather, thay vì từng ảnh một
+    x, y = _as_source(x), _as_source(y)
+    num_samples = int(x.shape[0])
+
+    ds = tf.data.Dataset.range(num_samples)
+    if shuffle:
+        ds = ds.shuffle(num_samples, seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+
+    if augment:
+        # Mỗi batch nhận một seed riêng, khác nhau giữa các epoch nhưng lặp lại
+        # được khi seed cố định
+        seeds = tf.data.Dataset.random(seed=seed, rerandomize_each_iteration=True).batch(2)
+        ds = tf.data.Dataset.zip((ds, seeds))
+
+        def load_and_augment(indices, batch_seed):
+            images = _gather_batch(x, indices, rescale)
+            return augment_batch(images, batch_seed, config), _gather(y, indices)
+
+        ds = ds.map(load_and_augment, num_parallel_calls=num_parallel_calls)
+    else:
+        ds = ds.map(lambda indices: (_gather_batch(x, indices, rescale), _gather(y, indices)),
+                    num_parallel_calls=num_parallel_calls)
+
+    options = tf.data.Options()
+    options.deterministic = seed is not None
+    ds = ds.with_options(options)
+    return ds.prefetch(prefetch)
+
+
+def make_eval_dataset(x, y=None, batch_size=256, num_parallel_calls=AUTOTUNE, rescale=1. / 255):
+    """
+    Tạo tf.data.Dataset cho `model.evaluate` / `model.predict` / `validation_data`,
+    chuẩn hóa ảnh uint8 theo từng batch thay vì tạo bản sao float32 của cả tập.
+    Args:
+        x: Ảnh uint8 (N, 32, 32, 3), mảng NumPy / memmap hoặc tensor.
+        y: Nhãn, hoặc None khi chỉ dự đoán.
+        batch_size: Kích thước batch.
+        num_parallel_calls: Số batch được chuẩn bị song song.
+        rescale: Hệ số chuẩn hóa.
+    Returns:
+        tf.data.Dataset theo đúng thứ tự của x.
+    """
+    x = _as_source(x)
+    ds = tf.data.Dataset.range(int(x.shape[0])).batch(batch_size)
+    if y is None:
+        ds = ds.map(lambda indices: _gather_batch(x, indices, rescale),
+                    num_parallel_calls=num_parallel_calls)
+    else:
+        y = _as_source(y)
+        ds = ds.map(lambda indices: (_gather_batch(x, indices, rescale), _gather(y, indices)),
+                    num_parallel_calls=num_parallel_calls)
+    return ds.prefetch(AUTOTUNE)
+
+
+def _images_per_second(iterator, num_batches, batch_size):
+    next(iterator)  # Bỏ qua batch đầu (khởi tạo)
+    start = time.perf_counter()
+    for _ in range(num_batches):
+        next(iterator)
+    return num_batches * batch_size / (time.perf_counter() - start)
+
+
+def benchmark(x, y, batch_size=32, num_batches=200):
+    """
+    So sánh tốc độ (ảnh/giây) giữa `ImageDataGenerator.flow` và pipeline tf.data.
+    Returns:
+        dict tên pipeline -> số ảnh/giây.
+    """
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+    datagen = ImageDataGenerator(rescale=1. / 255, **AUGMENT_CONFIG)
+    results = {
+        'ImageDataGenerator.flow': _images_per_second(
+            iter(datagen.flow(x, y, batch_size=batch_size)), num_batches, batch_size),
+        'tf.data': _images_per_second(
+            iter(make_train_dataset(x, y, batch_size).repeat()), num_batches, batch_size),
+        'tf.data (seed=0)': _images_per_second(
+            iter(make_train_dataset(x, y, batch_size, seed=0).repeat()), num_batches, batch_size),
+    }
+    for name, speed in results.items():
+        print('%-25s %10.1f ảnh/giây' % (name, speed))
+    return results
+
+
+if __name__ == '__main__':
+    import cifar10_local
+
+    (x_train, y_train), _ = cifar10_local.load_data()
+    y_train = tf.keras.utils.to_categorical(y_train, 10)
+    benchmark(x_train, y_train)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Bộ tạo tải cho inference_server.py, chạy trên localhost.
+
+Mở nhiều kết nối keep-alive đồng thời, gửi ảnh của tập kiểm tra (mã hóa PNG)
+tới POST /predict và báo cáo độ trễ p50/p99 phía client cùng QPS.
+
+Cách chạy:
+    python inference_server.py --port 8000 &
+    python load_generator.py --port 8000 --concurrency 32 --requests 5000
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import time
+
+import numpy as np
+from PIL import Image
+
+
+def encode_images(images):
+    """Mã hóa các ảnh uint8 (N, H, W, 3) thành bytes PNG."""
+    encoded = []
+    for img in images:
+        buffer = io.BytesIO()
+        Image.fromarray(img).save(buffer, format='PNG')
+        encoded.append(buffer.getvalue())
+    return encoded
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('máy chủ đóng kết nối')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(status_line.split()[1]), body
+
+
+async def _worker(host, port, payloads, counter, total, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] < total:
+            i = counter[0]
+            counter[0] += 1
+            body = payloads[i % len(payloads)]
+            start = time.perf_counter()
+            writer.write(('POST /predict HTTP/1.1\r\nHost: %s\r\nContent-Type: image/png\r\n'
+                          'Content-Length: %d\r\n\r\n' % (host, len(body))).encode('latin-1') + body)
+            await writer.drain()
+            status, _ = await _read_response(reader)
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors[0] += 1
+    finally:
+        writer.close()
+
+
+async def _get_json(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(('GET %s HTTP/1.1\r\nHost: %s\r\nConnection: close\r\n\r\n' % (path, host)).encode('latin-1'))
+    await writer.drain()
+    _, body = await _read_response(reader)
+    writer.close()
+    return json.loads(body)
+
+
+async def run_load(payloads, host='127.0.0.1', port=8000, concurrency=32, total=5000):
+    """
+    Gửi `total` yêu cầu qua `concurrency` kết nối đồng thời.
+    Returns:
+        dict gồm số yêu cầu thành công và lỗi, QPS, p50/p99 phía client (ms; None nếu không có
+        yêu cầu thành công) và thống kê phía máy chủ.
+    """
+    latencies = []
+    counter = [0]
+    errors = [0]
+    start = time.perf_counter()
+    await asyncio.gather(*[_worker(host, port, payloads, counter, total, latencies, errors)
+                           for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.asarray(latencies) * 1000.
+    result = {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'qps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else None,
+        'p99_ms': float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else None,
+        'server': await _get_json(host, port, '/stats'),
+    }
+    if latencies:
+        print('Yêu cầu thành công: %d   lỗi: %d   QPS: %.1f   p50: %.2f ms   p99: %.2f ms' % (
+            result['requests'], result['errors'], result['qps'], result['p50_ms'], result['p99_ms']))
+    else:
+        print('Không có yêu cầu thành công (%d lỗi)' % result['errors'])
+    print('Phía máy chủ:', result['server'])
+    return result
+
+
+if __name__ == '__main__':
+    import cifar10_local
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--num-images', type=int, default=500)
+    args = parser.parse_args()
+
+    _, (x_test, _) = cifar10_local.load_data()
+    payloads = encode_images(x_test[:args.num_images])
+    asyncio.run(run_load(payloads, args.host, args.port, args.concurrency, args.requests))
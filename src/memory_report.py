@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Báo cáo bộ nhớ (peak RSS) khi huấn luyện và đánh giá.
+
+So sánh hai cách chuẩn bị dữ liệu:
+- eager: chuyển cả x_train/x_test sang float32 rồi chia 255 như mục 2.3 cũ.
+- lazy: giữ ảnh uint8 (memory-map), chuẩn hóa trên từng batch trong tf.data.
+Mỗi kịch bản chạy trong một tiến trình con riêng để peak RSS không lẫn nhau.
+
+Cách chạy:
+    python memory_report.py --steps 50
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+
+SCENARIOS = ['train-eager', 'train-lazy', 'eval-eager', 'eval-lazy']
+
+
+def rss_mb():
+    """RSS hiện tại (MB), đọc từ /proc/self/statm."""
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2. ** 20
+
+
+def peak_rss_mb():
+    """Peak RSS (MB) của tiến trình hiện tại."""
+    # ru_maxrss trên Linux tính theo KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def run_scenario(name, steps, batch_size):
+    """Chạy một kịch bản và in ra 'RSS sau khi chuẩn bị dữ liệu, peak RSS' (MB)."""
+    import tensorflow as tf
+    import cifar10_local
+    import cnn_model
+    import input_pipeline
+
+    mode, normalization = name.split('-')
+    (x_train, y_train), (x_test, y_test) = cifar10_local.load_data()
+    y_train = tf.keras.utils.to_categorical(y_train, 10)
+    y_test = tf.keras.utils.to_categorical(y_test, 10)
+
+    if normalization == 'eager':
+        x_train = x_train.astype('float32')
+        x_test = x_test.astype('float32')
+        x_train /= 255
+        x_test /= 255
+        rescale = 1.
+    else:
+        rescale = 1. / 255
+    data_rss = rss_mb()
+
+    model = cnn_model.compile_model(cnn_model.build_model(x_train.shape[1:], 10))
+    if mode == 'train':
+        train_ds = input_pipeline.make_train_dataset(x_train, y_train, batch_size=batch_size,
+                                                     rescale=rescale)
+        val_ds = input_pipeline.make_eval_dataset(x_test, y_test, rescale=rescale)
+        model.fit(train_ds.repeat(), steps_per_epoch=steps, epochs=1,
+                  validation_data=val_ds, validation_steps=steps, verbose=0)
+    else:
+        test_ds = input_pipeline.make_eval_dataset(x_test, y_test, rescale=rescale)
+        model.evaluate(test_ds, verbose=0)
+    print('%.1f %.1f' % (data_rss, peak_rss_mb()))
+
+
+def report(steps=50, batch_size=32):
+    """
+    Chạy lần lượt các kịch bản trong tiến trình con và in bảng so sánh.
+    Returns:
+        dict kịch bản -> (RSS sau khi chuẩn bị dữ liệu, peak RSS) theo MB.
+    """
+    results = {}
+    for name in SCENARIOS:
+        output = subprocess.run(
+            [sys.executable, __file__, '--scenario', name,
+             '--steps', str(steps), '--batch-size', str(batch_size)],
+            check=True, capture_output=True, text=True).stdout
+        data_rss, peak_rss = (float(v) for v in output.strip().splitlines()[-1].split())
+        results[name] = (data_rss, peak_rss)
+
+    print('%-12s %22s %15s' % ('Kịch bản', 'RSS sau tải dữ liệu', 'Peak RSS'))
+    for name, (data_rss, peak_rss) in results.items():
+        print('%-12s %19.1f MB %12.1f MB' % (name, data_rss, peak_rss))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', choices=SCENARIOS)
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+    if args.scenario:
+        run_scenario(args.scenario, args.steps, args.batch_size)
+    else:
+        report(args.steps, args.batch_size)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Cache kết quả dự đoán trên đĩa, đánh địa chỉ theo nội dung.
+
+Khóa của mỗi kết quả gồm:
+    model_hash: hash của file .keras (hoặc của các trọng số nếu mô hình đã nằm trong bộ nhớ)
+    input_hash: hash của ảnh đầu vào sau tiền xử lý (uint8 32x32x3)
+nên ảnh đã dự đoán với cùng mô hình được trả về ngay, còn khi mô hình được huấn
+luyện lại thì khóa đổi theo và các kết quả cũ không bao giờ được dùng nữa
+(chúng bị loại dần theo LRU).
+
+Dữ liệu lưu trong SQLite; khi tổng kích thước vượt max_bytes, các mục được truy
+cập lâu nhất bị xóa trước. Số lần hit/miss và tổng kích thước được lưu cùng cache
+(bảng counters) và cập nhật trong cùng transaction ghi, nên nhiều instance hoặc
+tiến trình dùng chung một file vẫn thấy cùng một tổng.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+CACHE_PATH = os.path.join('saved_models', 'prediction_cache.sqlite')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS predictions (
+    model_hash TEXT NOT NULL,
+    input_hash BLOB NOT NULL,
+    probabilities BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (model_hash, input_hash)
+);
+CREATE INDEX IF NOT EXISTS predictions_last_access ON predictions (last_access);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0);
+INSERT OR IGNORE INTO counters SELECT 'bytes', COALESCE(SUM(size), 0) FROM predictions;
+'''
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """Hash SHA-256 nội dung một file (ví dụ file .keras)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_weights(model):
+    """Hash SHA-256 các trọng số của mô hình trong bộ nhớ."""
+    digest = hashlib.sha256()
+    for weights in model.get_weights():
+        digest.update(str(weights.shape).encode('ascii'))
+        digest.update(np.ascontiguousarray(weights).tobytes())
+    return digest.hexdigest()
+
+
+def hash_array(array, chunk_size=1 << 24):
+    """Hash SHA-256 toàn bộ một mảng (ví dụ cả tập ảnh), đọc theo từng đoạn nên dùng được với memmap."""
+    digest = hashlib.sha256()
+    digest.update(('%s %s' % (array.shape, array.dtype)).encode('ascii'))
+    flat = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+    for start in range(0, len(flat), chunk_size):
+        digest.update(flat[start:start + chunk_size])
+    return digest.hexdigest()
+
+
+def hash_images(images):
+    """Hash từng ảnh uint8 (N, H, W, C), trả về danh sách digest 16 byte."""
+    images = np.ascontiguousarray(images, dtype=np.uint8)
+    return [hashlib.blake2b(image.tobytes(), digest_size=16).digest() for image in images]
+
+
+class PredictionCache(object):
+    """
+    Cache xác suất dự đoán trong SQLite với giới hạn kích thước theo LRU.
+    Dùng được từ nhiều luồng (một kết nối, có khóa).
+    Args:
+        path: Đường dẫn file SQLite.
+        max_bytes: Tổng kích thước tối đa của các kết quả được lưu.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=64 * 1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def get_many(self, model_hash, input_hashes):
+        """
+        Tra cứu nhiều ảnh cùng lúc.
+        Returns:
+            dict input_hash -> mảng xác suất float32, chỉ gồm các ảnh có trong cache.
+        """
+        found = {}
+        now = time.time()
+        with self._lock:
+            unique = list(set(input_hashes))
+            # Giới hạn số tham số của một câu lệnh SQLite
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = self._conn.execute(
+                    'SELECT input_hash, probabilities FROM predictions WHERE model_hash = ? AND input_hash IN (%s)'
+                    % ','.join('?' * len(chunk)), [model_hash] + chunk).fetchall()
+                for input_hash, blob in rows:
+                    found[bytes(input_hash)] = np.frombuffer(blob, dtype=np.float32)
+            self._conn.executemany('UPDATE predictions SET last_access = ? WHERE model_hash = ? AND input_hash = ?',
+                                   [(now, model_hash, h) for h in found])
+            hits = sum(1 for h in input_hashes if h in found)
+            self._conn.execute("UPDATE counters SET value = value + ? WHERE name = 'hits'", (hits,))
+            self._conn.execute("UPDATE counters SET value = value + ? WHERE name = 'misses'",
+                               (len(input_hashes) - hits,))
+            self._conn.commit()
+        return found
+
+    def put_many(self, model_hash, input_hashes, probabilities):
+        """Lưu xác suất (N, số lớp) của các ảnh, sau đó loại bớt mục cũ nếu vượt max_bytes."""
+        now = time.time()
+        # Khử trùng lặp theo input_hash: cùng một ảnh xuất hiện nhiều lần chỉ lưu (và tính kích thước) một lần
+        rows = {}
+        for input_hash, probs in zip(input_hashes, np.asarray(probabilities, dtype=np.float32)):
+            blob = probs.tobytes()
+            rows[input_hash] = (model_hash, input_hash, blob, len(blob) + len(input_hash), now)
+        rows = list(rows.values())
+        with self._lock:
+            # Khóa ghi ngay từ đầu để kích thước cũ và tổng trong counters không bị tiến trình khác đổi giữa chừng
+            self._conn.execute('BEGIN IMMEDIATE')
+            delta = 0
+            for row in rows:
+                previous = self._conn.execute(
+                    'SELECT size FROM predictions WHERE model_hash = ? AND input_hash = ?', row[:2]).fetchone()
+                delta += row[3] - (previous[0] if previous else 0)
+            self._conn.executemany('INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)', rows)
+            self._conn.execute("UPDATE counters SET value = value + ? WHERE name = 'bytes'", (delta,))
+            self._evict()
+            self._conn.commit()
+
+    def _total_bytes(self):
+        return self._conn.execute("SELECT value FROM counters WHERE name = 'bytes'").fetchone()[0]
+
+    def _evict(self):
+        total = self._total_bytes()
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for rowid, size in self._conn.execute('SELECT rowid, size FROM predictions ORDER BY last_access'):
+            victims.append((rowid,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany('DELETE FROM predictions WHERE rowid = ?', victims)
+        self._conn.execute("UPDATE counters SET value = value - ? WHERE name = 'bytes'", (freed,))
+
+    def stats(self):
+        """Số lần hit/miss, số mục và tổng kích thước hiện tại."""
+        with self._lock:
+            counters = dict(self._conn.execute('SELECT name, value FROM counters').fetchall())
+            entries = self._conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+        lookups = counters['hits'] + counters['misses']
+        return {'hits': counters['hits'], 'misses': counters['misses'],
+                'hit_rate': counters['hits'] / float(lookups) if lookups else 0.,
+                'entries': entries, 'bytes': counters['bytes']}
+
+    def clear(self):
+        """Xóa toàn bộ kết quả và đặt lại bộ đếm."""
+        with self._lock:
+            self._conn.execute('DELETE FROM predictions')
+            self._conn.execute('UPDATE counters SET value = 0')
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
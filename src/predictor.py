@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Dự đoán theo batch cho nhiều ảnh bằng mô hình đã lưu.
+
+`predict_image` / `show_test` gọi `model.predict` cho từng ảnh một (batch 1),
+mỗi lần đều tốn chi phí điều phối của Keras. `Predictor` giải mã và resize ảnh
+song song bằng thread pool, sau đó đưa qua một `tf.function` có input_signature
+cố định theo các batch kích thước không đổi (batch cuối được đệm thêm), nên
+đồ thị chỉ được trace một lần.
+
+Với `cache=PredictionCache(...)`, xác suất của các ảnh đã dự đoán với cùng mô
+hình được đọc lại từ cache trên đĩa thay vì chạy lại mô hình (xem prediction_cache.py).
+
+Với `tta_views=K > 1`, mỗi ảnh được dự đoán trên K phiên bản (lật, dịch 1 pixel)
+trong cùng một lần chạy mô hình và xác suất được lấy trung bình (xem tta.py).
+"""
+
+import collections
+import contextlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tensorflow as tf
+
+import tta
+from cifar10_local import LABELS
+from image_io import load_image_array
+from prediction_cache import hash_file, hash_images, hash_weights
+
+MODEL_PATH = os.path.join('saved_models', 'keras_cifar10_trained_model.keras')
+
+Prediction = collections.namedtuple('Prediction', ['indices', 'names', 'confidences'])
+
+
+class Predictor(object):
+    """
+    Bao mô hình đã huấn luyện để dự đoán theo batch.
+    Args:
+        model_path: Đường dẫn file .keras.
+        batch_size: Kích thước batch cố định khi chạy mô hình.
+        num_threads: Số luồng giải mã ảnh (mặc định bằng số lõi CPU).
+        labels: Danh sách tên lớp.
+        model: Mô hình đã tải sẵn; nếu có thì bỏ qua model_path.
+        cache: PredictionCache để lưu/đọc lại kết quả; khóa mô hình là hash của file .keras
+            (hoặc của trọng số khi truyền model), tính một lần lúc khởi tạo.
+        tta_views: Số phiên bản test-time augmentation của mỗi ảnh; 1 để tắt.
+        profiler: profiling.Profiler; nếu có thì ghi span 'decode' (load_images) và
+            'forward' (mỗi lần chạy mô hình) thuộc nhóm 'predict'.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, batch_size=64, num_threads=None, labels=LABELS, model=None,
+                 cache=None, tta_views=1, profiler=None):
+        self.model = model if model is not None else tf.keras.models.load_model(model_path)
+        self.cache = cache
+        self.model_hash = None
+        if cache is not None:
+            self.model_hash = hash_weights(model) if model is not None else hash_file(model_path)
+            if tta_views > 1:
+                # Kết quả TTA khác kết quả thường nên được lưu dưới khóa riêng
+                self.model_hash += ':tta%d' % tta_views
+        self.batch_size = batch_size
+        self.tta_views = tta_views
+        self.profiler = profiler
+        self.labels = labels
+        self.input_shape = tuple(self.model.input_shape[1:])
+        self._executor = ThreadPoolExecutor(num_threads or os.cpu_count())
+        # Ảnh uint8 được chuẩn hóa ngay trong đồ thị, trace đúng một lần
+        self._forward = tf.function(
+            self._forward_batch,
+            input_signature=[tf.TensorSpec((batch_size,) + self.input_shape, tf.uint8)])
+
+    def _forward_batch(self, images):
+        images = tf.cast(images, tf.float32) / 255.
+        if self.tta_views > 1:
+            return tta.average_views(self.model(tta.tta_views(images, self.tta_views), training=False),
+                                     self.tta_views)
+        return self.model(images, training=False)
+
+    def _span(self, name):
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.span(name, 'predict')
+
+    def load_images(self, inputs):
+        """Giải mã và resize song song danh sách ảnh, trả về mảng uint8 (N, 32, 32, 3)."""
+        size = (self.input_shape[1], self.input_shape[0])
+        with self._span('decode'):
+            arrays = list(self._executor.map(lambda source: load_image_array(source, size), inputs))
+        return np.stack(arrays) if arrays else np.zeros((0,) + self.input_shape, dtype=np.uint8)
+
+    def predict_proba(self, images):
+        """
+        Chạy mô hình trên mảng ảnh uint8 (N, 32, 32, 3); nếu có cache thì chỉ chạy các ảnh chưa có.
+        Returns:
+            Mảng xác suất float32 (N, số lớp).
+        """
+        images = np.asarray(images, dtype=np.uint8)
+        if self.cache is None or not len(images):
+            return self._predict_batches(images)
+
+        input_hashes = hash_images(images)
+        found = self.cache.get_many(self.model_hash, input_hashes)
+        missing = [i for i, h in enumerate(input_hashes) if h not in found]
+        probs = np.empty((len(images), len(self.labels)), dtype=np.float32)
+        if missing:
+            computed = self._predict_batches(images[missing])
+            probs[missing] = computed
+            self.cache.put_many(self.model_hash, [input_hashes[i] for i in missing], computed)
+        for i, h in enumerate(input_hashes):
+            if h in found:
+                probs[i] = found[h]
+        return probs
+
+    def _predict_batches(self, images):
+        outputs = []
+        for start in range(0, len(images), self.batch_size):
+            batch = images[start:start + self.batch_size]
+            count = len(batch)
+            if count < self.batch_size:
+                # Đệm batch cuối để giữ nguyên kích thước, tránh trace lại đồ thị
+                padding = np.zeros((self.batch_size - count,) + self.input_shape, dtype=np.uint8)
+                batch = np.concatenate([batch, padding])
+            with self._span('forward'):
+                outputs.append(self._forward(batch).numpy()[:count])
+        if not outputs:
+            return np.zeros((0, len(self.labels)), dtype=np.float32)
+        return np.concatenate(outputs)
+
+    def predict(self, inputs):
+        """
+        Dự đoán lớp cho danh sách ảnh.
+        Args:
+            inputs: Danh sách đường dẫn, bytes hoặc mảng ảnh; hoặc một mảng (N, H, W, 3).
+        Returns:
+            Prediction(indices, names, confidences): chỉ số lớp, tên lớp và xác suất dự đoán.
+        """
+        if isinstance(inputs, np.ndarray) and inputs.ndim == 4 and inputs.shape[1:] == self.input_shape:
+            images = inputs
+        else:
+            images = self.load_images(inputs)
+        probs = self.predict_proba(images)
+        indices = np.argmax(probs, axis=1)
+        confidences = probs[np.arange(len(indices)), indices]
+        return Prediction(indices, [self.labels[i] for i in indices], confidences)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def benchmark(predictor, x, num_images=1000):
+    """
+    So sánh tốc độ giữa vòng lặp `model.predict` từng ảnh và `Predictor.predict_proba`.
+    Args:
+        predictor: Predictor đã khởi tạo.
+        x: Ảnh uint8 (N, 32, 32, 3).
+        num_images: Số ảnh dùng để đo.
+    Returns:
+        dict tên -> số ảnh/giây.
+    """
+    x = np.asarray(x[:num_images])
+    predictor.predict_proba(x[:1])  # Khởi tạo (trace) trước khi đo
+
+    start = time.perf_counter()
+    for img in x:
+        predictor.model.predict(np.expand_dims(img, axis=0) / 255., verbose=0)
+    loop_speed = len(x) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    predictor.predict_proba(x)
+    batch_speed = len(x) / (time.perf_counter() - start)
+
+    results = {'model.predict từng ảnh': loop_speed, 'Predictor': batch_speed}
+    for name, speed in results.items():
+        print('%-25s %10.1f ảnh/giây' % (name, speed))
+    return results
+
+
+if __name__ == '__main__':
+    import cifar10_local
+
+    _, (x_test, _) = cifar10_local.load_data()
+    with Predictor() as predictor:
+        benchmark(predictor, x_test)
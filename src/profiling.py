@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""Đo thời gian huấn luyện/dự đoán: chờ dữ liệu, tính toán, từng lớp và bộ nhớ.
+
+- `ProfilerCallback`: callback cho `model.fit` ghi thời gian từng bước và từng
+  epoch; `profile_training` dùng nó để so sánh thời gian một bước với thời gian
+  tạo batch của input pipeline / ImageDataGenerator.
+- `Predictor(profiler=...)`: tách thời gian giải mã ảnh (`load_images`) với thời
+  gian chạy mô hình; `profile_predictor` gắn profiler vào Predictor rồi dự đoán.
+- `layer_latency`: thời gian forward của từng lớp (Conv2D, BatchNormalization,
+  MaxPooling2D, ...) khi chạy riêng lẻ.
+Mọi khoảng thời gian và RSS được ghi vào `Profiler`, có thể xuất ra Chrome trace
+JSON (mở bằng chrome://tracing hoặc Perfetto) và/hoặc TensorBoard profiler.
+
+Cách chạy:
+    python profiling.py train --steps 50 --trace train_trace.json
+    python profiling.py train --datagen --steps 50
+    python profiling.py predict --trace predict_trace.json
+    python profiling.py layers --batch-size 64 --tensorboard logs/profile
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import tensorflow as tf
+
+from memory_report import rss_mb
+
+
+class Profiler(object):
+    """
+    Ghi lại các khoảng thời gian (span) và RSS theo định dạng sự kiện của Chrome trace.
+    Args:
+        tensorboard_dir: Nếu có, bật TensorBoard profiler (tf.profiler) trong lúc ghi;
+            mỗi span cũng được đánh dấu bằng tf.profiler.experimental.Trace.
+    """
+
+    def __init__(self, tensorboard_dir=None):
+        self.events = []
+        self.tensorboard_dir = tensorboard_dir
+        self._origin = time.perf_counter()
+        self._tensorboard_active = False
+
+    def _now_us(self):
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def start(self):
+        if self.tensorboard_dir and not self._tensorboard_active:
+            tf.profiler.experimental.start(self.tensorboard_dir)
+            self._tensorboard_active = True
+
+    def stop(self):
+        if self._tensorboard_active:
+            tf.profiler.experimental.stop()
+            self._tensorboard_active = False
+
+    @contextmanager
+    def span(self, name, category='', step=None):
+        """Đo một khoảng thời gian; `step` đánh số bước trong TensorBoard."""
+        start = self._now_us()
+        if self._tensorboard_active:
+            kwargs = {'step_num': step, '_r': 1} if step is not None else {}
+            with tf.profiler.experimental.Trace(name, **kwargs):
+                yield
+        else:
+            yield
+        self.events.append({'name': name, 'cat': category, 'ph': 'X', 'ts': start,
+                            'dur': self._now_us() - start, 'pid': os.getpid(), 'tid': 0})
+
+    def record_memory(self):
+        """Ghi RSS hiện tại (MB) thành một sự kiện counter."""
+        self.events.append({'name': 'rss_mb', 'ph': 'C', 'ts': self._now_us(), 'pid': os.getpid(),
+                            'args': {'rss_mb': rss_mb()}})
+
+    def durations_ms(self, name, category=None):
+        return np.array([e['dur'] / 1000. for e in self.events if e['ph'] == 'X' and e['name'] == name
+                         and (category is None or e['cat'] == category)])
+
+    def summary(self, category=None):
+        """
+        Tổng hợp theo tên span.
+        Returns:
+            OrderedDict tên -> {'count', 'total_ms', 'mean_ms', 'median_ms'}.
+        """
+        names = OrderedDict()
+        for e in self.events:
+            if e['ph'] == 'X' and (category is None or e['cat'] == category):
+                names[e['name']] = True
+        result = OrderedDict()
+        for name in names:
+            d = self.durations_ms(name, category)
+            result[name] = {'count': len(d), 'total_ms': float(d.sum()), 'mean_ms': float(d.mean()),
+                            'median_ms': float(np.median(d))}
+        return result
+
+    def peak_memory_mb(self):
+        values = [e['args']['rss_mb'] for e in self.events if e['ph'] == 'C']
+        return max(values) if values else None
+
+    def write_chrome_trace(self, path):
+        """Ghi các sự kiện ra file JSON theo định dạng Chrome trace."""
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+        return path
+
+
+class ProfilerCallback(tf.keras.callbacks.Callback):
+    """
+    Callback ghi thời gian của `model.fit` vào Profiler: span 'step' cho mỗi bước (lấy batch
+    và tính toán trong train_function, đồng bộ vì logs được chuyển thành số trước khi gọi
+    on_train_batch_end) và span 'epoch' cho mỗi epoch, cùng RSS sau mỗi bước.
+    TensorBoard profiler (nếu có) được bật từ on_train_begin đến on_train_end.
+    Args:
+        profiler: Profiler ghi kết quả.
+        skip_steps: Số bước đầu tiên (trace đồ thị) không được ghi.
+    """
+
+    def __init__(self, profiler, skip_steps=0):
+        super(ProfilerCallback, self).__init__()
+        self.profiler = profiler
+        self.skip_steps = skip_steps
+        self._steps_seen = 0
+        self._spans = {}
+
+    def _begin(self, name, step):
+        span = self.profiler.span(name, 'train', step)
+        span.__enter__()
+        self._spans[name] = span
+
+    def _end(self, name):
+        span = self._spans.pop(name, None)
+        if span is not None:
+            span.__exit__(None, None, None)
+
+    def on_train_begin(self, logs=None):
+        self._steps_seen = 0
+        self.profiler.start()
+
+    def on_train_end(self, logs=None):
+        self._end('step')
+        self._end('epoch')
+        self.profiler.stop()
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._begin('epoch', epoch)
+
+    def on_epoch_end(self, epoch, logs=None):
+        self._end('epoch')
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self._steps_seen >= self.skip_steps:
+            self._begin('step', self._steps_seen)
+
+    def on_train_batch_end(self, batch, logs=None):
+        if 'step' in self._spans:
+            self._end('step')
+            self.profiler.record_memory()
+        self._steps_seen += 1
+
+
+def profile_training(model, batches, steps=50, warmup=2, profiler=None):
+    """
+    Đo `steps` bước `model.fit` bằng ProfilerCallback, cùng thời gian tạo batch của riêng
+    input pipeline (span 'input'). Trong `fit`, batch được lấy bên trong train_function nên
+    tỷ lệ chờ dữ liệu là ước lượng: thời gian tạo một batch so với thời gian một bước.
+    Args:
+        model: Mô hình đã compile.
+        batches: tf.data.Dataset hoặc iterator sinh (x, y), ví dụ datagen.flow(...).
+        steps: Số bước được đo.
+        warmup: Số bước chạy trước (trace đồ thị) không được tính.
+        profiler: Profiler ghi kết quả; mặc định tạo mới.
+    Returns:
+        (profiler, dict gồm input_ms, step_ms, input_bound_fraction, peak_rss_mb).
+    """
+    profiler = profiler or Profiler()
+    iterator = iter(batches)
+    for step in range(steps):
+        with profiler.span('input', 'train', step):
+            next(iterator)
+
+    model.fit(batches, steps_per_epoch=warmup + steps, epochs=1, verbose=0,
+              callbacks=[ProfilerCallback(profiler, skip_steps=warmup)])
+
+    input_ms = float(np.median(profiler.durations_ms('input', 'train')))
+    step_ms = float(np.median(profiler.durations_ms('step', 'train')))
+    result = {'input_ms': input_ms, 'step_ms': step_ms, 'input_bound_fraction': min(1., input_ms / step_ms),
+              'peak_rss_mb': profiler.peak_memory_mb()}
+    print('Huấn luyện: tạo batch %.2f ms, một bước fit %.2f ms (ước lượng %.1f%% thời gian chờ dữ liệu), RSS tối đa %.0f MB' % (
+        result['input_ms'], result['step_ms'], 100. * result['input_bound_fraction'], result['peak_rss_mb']))
+    return profiler, result
+
+
+def profile_predictor(predictor, inputs, profiler=None):
+    """
+    Dự đoán `inputs` bằng `predictor.predict` với profiler gắn vào Predictor, đo riêng thời
+    gian giải mã (span 'decode') và chạy mô hình (span 'forward').
+    Args:
+        predictor: Predictor đã khởi tạo.
+        inputs: Danh sách đường dẫn/bytes ảnh, hoặc mảng uint8 (N, 32, 32, 3) (khi đó không có bước giải mã).
+    Returns:
+        (profiler, dict gồm tổng decode_ms, forward_ms, images_per_sec và peak_rss_mb).
+    """
+    profiler = profiler or Profiler()
+    predictor.predict_proba(np.zeros((1,) + predictor.input_shape, dtype=np.uint8))  # trace trước khi đo
+    previous, predictor.profiler = predictor.profiler, profiler
+    start = time.perf_counter()
+    profiler.start()
+    try:
+        for index in range(0, len(inputs), predictor.batch_size):
+            predictor.predict(inputs[index:index + predictor.batch_size])
+            profiler.record_memory()
+    finally:
+        profiler.stop()
+        predictor.profiler = previous
+    elapsed = time.perf_counter() - start
+
+    result = {'decode_ms': float(profiler.durations_ms('decode', 'predict').sum()),
+              'forward_ms': float(profiler.durations_ms('forward', 'predict').sum()),
+              'images_per_sec': len(inputs) / elapsed, 'peak_rss_mb': profiler.peak_memory_mb()}
+    print('Dự đoán %d ảnh: giải mã %.1f ms, mô hình %.1f ms, %.1f ảnh/giây' % (
+        len(inputs), result['decode_ms'], result['forward_ms'], result['images_per_sec']))
+    return profiler, result
+
+
+def layer_latency(model, batch_size=64, repeats=20, profiler=None):
+    """
+    Đo thời gian forward (inference) của từng lớp trong mô hình Sequential. Mỗi lớp được
+    biên dịch thành một tf.function riêng và chạy trên đầu ra thật của lớp trước.
+    Tổng thời gian các lớp có thể lớn hơn thời gian của cả mô hình vì mất các tối ưu hợp nhất phép toán.
+    Returns:
+        (profiler, danh sách dict name, type, output_shape, median_ms, fraction).
+    """
+    profiler = profiler or Profiler()
+    x = tf.random.uniform((batch_size,) + tuple(model.input_shape[1:]))
+    rows = []
+    profiler.start()
+    try:
+        for layer in model.layers:
+            forward = tf.function(lambda t, layer=layer: layer(t, training=False))
+            y = forward(x)  # trace
+            for step in range(repeats):
+                with profiler.span(layer.name, 'layer', step):
+                    y = forward(x)
+                    y.numpy()
+            rows.append({'name': layer.name, 'type': type(layer).__name__,
+                         'output_shape': tuple(y.shape[1:]),
+                         'median_ms': float(np.median(profiler.durations_ms(layer.name, 'layer')))})
+            x = y
+
+        whole = tf.function(lambda t: model(t, training=False))
+        inputs = tf.random.uniform((batch_size,) + tuple(model.input_shape[1:]))
+        whole(inputs)
+        for step in range(repeats):
+            with profiler.span('model', 'model', step):
+                whole(inputs).numpy()
+    finally:
+        profiler.stop()
+
+    total = sum(row['median_ms'] for row in rows)
+    for row in rows:
+        row['fraction'] = row['median_ms'] / total
+    model_ms = float(np.median(profiler.durations_ms('model', 'model')))
+
+    print('%-28s %-20s %-16s %10s %8s' % ('Lớp', 'Loại', 'Đầu ra', 'ms', '%'))
+    for row in rows:
+        print('%-28s %-20s %-16s %10.3f %7.1f%%' % (row['name'], row['type'], row['output_shape'],
+                                                    row['median_ms'], 100. * row['fraction']))
+    by_type = OrderedDict()
+    for row in rows:
+        by_type[row['type']] = by_type.get(row['type'], 0.) + row['median_ms']
+    print('Theo loại lớp: ' + ', '.join('%s %.2f ms' % item for item in by_type.items()))
+    print('Tổng các lớp: %.2f ms, cả mô hình: %.2f ms (batch %d)' % (total, model_ms, batch_size))
+    return profiler, rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('target', choices=['train', 'predict', 'layers'])
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--datagen', action='store_true',
+                        help='Huấn luyện với ImageDataGenerator.flow thay cho tf.data')
+    parser.add_argument('--model', help='File .keras (mặc định: mô hình mới của mục 3)')
+    parser.add_argument('--trace', help='Ghi Chrome trace JSON vào file này')
+    parser.add_argument('--tensorboard', help='Thư mục log của TensorBoard profiler')
+    args = parser.parse_args()
+
+    import cifar10_local
+    import cnn_model
+    import input_pipeline
+
+    (x_train, y_train), (x_test, y_test) = cifar10_local.load_data()
+    if args.model:
+        model = tf.keras.models.load_model(args.model)
+    else:
+        model = cnn_model.compile_model(cnn_model.build_model(x_train.shape[1:], 10))
+    profiler = Profiler(args.tensorboard)
+
+    if args.target == 'train':
+        y_train = tf.keras.utils.to_categorical(y_train, 10)
+        if args.datagen:
+            from tensorflow.keras.preprocessing.image import ImageDataGenerator
+            from augment_config import AUGMENT_CONFIG
+            datagen = ImageDataGenerator(rescale=1. / 255, **AUGMENT_CONFIG)
+            batches = datagen.flow(x_train, y_train, batch_size=args.batch_size)
+        else:
+            batches = input_pipeline.make_train_dataset(x_train, y_train, batch_size=args.batch_size)
+        profile_training(model, batches, args.steps, profiler=profiler)
+    elif args.target == 'predict':
+        from load_generator import encode_images
+        from predictor import Predictor
+        with Predictor(model=model) as predictor:
+            # Ảnh được mã hóa PNG để đo cả bước giải mã như khi nhận ảnh từ người dùng
+            images = encode_images(x_test[:args.steps * predictor.batch_size])
+            profile_predictor(predictor, images, profiler)
+    else:
+        layer_latency(model, args.batch_size, profiler=profiler)
+
+    if args.trace:
+        print('Chrome trace: %s' % profiler.write_chrome_trace(args.trace))
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""Định dạng dữ liệu chia shard cho tập ảnh lớn hơn RAM.
+
+Mỗi shard là một file nhị phân gồm các bản ghi độ dài cố định:
+    1 byte nhãn + H*W*3 byte ảnh uint8 (thứ tự H, W, C)
+nên vị trí của bản ghi thứ i là i * record_bytes, không cần giải mã tuần tự.
+File <prefix>.index.json mô tả kích thước ảnh, độ dài bản ghi, tên lớp và danh sách shard.
+
+Bộ đọc dùng tf.data: đọc xen kẽ (interleave) song song nhiều shard, xáo trộn
+thứ tự shard ở mỗi epoch và xáo trộn bản ghi trong một bộ đệm có giới hạn, sau
+đó giải mã theo batch. Bộ nhớ sử dụng chỉ phụ thuộc vào kích thước bộ đệm,
+không phụ thuộc vào kích thước tập dữ liệu.
+
+Cách chạy:
+    python sharded_dataset.py cifar --output data/cifar-10-shards
+    python sharded_dataset.py folder thu_muc_anh/ --output data/my-shards
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tensorflow as tf
+
+import cifar10_local
+import input_pipeline
+from augment_config import AUGMENT_CONFIG
+from image_io import DECODE_ERRORS, IMAGE_EXTENSIONS, load_image_array
+
+INDEX_FILE = 'index.json'
+
+
+class ShardWriter(object):
+    """
+    Ghi ảnh uint8 và nhãn vào các shard độ dài bản ghi cố định.
+    Args:
+        output_dir: Thư mục chứa shard và <prefix>.index.json.
+        image_shape: Kích thước ảnh (H, W, C).
+        records_per_shard: Số bản ghi tối đa trong một shard.
+        label_names: Danh sách tên lớp (nhãn phải nhỏ hơn 256).
+        prefix: Tiền tố tên file shard, ví dụ 'train'.
+    """
+
+    def __init__(self, output_dir, image_shape=(32, 32, 3), records_per_shard=100000,
+                 label_names=None, prefix='shard'):
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        self.output_dir = output_dir
+        self.image_shape = tuple(image_shape)
+        self.record_bytes = 1 + int(np.prod(self.image_shape))
+        self.records_per_shard = records_per_shard
+        self.label_names = label_names
+        self.prefix = prefix
+        self.shards = []
+        self._file = None
+        self._count = 0
+
+    def _open_shard(self):
+        name = '%s-%05d.bin' % (self.prefix, len(self.shards))
+        self.shards.append({'file': name, 'num_records': 0})
+        self._file = open(os.path.join(self.output_dir, name), 'wb')
+        self._count = 0
+
+    def write(self, images, labels):
+        """Ghi một batch ảnh uint8 (N, H, W, C) và nhãn (N,)."""
+        images = np.asarray(images, dtype=np.uint8).reshape((-1,) + self.image_shape)
+        labels = np.asarray(labels).reshape(-1)
+        if labels.size and labels.max() > 255:
+            raise ValueError('Nhãn phải nằm trong khoảng 0..255.')
+        records = np.empty((len(images), self.record_bytes), dtype=np.uint8)
+        records[:, 0] = labels
+        records[:, 1:] = images.reshape(len(images), -1)
+
+        start = 0
+        while start < len(records):
+            if self._file is None or self._count == self.records_per_shard:
+                self.close_shard()
+                self._open_shard()
+            count = min(self.records_per_shard - self._count, len(records) - start)
+            self._file.write(records[start:start + count].tobytes())
+            self._count += count
+            self.shards[-1]['num_records'] = self._count
+            start += count
+
+    def close_shard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        """Đóng shard cuối và ghi <prefix>.index.json (ghi file tạm rồi đổi tên)."""
+        self.close_shard()
+        index = {
+            'image_shape': list(self.image_shape),
+            'record_bytes': self.record_bytes,
+            'label_names': self.label_names,
+            'num_records': sum(shard['num_records'] for shard in self.shards),
+            'shards': self.shards,
+        }
+        index_path = os.path.join(self.output_dir, '%s.%s' % (self.prefix, INDEX_FILE))
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(index_path + '.tmp', index_path)
+        return index_path
+
+    def abort(self):
+        """Đóng shard đang ghi, xóa các shard đã ghi và index cũ cùng prefix (đã không còn khớp)."""
+        self.close_shard()
+        for shard in self.shards:
+            path = os.path.join(self.output_dir, shard['file'])
+            if os.path.exists(path):
+                os.remove(path)
+        self.shards = []
+        index_path = os.path.join(self.output_dir, '%s.%s' % (self.prefix, INDEX_FILE))
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # Chỉ ghi index khi chuyển đổi thành công, để shard dở dang không bị đọc như tập dữ liệu hoàn chỉnh
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def convert_cifar_batches(output_dir, data_dir=cifar10_local.DATA_DIR, records_per_shard=10000):
+    """
+    Chuyển các batch pickle CIFAR-10 thành shard: train.index.json và test.index.json.
+    Returns:
+        dict 'train'/'test' -> đường dẫn index.
+    """
+    label_names = cifar10_local.LABELS
+    paths = {}
+    for split, batches in (('train', cifar10_local.TRAIN_BATCHES), ('test', cifar10_local.TEST_BATCHES)):
+        with ShardWriter(output_dir, records_per_shard=records_per_shard,
+                         label_names=label_names, prefix=split) as writer:
+            for name in batches:
+                writer.write(*cifar10_local.load_batch(os.path.join(data_dir, name)))
+        paths[split] = os.path.join(output_dir, '%s.%s' % (split, INDEX_FILE))
+    return paths
+
+
+def _decode(path, size):
+    try:
+        return load_image_array(path, size)
+    except DECODE_ERRORS as e:
+        print('Bỏ qua %s: %s' % (path, e))
+        return None
+
+
+def convert_image_folder(root, output_dir, size=(32, 32), records_per_shard=100000,
+                         chunk_size=4096, num_threads=None, prefix='train', seed=0):
+    """
+    Chuyển thư mục ảnh dạng root/<tên lớp>/<ảnh> thành shard.
+    Ảnh được giải mã và resize song song theo từng nhóm chunk_size để giới hạn bộ nhớ.
+    Thứ tự file được xáo trộn một lần (theo seed) để mỗi shard chứa đủ các lớp.
+    File không giải mã được (hỏng, bị cắt cụt, quá lớn) được in ra và bỏ qua.
+    Returns:
+        Đường dẫn index.
+    """
+    label_names = sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+    files = []
+    for label, name in enumerate(label_names):
+        for dirpath, _, filenames in os.walk(os.path.join(root, name)):
+            files.extend((os.path.join(dirpath, f), label) for f in sorted(filenames)
+                         if f.lower().endswith(IMAGE_EXTENSIONS))
+    order = np.random.default_rng(seed).permutation(len(files))
+    skipped = 0
+
+    with ThreadPoolExecutor(num_threads or os.cpu_count()) as executor, \
+            ShardWriter(output_dir, (size[1], size[0], 3), records_per_shard,
+                        label_names, prefix) as writer:
+        for start in range(0, len(files), chunk_size):
+            chunk = [files[i] for i in order[start:start + chunk_size]]
+            images, labels = [], []
+            for (path, label), image in zip(chunk, executor.map(lambda item: _decode(item[0], size), chunk)):
+                if image is None:
+                    skipped += 1
+                else:
+                    images.append(image)
+                    labels.append(label)
+            if images:
+                writer.write(np.stack(images), labels)
+            print('Đã ghi %d/%d ảnh (bỏ qua %d ảnh lỗi)' % (min(start + chunk_size, len(files)) - skipped,
+                                                          len(files), skipped))
+    return os.path.join(output_dir, '%s.%s' % (prefix, INDEX_FILE))
+
+
+def load_index(index_path):
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def make_sharded_dataset(index_path, batch_size=32, shuffle=True, shuffle_buffer=10000,
+                         cycle_length=4, seed=None, augment=False, num_classes=None,
+                         config=AUGMENT_CONFIG, rescale=1. / 255):
+    """
+    Tạo tf.data.Dataset đọc trực tiếp từ các shard.
+    Args:
+        index_path: Đường dẫn file index.json.
+        batch_size: Kích thước batch.
+        shuffle: Xáo trộn thứ tự shard và bản ghi ở mỗi epoch.
+        shuffle_buffer: Số bản ghi tối đa trong bộ đệm xáo trộn.
+        cycle_length: Số shard được đọc xen kẽ song song.
+        seed: Seed cố định để thứ tự lặp lại được.
+        augment: Bật tăng cường dữ liệu (cùng phép biến đổi với input_pipeline).
+        num_classes: Số lớp để mã hóa one-hot; None để giữ chỉ số lớp.
+        config: Thông số tăng cường dữ liệu.
+        rescale: Hệ số chuẩn hóa ảnh.
+    Returns:
+        tf.data.Dataset sinh ra các cặp (ảnh float32, nhãn) theo batch.
+    """
+    index = load_index(index_path)
+    directory = os.path.dirname(os.path.abspath(index_path))
+    files = [os.path.join(directory, shard['file']) for shard in index['shards']]
+    record_bytes = index['record_bytes']
+    image_shape = index['image_shape']
+    deterministic = seed is not None or not shuffle
+
+    ds = tf.data.Dataset.from_tensor_slices(files)
+    if shuffle:
+        ds = ds.shuffle(len(files), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.interleave(
+        lambda path: tf.data.FixedLengthRecordDataset(path, record_bytes, buffer_size=256 * 1024),
+        cycle_length=cycle_length,
+        num_parallel_calls=input_pipeline.AUTOTUNE,
+        deterministic=deterministic)
+    if shuffle:
+        ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+
+    def decode(records):
+        data = tf.io.decode_raw(records, tf.uint8)
+        images = tf.reshape(data[:, 1:], [-1] + image_shape)
+        labels = tf.cast(data[:, 0], tf.int32)
+        if num_classes:
+            labels = tf.one_hot(labels, num_classes)
+        return tf.cast(images, tf.float32) * rescale, labels
+
+    ds = ds.map(decode, num_parallel_calls=input_pipeline.AUTOTUNE)
+    if augment:
+        seeds = tf.data.Dataset.random(seed=seed, rerandomize_each_iteration=True).batch(2)
+        ds = tf.data.Dataset.zip((ds, seeds)).map(
+            lambda batch, batch_seed: (input_pipeline.augment_batch(batch[0], batch_seed, config), batch[1]),
+            num_parallel_calls=input_pipeline.AUTOTUNE)
+
+    options = tf.data.Options()
+    options.deterministic = deterministic
+    return ds.with_options(options).prefetch(input_pipeline.AUTOTUNE)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', choices=['cifar', 'folder'])
+    parser.add_argument('root', nargs='?', help='Thư mục ảnh (khi source=folder)')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--records-per-shard', type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.source == 'cifar':
+        print(convert_cifar_batches(args.output, records_per_shard=args.records_per_shard))
+    else:
+        print(convert_image_folder(args.root, args.output, records_per_shard=args.records_per_shard))
@@ -45,23 +45,24 @@ Original file is located at
 # Import thư viện
 from __future__ import print_function
 import tensorflow as tf
-from tensorflow.keras.datasets import cifar10
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Dropout, Activation, Flatten, BatchNormalization
-from tensorflow.keras.layers import Conv2D, MaxPooling2D
 import os
 import numpy as np
 import seaborn as sns
 import matplotlib
 import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix, classification_report
 import itertools
-from tensorflow.keras.regularizers import l2
 from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
 from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing import image
 import json
+import cifar10_local
+import cnn_model
+import input_pipeline
+import batch_augment
+import training
+import evaluation
+from predictor import Predictor
+from prediction_cache import PredictionCache
 # %matplotlib inline
 
 """## **2. Dữ liệu CIFAR-10**
@@ -69,8 +70,9 @@ import json
 ### **2.1. Tải tập dữ liệu**
 """
 
-# Tải tập dữ liệu CIFAR-10
-(x_train, y_train), (x_test, y_test) = cifar10.load_data()
+# Tải tập dữ liệu CIFAR-10 từ thư mục data/cifar-10-batches-py (không cần tải lại từ Internet).
+# Lần chạy đầu tạo cache uint8 trong data/cifar-10-cache, các lần sau mở bằng memory-map.
+(x_train, y_train), (x_test, y_test) = cifar10_local.load_data()
 # Phân chia tập huấn luyện và tập kiểm tra
 print('x_train shape:', x_train.shape)
 print('y_train shape:', y_train.shape)
@@ -108,16 +110,13 @@ plt.tight_layout()
 plt.show()
 
 """### **2.3. Chuẩn hóa dữ liệu**
-- Ảnh được chuẩn hóa về khoảng giá trị [0, 1] bằng cách chia mỗi pixel cho 255.
+- Ảnh được chuẩn hóa về khoảng giá trị [0, 1] bằng cách chia mỗi pixel cho 255. Dữ liệu vẫn được giữ ở dạng uint8,
+  việc chuẩn hóa thực hiện trên từng batch trong pipeline tf.data (tránh bản sao float32 gấp 4 lần bộ nhớ).
 - Các nhãn ảnh được chuyển đổi sang dạng **One Hot Encoding** để phù hợp với đầu ra của mô hình CNN.
 - Kích thước batch (32) và số lượng epoch (100) được thiết lập cho quá trình huấn luyện.
 """
 
-# Chuẩn hóa dữ liệu.
-x_train = x_train.astype('float32')
-x_test = x_test.astype('float32')
-x_train /= 255
-x_test /= 255
+# Chuẩn hóa dữ liệu: chia cho 255 trên từng batch, xem input_pipeline.make_train_dataset / make_eval_dataset.
 
 # Chuyển đổi vectơ lớp thành ma trận lớp nhị phân. One Hot Encoding
 y_train = tf.keras.utils.to_categorical(y_train, num_classes)
@@ -126,62 +125,25 @@ y_test = tf.keras.utils.to_categorical(y_test, num_classes)
 batch_size = 32 # Batch size mặc định
 epochs = 100 # Số lần huấn luyện
 
+# Dữ liệu kiểm tra theo batch, chuẩn hóa uint8 -> [0, 1] khi đọc
+test_ds = input_pipeline.make_eval_dataset(x_test, y_test)
+
 """## **3. Xây dựng kiến trúc mô hình CNN**"""
 
-# Định nghĩa mô hình CNN
-model = Sequential()
-
-# Block 1
-model.add(Conv2D(32, (3, 3), padding='same', kernel_regularizer=l2(0.001), input_shape=x_train.shape[1:]))
-model.add(BatchNormalization())
-model.add(Activation('relu'))
-model.add(Conv2D(64, (3, 3), kernel_regularizer=l2(0.001)))
-model.add(BatchNormalization())
-model.add(Activation('relu'))
-model.add(MaxPooling2D(pool_size=(2, 2)))
-model.add(Dropout(0.25))
-
-# Block 2
-model.add(Conv2D(64, (3, 3), padding='same', kernel_regularizer=l2(0.001)))
-model.add(BatchNormalization())
-model.add(Activation('relu'))
-model.add(Conv2D(128, (3, 3), kernel_regularizer=l2(0.001)))
-model.add(BatchNormalization())
-model.add(Activation('relu'))
-model.add(MaxPooling2D(pool_size=(2, 2)))
-model.add(Dropout(0.25))
-
-# Block 3
-model.add(Conv2D(128, (3, 3), padding='same', kernel_regularizer=l2(0.001)))
-model.add(BatchNormalization())
-model.add(Activation('relu'))
-model.add(Conv2D(256, (3, 3), kernel_regularizer=l2(0.001)))
-model.add(BatchNormalization())
-model.add(Activation('relu'))
-model.add(MaxPooling2D(pool_size=(2, 2)))
-model.add(Dropout(0.25))
-
-# Fully Connected Layer
-model.add(Flatten())
-model.add(Dense(512, kernel_regularizer=l2(0.001)))
-model.add(BatchNormalization())
-model.add(Activation('relu'))
-model.add(Dropout(0.4))
-
-# Output Layer
-model.add(Dense(num_classes, activation='softmax'))
+# Chế độ huấn luyện: 'fp32' (mặc định), 'xla', 'mixed_bf16' hoặc 'mixed_fp16' (xem training.py).
+# Cần chọn trước khi xây dựng mô hình vì mixed precision đặt chính sách dtype cho các lớp.
+training_mode = 'fp32'
+compile_args = training.configure_training_mode(training_mode)
+
+# Định nghĩa mô hình CNN: 3 block Conv-BN-ReLU, lớp Dense(512) và lớp softmax (xem cnn_model.py)
+model = cnn_model.build_model(x_train.shape[1:], num_classes)
 
 model.summary()
 
 """### **3.1 Cấu hình trình tối ưu hóa và compile mô hình**"""
 
-# khởi động trình tối ưu hóa RMSprop
-opt = tf.keras.optimizers.RMSprop(learning_rate=0.0001)
-
-# Huấn luyện mô hình bằng RMSprop
-model.compile(loss='categorical_crossentropy',
-              optimizer=opt,
-              metrics=['accuracy'])
+# Huấn luyện mô hình bằng RMSprop (learning_rate=0.0001), XLA/loss scaling theo chế độ đã chọn
+model = cnn_model.compile_model(model, learning_rate=0.0001, **compile_args)
 
 """### **3.2 Tăng cường dữ liệu**"""
 
@@ -189,37 +151,14 @@ data_augmentation = True # Bật tăng cường dữ liệu
 
 if not data_augmentation:
     print('Không sử dụng tăng cường dữ liệu.')
-    history = model.fit(x_train, y_train,
-                        batch_size=batch_size,
+    train_ds = input_pipeline.make_train_dataset(x_train, y_train, batch_size=batch_size, augment=False)
+    history = model.fit(train_ds,
                         epochs=epochs,
-                        validation_data=(x_test, y_test),
-                        shuffle=True)
+                        validation_data=test_ds,
+                        callbacks=[training.ThroughputLogger(batch_size)])
 else:
     print('Sử dụng tăng cường dữ liệu.')
-    datagen = ImageDataGenerator(
-        featurewise_center=False,
-        samplewise_center=False,
-        featurewise_std_normalization=False,
-        samplewise_std_normalization=False,
-        zca_whitening=False,
-        zca_epsilon=1e-06,
-        rotation_range=5,  # Xoay ngẫu nhiên trong khoảng 5 độ
-        width_shift_range=0.05,  # Dịch ngang ngẫu nhiên 5% chiều rộng ảnh
-        height_shift_range=0.05,  # Dịch dọc ngẫu nhiên 5% chiều cao ảnh
-        shear_range=0.05,  # Thêm biến dạng hình học
-        zoom_range=0.05,  # Phóng to hoặc thu nhỏ ngẫu nhiên
-        channel_shift_range=0.,  # Dịch chuyển kênh màu
-        fill_mode='nearest',
-        rescale=None,
-        cval=0.,
-        horizontal_flip=True,  # Lật ảnh theo chiều ngang
-        vertical_flip=False,  # Không lật ảnh theo chiều dọc
-        preprocessing_function=None,
-        data_format=None,
-        validation_split=0.0
-    )
-    # Tính toán thông số cần thiết cho chuẩn hóa dựa trên dữ liệu huấn luyện
-    datagen.fit(x_train)
+    # Thông số tăng cường dữ liệu được định nghĩa duy nhất trong augment_config.AUGMENT_CONFIG
 
 """### **3.3 Hiển thị ảnh trước và sau khi tăng cường dữ liệu**"""
 
@@ -238,7 +177,9 @@ for i, idx in enumerate(indices):
     axes[0, i].axis('off')
     axes[0, i].set_title("Ảnh Gốc")
 
-augmented_images = [datagen.random_transform(x_train[idx]) for idx in indices]
+# Biến đổi cả 5 ảnh trong một lần gọi (cùng thông số AUGMENT_CONFIG với pipeline huấn luyện)
+augmenter = batch_augment.BatchAugmenter()
+augmented_images = augmenter.random_transform_batch(x_train[indices]) / 255
 
 # Hiển thị ảnh sau khi augmentation
 for i, img in enumerate(augmented_images):
@@ -281,11 +222,18 @@ def plotmodelhistory(history):
         patience=5,
         min_lr=1e-6
     )
-    # Huấn luyện mô hình với dữ liệu được tăng cường
-    history = model.fit(datagen.flow(x_train, y_train,
-                                    batch_size=batch_size),
-                                    epochs=epochs,
-                                    validation_data=(x_test, y_test))
+    # Huấn luyện mô hình với dữ liệu được tăng cường.
+    # Pipeline tf.data dùng thông số AUGMENT_CONFIG và biến đổi cả batch song song.
+    # EarlyStopping/ReduceLROnPlateau được áp dụng, checkpoint được lưu sau mỗi epoch vào
+    # saved_models/checkpoints/<hash cấu hình mô hình>; chạy lại ô này với cùng mô hình sẽ tiếp
+    # tục từ checkpoint mới nhất, đổi kiến trúc hay siêu tham số sẽ huấn luyện lại từ đầu.
+    train_ds = input_pipeline.make_train_dataset(x_train, y_train, batch_size=batch_size)
+    history = training.fit_with_checkpoints(model, train_ds,
+                                            epochs=epochs,
+                                            checkpoint_dir=training.CHECKPOINT_DIR,
+                                            callbacks=[training.ThroughputLogger(batch_size),
+                                                       early_stopping, lr_scheduler],
+                                            validation_data=test_ds)
 
 """## **4. Kết quả huấn luyện**"""
 
@@ -296,39 +244,18 @@ plotmodelhistory(history)
 
 """### **4.1 Thông số Accuracy và Loss**"""
 
+# Dự đoán một lần trên toàn bộ tập kiểm tra; loss, accuracy, ma trận nhầm lẫn, báo cáo
+# và phân tích lỗi bên dưới đều tính từ kết quả này (xem evaluation.py)
+test_results = evaluation.evaluate_model(model, x_test, y_test)
+
 # in ra độ chính xác và hàm mất mát của mô hình sau khi huấn luyện
-scores = model.evaluate(x_test, y_test, verbose=1)
-print('Test loss:', scores[0])
-print('Test accuracy:', scores[1])
+print('Test loss:', test_results.loss)
+print('Test accuracy:', test_results.accuracy)
 
 """### **4.2 Ma trận nhầm lẫn**"""
 
 labels = ['Airplane', 'Automobile', 'Bird', 'Cat', 'Deer', 'Dog', 'Frog', 'Horse', 'Ship', 'Truck']
 
-Y_pred_classes = np.argmax(pred, axis=1)
-Y_true = np.argmax(y_test, axis=1)
-# Lỗi là sự khác biệt giữa nhãn dự đoán và nhãn thực
-errors = (Y_pred_classes - Y_true != 0)
-
-Y_pred_classes_errors = Y_pred_classes[errors]
-Y_pred_errors = pred[errors]
-Y_true_errors = Y_true[errors]
-X_test_errors = x_test[errors]
-
-cm = confusion_matrix(Y_true, Y_pred_classes)
-thresh = cm.max() / 2.
-
-fig, ax = plt.subplots(figsize=(12,12))
-im, cbar = heatmap(cm, labels, labels, ax=ax,
-                   cmap=plt.cm.Blues, cbarlabel="count of predictions")
-texts = annotate_heatmap(im, data=cm, threshold=thresh)
-
-fig.tight_layout()
-plt.show()
-
-# đưa ra dự đoán
-pred = model.predict(x_test)
-
 def heatmap(data, row_labels, col_labels, ax=None, cbar_kw={}, cbarlabel="", **kwargs):
     """
    Tạo một biểu đồ nhiệt từ một mảng numpy và hai danh sách nhãn
@@ -361,19 +288,37 @@ def annotate_heatmap(im, data=None, fmt="d", threshold=None):
     """
     Một hàm để chú thích biểu đồ nhiệt
     """
+    if threshold is None:
+        threshold = data.max() / 2.
     # Thay đổi màu tùy thuộc vào dữ liệu.
     texts = []
     for i in range(data.shape[0]):
         for j in range(data.shape[1]):
             text = im.axes.text(j, i, format(data[i, j], fmt), horizontalalignment="center",
-                                 color="white" if data[i, j] > thresh else "black")
+                                 color="white" if data[i, j] > threshold else "black")
             texts.append(text)
 
     return texts
 
+# Xác suất dự đoán, lớp dự đoán và lớp thật (từ lần dự đoán ở mục 4.1)
+pred = test_results.probabilities
+Y_pred_classes = test_results.predicted
+Y_true = test_results.true
+
+cm = test_results.confusion
+thresh = cm.max() / 2.
+
+fig, ax = plt.subplots(figsize=(12,12))
+im, cbar = heatmap(cm, labels, labels, ax=ax,
+                   cmap=plt.cm.Blues, cbarlabel="count of predictions")
+texts = annotate_heatmap(im, data=cm, threshold=thresh)
+
+fig.tight_layout()
+plt.show()
+
 """### **4.3 Báo cáo đánh giá hiệu xuất mô hình**"""
 
-print(classification_report(Y_true, Y_pred_classes))
+print(evaluation.classification_report(test_results, labels))
 
 """## **5. Dự đoán ảnh trên tập kiểm tra**"""
 
@@ -447,37 +392,29 @@ def display_errors(errors_index, img_errors, pred_errors, obs_errors, pred_probs
             ax[row, col].axis('off')
             plt.subplots_adjust(wspace=1)
 
-# Xác suất của các số dự đoán sai
-Y_pred_errors_prob = np.max(Y_pred_errors, axis=1)
-
-# Xác suất dự đoán của các giá trị thực trong tập lỗi
-true_prob_errors = np.diagonal(np.take(Y_pred_errors, Y_true_errors, axis=1))
-
-# Sự khác biệt giữa xác suất của nhãn dự đoán và nhãn thực
-delta_pred_true_errors = Y_pred_errors_prob - true_prob_errors
-
-# Danh sách sắp xếp các lỗi
-sorted_dela_errors = np.argsort(delta_pred_true_errors)
-
-# 10 lỗi hàng đầu
-most_important_errors = sorted_dela_errors[-10:]
+# 10 lỗi có chênh lệch lớn nhất giữa xác suất lớp dự đoán và lớp thật
+# (gather O(N) trên toàn bộ tập, không tạo ma trận N x N)
+most_important_errors = evaluation.most_important_errors(test_results, k=10)
 
 # Hiển thị 10 lỗi hàng đầu với xác suất dự đoán
-display_errors(most_important_errors, X_test_errors, Y_pred_classes_errors, Y_true_errors, Y_pred_errors_prob)
+display_errors(most_important_errors, x_test, Y_pred_classes, Y_true, test_results.confidences)
 
 """### **5.3 Dự đoán ảnh với lớp có xác xuất cao nhất**"""
 
+# Dự đoán theo batch cố định bằng tf.function (không trace lại cho mỗi ảnh).
+# Kết quả được lưu trong saved_models/prediction_cache.sqlite theo hash trọng số + hash ảnh,
+# nên chạy lại notebook với cùng mô hình không phải dự đoán lại; huấn luyện lại sẽ đổi khóa.
+prediction_cache = PredictionCache()
+test_predictor = Predictor(model=model, labels=labels, cache=prediction_cache)
+
 # Kiểm thử mô hình với các ảnh kiểm thử trong bộ kiểm thử.
 def show_test(number):
     fig = plt.figure(figsize=(3, 3))
 
-    # Lấy một hình ảnh từ tập kiểm tra và mở rộng chiều để phù hợp với đầu vào của mô hình
-    test_image = np.expand_dims(x_test[number], axis=0)
-
     # Dự đoán lớp với xác suất, sau đó chuyển đổi xác suất thành lớp
-    test_result = model.predict(test_image)
-    dict_key = np.argmax(test_result, axis=1)[0]  # Chọn lớp có xác suất cao nhất
-    confidence = test_result[0][dict_key]  # Lấy xác suất dự đoán của lớp được chọn
+    result = test_predictor.predict(x_test[number:number + 1])
+    dict_key = result.indices[0]  # Chọn lớp có xác suất cao nhất
+    confidence = result.confidences[0]  # Lấy xác suất dự đoán của lớp được chọn
 
     # Vẽ hình ảnh và hiển thị nhãn dự đoán, nhãn thực tế, và xác suất
     plt.imshow(x_test[number])
@@ -505,10 +442,9 @@ model_path = os.path.join(save_dir, model_name)
 model.save(model_path)
 print('Saved trained model at %s ' % model_path)
 
-# Đánh giá mô hình trên tập kiểm tra
-scores = model.evaluate(x_test, y_test, verbose=1)
-print('Test loss:', scores[0])
-print('Test accuracy:', scores[1])
+# Kết quả đánh giá trên tập kiểm tra (mục 4.1, cùng trọng số với mô hình vừa lưu)
+print('Test loss:', test_results.loss)
+print('Test accuracy:', test_results.accuracy)
 
 """### **5.5 Dự đoán ảnh ngoài tập dữ liệu**"""
 
@@ -519,12 +455,15 @@ model = load_model(model_path)
 # Danh sách các lớp (nhãn)
 labels = ['Airplane', 'Automobile', 'Bird', 'Cat', 'Deer', 'Dog', 'Frog', 'Horse', 'Ship', 'Truck']
 
+# Bộ dự đoán theo batch dùng cho ảnh tải lên (ảnh đã tải lên trước đó được lấy từ cache)
+predictor = Predictor(model=model, labels=labels, cache=prediction_cache)
+
 # Hàm dự đoán từ ảnh
-def predict_image(model, img_path):
+def predict_image(predictor, img_path):
     """
     Dự đoán lớp từ ảnh đầu vào.
     Args:
-        model: Mô hình đã huấn luyện.
+        predictor: Predictor bao mô hình đã huấn luyện.
         img_path: Đường dẫn ảnh.
     Returns:
         original_image: Ảnh gốc (PIL Image).
@@ -537,13 +476,12 @@ def predict_image(model, img_path):
     # Resize ảnh để phù hợp với mô hình
     resized_image = original_image.resize((32, 32))
     img_array = image.img_to_array(resized_image)  # Chuyển ảnh thành numpy array
-    img_array = np.expand_dims(img_array, axis=0)  # Mở rộng chiều batch
-    img_array = img_array / 255.0  # Chuẩn hóa giá trị pixel
+    img_array = np.expand_dims(img_array, axis=0)  # Mở rộng chiều batch (chuẩn hóa /255 thực hiện trong predictor)
 
     # Dự đoán
-    predictions = model.predict(img_array)
-    predicted_index = np.argmax(predictions, axis=1)[0]  # Lấy lớp có xác suất cao nhất
-    predicted_class = labels[predicted_index]  # Lấy tên lớp từ danh sách labels
+    result = predictor.predict(img_array)
+    predicted_index = result.indices[0]  # Lấy lớp có xác suất cao nhất
+    predicted_class = result.names[0]  # Lấy tên lớp từ danh sách labels
 
     return original_image, img_array.shape, predicted_index, predicted_class
 
@@ -559,7 +497,7 @@ def on_file_upload(change):
     loading_label.value = "<p style='font-size: 16px; color: #d32f2f;'>Đang tiến hành dự đoán...</p>"
 
     # Dự đoán kết quả
-    original_image, processed_size, predicted_index, predicted_class = predict_image(model, image_path)
+    original_image, processed_size, predicted_index, predicted_class = predict_image(predictor, image_path)
 
     # Chuyển ảnh gốc sang Base64 để hiển thị
     buffer_input = BytesIO()
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""Dò siêu tham số (learning rate, batch size, l2, Dropout) với nhiều trial song song và loại sớm trial kém.
+
+Mỗi trial xây dựng đúng kiến trúc của mục 3 bằng `cnn_model.build_model` từ một
+config (weight_decay, conv_dropout, dense_dropout) rồi compile với learning_rate
+của config và huấn luyện với batch_size của config.
+- Các trial chạy đồng thời trong một process pool có số tiến trình bằng số lõi CPU;
+  mỗi tiến trình mở dữ liệu từ cache memory-map của `cifar10_local` một lần và
+  dùng lại cho mọi trial nó chạy.
+- Lịch ASHA (asynchronous successive halving): trial được huấn luyện theo các mốc
+  (rung) min_epochs, min_epochs * eta, ... max_epochs; sau mỗi mốc, chỉ trial nằm
+  trong nhóm 1/eta có val_loss tốt nhất của mốc đó mới được huấn luyện tiếp (tiếp
+  tục từ file .keras đã lưu), còn lại bị dừng. Không cần chờ cả mốc hoàn thành nên
+  các tiến trình không phải đứng chờ nhau.
+- Kết quả từng mốc được ghi vào SQLite (saved_models/sweeps/sweeps.sqlite) để xếp
+  hạng config theo độ chính xác trên mỗi giờ CPU.
+Validation là `val_size` ảnh cuối của tập huấn luyện, tập test không được dùng để chọn config.
+
+Cách chạy:
+    python sweep.py --trials 16 --max-epochs 27 --min-epochs 3 --eta 3
+    python sweep.py --rank --name sweep-20240101-120000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+SWEEP_DIR = os.path.join('saved_models', 'sweeps')
+DB_PATH = os.path.join(SWEEP_DIR, 'sweeps.sqlite')
+
+# Config của mục 3.1 và không gian tìm kiếm (mỗi trial chọn ngẫu nhiên một giá trị cho từng khóa)
+DEFAULT_CONFIG = {'learning_rate': 0.0001, 'batch_size': 32, 'weight_decay': 0.001,
+                  'conv_dropout': 0.25, 'dense_dropout': 0.4}
+SEARCH_SPACE = {
+    'learning_rate': [0.00003, 0.0001, 0.0003, 0.001],
+    'batch_size': [32, 64, 128],
+    'weight_decay': [0.0001, 0.0003, 0.001, 0.003],
+    'conv_dropout': [0.1, 0.25, 0.4],
+    'dense_dropout': [0.2, 0.4, 0.5],
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS trials (
+    sweep TEXT NOT NULL,
+    trial_id INTEGER NOT NULL,
+    config TEXT NOT NULL,
+    status TEXT NOT NULL,
+    epochs INTEGER NOT NULL DEFAULT 0,
+    val_loss REAL,
+    val_accuracy REAL,
+    cpu_seconds REAL NOT NULL DEFAULT 0,
+    wall_seconds REAL NOT NULL DEFAULT 0,
+    updated REAL NOT NULL,
+    PRIMARY KEY (sweep, trial_id)
+);
+CREATE TABLE IF NOT EXISTS rungs (
+    sweep TEXT NOT NULL,
+    trial_id INTEGER NOT NULL,
+    rung INTEGER NOT NULL,
+    epochs INTEGER NOT NULL,
+    val_loss REAL NOT NULL,
+    val_accuracy REAL NOT NULL,
+    cpu_seconds REAL NOT NULL,
+    wall_seconds REAL NOT NULL,
+    PRIMARY KEY (sweep, trial_id, rung)
+);
+'''
+
+
+def sample_configs(num_trials, space=SEARCH_SPACE, seed=0, include_default=True):
+    """
+    Chọn ngẫu nhiên num_trials config (không trùng nhau) từ không gian tìm kiếm.
+    Args:
+        include_default: Trial đầu tiên là config gốc của mục 3.1 để làm mốc so sánh.
+    """
+    rng = np.random.RandomState(seed)
+    configs = [dict(DEFAULT_CONFIG)] if include_default else []
+    seen = set(json.dumps(c, sort_keys=True) for c in configs)
+    # Số config khác nhau có thể chọn được, cộng thêm config gốc nếu nó nằm ngoài không gian tìm kiếm
+    total = int(np.prod([len(values) for values in space.values()]))
+    default_outside = any(DEFAULT_CONFIG.get(key) not in values for key, values in space.items())
+    limit = min(num_trials, total + int(include_default and default_outside))
+    while len(configs) < limit:
+        config = dict(DEFAULT_CONFIG)
+        config.update((key, values[rng.randint(len(values))]) for key, values in space.items())
+        key = json.dumps(config, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs[:num_trials]
+
+
+def rung_epochs(min_epochs, max_epochs, eta):
+    """Số epoch tích lũy tại mỗi mốc: min_epochs, min_epochs * eta, ..., max_epochs."""
+    epochs = [min_epochs]
+    while epochs[-1] * eta < max_epochs:
+        epochs.append(epochs[-1] * eta)
+    if epochs[-1] != max_epochs:
+        epochs.append(max_epochs)
+    return epochs
+
+
+class SweepStore(object):
+    """Lưu trial và kết quả từng mốc của các lần dò trong SQLite. Chỉ tiến trình điều phối ghi vào."""
+
+    def __init__(self, path=DB_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def add_trial(self, sweep, trial_id, config):
+        self._conn.execute('INSERT OR REPLACE INTO trials (sweep, trial_id, config, status, updated) '
+                           'VALUES (?, ?, ?, ?, ?)', (sweep, trial_id, json.dumps(config, sort_keys=True),
+                                                      'running', time.time()))
+        self._conn.commit()
+
+    def record_rung(self, sweep, trial_id, rung, result, status):
+        """Ghi kết quả một mốc và cập nhật tổng hợp của trial (thời gian CPU cộng dồn)."""
+        self._conn.execute('INSERT OR REPLACE INTO rungs VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                           (sweep, trial_id, rung, result['epochs'], result['val_loss'], result['val_accuracy'],
+                            result['cpu_seconds'], result['wall_seconds']))
+        self._conn.execute('UPDATE trials SET status = ?, epochs = ?, val_loss = ?, val_accuracy = ?, '
+                           'cpu_seconds = cpu_seconds + ?, wall_seconds = wall_seconds + ?, updated = ? '
+                           'WHERE sweep = ? AND trial_id = ?',
+                           (status, result['epochs'], result['val_loss'], result['val_accuracy'],
+                            result['cpu_seconds'], result['wall_seconds'], time.time(), sweep, trial_id))
+        self._conn.commit()
+
+    def set_status(self, sweep, trial_id, status):
+        self._conn.execute('UPDATE trials SET status = ?, updated = ? WHERE sweep = ? AND trial_id = ?',
+                           (status, time.time(), sweep, trial_id))
+        self._conn.commit()
+
+    def sweeps(self):
+        return [row[0] for row in self._conn.execute('SELECT DISTINCT sweep FROM trials ORDER BY sweep')]
+
+    def rank(self, sweep, limit=10, status='completed'):
+        """
+        Các trial của một lần dò có trạng thái `status`, xếp theo độ chính xác validation trên mỗi giờ CPU.
+        Chỉ nên so sánh các trial cùng trạng thái: trial bị loại sớm tốn ít CPU nên luôn có
+        tỉ lệ cao hơn trial chạy hết các mốc.
+        Returns:
+            Danh sách dict (trial_id, config, status, epochs, val_loss, val_accuracy, cpu_hours, accuracy_per_cpu_hour).
+        """
+        rows = self._conn.execute(
+            'SELECT trial_id, config, status, epochs, val_loss, val_accuracy, cpu_seconds / 3600.0 AS cpu_hours, '
+            'val_accuracy / MAX(cpu_seconds / 3600.0, 1e-9) AS per_hour FROM trials '
+            'WHERE sweep = ? AND status = ? AND val_accuracy IS NOT NULL ORDER BY per_hour DESC LIMIT ?',
+            (sweep, status, limit))
+        keys = ['trial_id', 'config', 'status', 'epochs', 'val_loss', 'val_accuracy', 'cpu_hours',
+                'accuracy_per_cpu_hour']
+        ranked = [dict(zip(keys, row)) for row in rows]
+        for row in ranked:
+            row['config'] = json.loads(row['config'])
+        return ranked
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Trạng thái của mỗi tiến trình con: dữ liệu được mở một lần và dùng lại cho mọi trial
+_WORKER = {}
+
+
+def _init_worker(data_dir, cache_dir, val_size, train_size, threads, augment):
+    import tensorflow as tf
+    import cifar10_local
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+    (x_train, y_train), _ = cifar10_local.load_data(data_dir, cache_dir)
+    y_train = tf.keras.utils.to_categorical(y_train, 10)
+    x_val, y_val = x_train[-val_size:], y_train[-val_size:]
+    x_train, y_train = x_train[:-val_size], y_train[:-val_size]
+    if train_size:
+        x_train, y_train = x_train[:train_size], y_train[:train_size]
+    # x_train / x_val là các lát cắt của memmap dùng chung: pipeline lấy từng batch theo chỉ số
+    # từ memmap, nên mọi worker đọc ảnh qua cùng page cache thay vì mỗi worker giữ một bản sao
+    _WORKER.update(x_train=x_train, y_train=y_train, x_val=x_val, y_val=y_val, augment=augment, datasets={})
+
+
+def _datasets(batch_size):
+    import input_pipeline
+
+    datasets = _WORKER['datasets']
+    if 'val' not in datasets:
+        datasets['val'] = input_pipeline.make_eval_dataset(_WORKER['x_val'], _WORKER['y_val'])
+    if batch_size not in datasets:
+        datasets[batch_size] = input_pipeline.make_train_dataset(
+            _WORKER['x_train'], _WORKER['y_train'], batch_size=batch_size, augment=_WORKER['augment'])
+    return datasets[batch_size], datasets['val']
+
+
+def _run_rung(config, initial_epoch, epochs, model_path):
+    """Huấn luyện một trial từ initial_epoch tới epochs (tiếp tục từ model_path nếu đã có)."""
+    import tensorflow as tf
+    import cnn_model
+
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    if initial_epoch and os.path.exists(model_path):
+        model = tf.keras.models.load_model(model_path)
+    else:
+        model = cnn_model.build_model(weight_decay=config['weight_decay'], conv_dropout=config['conv_dropout'],
+                                      dense_dropout=config['dense_dropout'])
+        model = cnn_model.compile_model(model, learning_rate=config['learning_rate'])
+    train_ds, val_ds = _datasets(config['batch_size'])
+    history = model.fit(train_ds, validation_data=val_ds, initial_epoch=initial_epoch, epochs=epochs, verbose=0)
+    tmp_path = model_path + '.tmp.keras'
+    model.save(tmp_path)
+    os.replace(tmp_path, model_path)
+    tf.keras.backend.clear_session()
+    return {'epochs': epochs, 'val_loss': float(history.history['val_loss'][-1]),
+            'val_accuracy': float(history.history['val_accuracy'][-1]),
+            'cpu_seconds': time.process_time() - start_cpu, 'wall_seconds': time.perf_counter() - start_wall}
+
+
+class ASHAScheduler(object):
+    """
+    Chọn việc tiếp theo theo ASHA: ưu tiên đưa một trial lên mốc cao hơn nếu nó thuộc
+    nhóm 1/eta tốt nhất (val_loss nhỏ nhất) trong số các trial đã xong mốc hiện tại,
+    nếu không thì bắt đầu một trial mới.
+    """
+
+    def __init__(self, num_trials, rungs, eta):
+        self.num_trials = num_trials
+        self.rungs = rungs
+        self.eta = eta
+        self.results = [{} for _ in rungs]  # mốc -> {trial_id: val_loss}
+        self.promoted = [set() for _ in rungs]
+        self.started = 0
+
+    def next_job(self):
+        """Trả về (trial_id, mốc) cần chạy, hoặc None nếu hiện chưa có việc."""
+        for rung in range(len(self.rungs) - 2, -1, -1):
+            finished = sorted(self.results[rung].items(), key=lambda item: item[1])
+            for trial_id, _ in finished[:len(finished) // self.eta]:
+                if trial_id not in self.promoted[rung]:
+                    self.promoted[rung].add(trial_id)
+                    return trial_id, rung + 1
+        if self.started < self.num_trials:
+            self.started += 1
+            return self.started - 1, 0
+        return None
+
+    def report(self, trial_id, rung, val_loss):
+        self.results[rung][trial_id] = val_loss
+
+    def stopped(self):
+        """Các trial dừng trước mốc cuối (bị loại)."""
+        last = len(self.rungs) - 1
+        done = set(self.results[last])
+        return sorted(set(t for rung in self.results[:last] for t in rung) - done)
+
+
+def run_sweep(num_trials=16, min_epochs=3, max_epochs=27, eta=3, space=SEARCH_SPACE, seed=0, name=None,
+              num_workers=None, db_path=DB_PATH, data_dir=None, cache_dir=None, val_size=5000, train_size=None,
+              augment=True, keep_models=False):
+    """
+    Chạy một lần dò siêu tham số.
+    Args:
+        num_trials: Số config được thử.
+        min_epochs, max_epochs, eta: Mốc ASHA (xem `rung_epochs`) và tỉ lệ giữ lại 1/eta.
+        space: Không gian tìm kiếm, dict khóa -> danh sách giá trị.
+        seed: Seed chọn config.
+        name: Tên lần dò (mặc định theo thời gian).
+        num_workers: Số tiến trình (mặc định bằng số lõi CPU).
+        db_path: File SQLite lưu kết quả.
+        data_dir, cache_dir: Dữ liệu CIFAR-10 (mặc định của cifar10_local).
+        val_size: Số ảnh cuối của tập huấn luyện dùng làm validation.
+        train_size: Chỉ dùng train_size ảnh đầu để huấn luyện (None để dùng hết).
+        augment: Tăng cường dữ liệu khi huấn luyện.
+        keep_models: Giữ file .keras của các trial bị loại.
+    Returns:
+        Tên lần dò.
+    """
+    import cifar10_local
+
+    if val_size <= 0:
+        raise ValueError('val_size phải lớn hơn 0 (validation là val_size ảnh cuối của tập huấn luyện)')
+    name = name or time.strftime('sweep-%Y%m%d-%H%M%S')
+    num_workers = num_workers or os.cpu_count()
+    threads = max(1, os.cpu_count() // num_workers)
+    model_dir = os.path.join(os.path.dirname(db_path) or '.', name)
+    if not os.path.isdir(model_dir):
+        os.makedirs(model_dir)
+    # Tạo cache dữ liệu một lần trước khi các tiến trình con cùng mở nó
+    data_dir = data_dir or cifar10_local.DATA_DIR
+    cache_dir = cache_dir or cifar10_local.CACHE_DIR
+    cifar10_local.load_data(data_dir, cache_dir)
+
+    configs = sample_configs(num_trials, space, seed)
+    rungs = rung_epochs(min_epochs, max_epochs, eta)
+    scheduler = ASHAScheduler(len(configs), rungs, eta)
+    print('%s: %d trial, mốc %s epoch, %d tiến trình x %d luồng' % (name, len(configs), rungs, num_workers,
+                                                                    threads))
+    # spawn thay cho fork: TensorFlow không an toàn khi fork sau khi đã khởi tạo
+    context = multiprocessing.get_context('spawn')
+    with SweepStore(db_path) as store, ProcessPoolExecutor(
+            num_workers, mp_context=context, initializer=_init_worker,
+            initargs=(data_dir, cache_dir, val_size, train_size, threads, augment)) as executor:
+        running = {}
+        while True:
+            while len(running) < num_workers:
+                job = scheduler.next_job()
+                if job is None:
+                    break
+                trial_id, rung = job
+                if rung == 0:
+                    store.add_trial(name, trial_id, configs[trial_id])
+                else:
+                    store.set_status(name, trial_id, 'running')
+                initial_epoch = rungs[rung - 1] if rung else 0
+                path = os.path.join(model_dir, 'trial-%03d.keras' % trial_id)
+                future = executor.submit(_run_rung, configs[trial_id], initial_epoch, rungs[rung], path)
+                running[future] = (trial_id, rung)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial_id, rung = running.pop(future)
+                result = future.result()
+                scheduler.report(trial_id, rung, result['val_loss'])
+                status = 'completed' if rung == len(rungs) - 1 else 'paused'
+                store.record_rung(name, trial_id, rung, result, status)
+                print('trial %3d  mốc %d (%3d epoch)  val_loss %.4f  val_accuracy %.4f  %.0f s CPU' % (
+                    trial_id, rung, result['epochs'], result['val_loss'], result['val_accuracy'],
+                    result['cpu_seconds']))
+
+        for trial_id in scheduler.stopped():
+            store.set_status(name, trial_id, 'pruned')
+            if not keep_models:
+                path = os.path.join(model_dir, 'trial-%03d.keras' % trial_id)
+                if os.path.exists(path):
+                    os.remove(path)
+        print_ranking(store, name)
+    return name
+
+
+def print_ranking(store, sweep, limit=10):
+    """
+    In bảng xếp hạng các trial đã chạy hết các mốc theo độ chính xác trên mỗi giờ CPU,
+    sau đó là bảng riêng cho các trial bị loại sớm.
+    """
+    rows = store.rank(sweep, limit)
+    _print_rows(rows)
+    pruned = store.rank(sweep, limit, status='pruned')
+    if pruned:
+        print('Trial bị loại sớm (không so sánh trực tiếp với bảng trên):')
+        _print_rows(pruned)
+    return rows
+
+
+def _print_rows(rows):
+    print('%5s %-10s %6s %9s %9s %9s %10s  %s' % ('trial', 'trạng thái', 'epoch', 'val_loss', 'val_acc',
+                                                 'giờ CPU', 'acc/giờ', 'config'))
+    for row in rows:
+        print('%5d %-10s %6d %9.4f %9.4f %9.3f %10.3f  %s' % (
+            row['trial_id'], row['status'], row['epochs'], row['val_loss'], row['val_accuracy'], row['cpu_hours'],
+            row['accuracy_per_cpu_hour'], json.dumps(row['config'], sort_keys=True)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--trials', type=int, default=16)
+    parser.add_argument('--min-epochs', type=int, default=3)
+    parser.add_argument('--max-epochs', type=int, default=27)
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--space', help='File JSON thay cho SEARCH_SPACE (khóa -> danh sách giá trị)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--name', help='Tên lần dò')
+    parser.add_argument('--workers', type=int, help='Số tiến trình (mặc định bằng số lõi CPU)')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--val-size', type=int, default=5000)
+    parser.add_argument('--train-size', type=int)
+    parser.add_argument('--no-augment', action='store_true')
+    parser.add_argument('--keep-models', action='store_true', help='Giữ mô hình của các trial bị loại')
+    parser.add_argument('--rank', action='store_true', help='Chỉ in bảng xếp hạng của lần dò --name (hoặc mới nhất)')
+    args = parser.parse_args()
+
+    if args.rank:
+        with SweepStore(args.db) as store:
+            print_ranking(store, args.name or store.sweeps()[-1])
+    else:
+        space = SEARCH_SPACE
+        if args.space:
+            with open(args.space) as f:
+                space = json.load(f)
+        run_sweep(args.trials, args.min_epochs, args.max_epochs, args.eta, space, args.seed, args.name,
+                  args.workers, args.db, val_size=args.val_size, train_size=args.train_size,
+                  augment=not args.no_augment, keep_models=args.keep_models)
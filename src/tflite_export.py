@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Xuất mô hình sang TFLite (float32, float16, dynamic-range, full int8) và so sánh.
+
+Lượng tử hóa full int8 cần một tập hiệu chỉnh (calibration) lấy ngẫu nhiên từ
+x_train. Báo cáo so sánh độ chính xác trên tập kiểm tra (như `model.evaluate`
+ở mục 4.1), kích thước file và độ trễ trên CPU với 1 ảnh và theo batch.
+
+Cách chạy:
+    python tflite_export.py --model saved_models/keras_cifar10_trained_model.keras
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from predictor import MODEL_PATH
+from tflite_runner import TFLiteRunner
+
+VARIANTS = ['float32', 'float16', 'dynamic', 'int8']
+EXPORT_DIR = os.path.join('saved_models', 'tflite')
+
+
+def convert(model, variant, calibration_images=None):
+    """
+    Chuyển mô hình Keras sang TFLite.
+    Args:
+        model: Mô hình Keras (đầu vào float32 trong [0, 1]).
+        variant: 'float32', 'float16', 'dynamic' (trọng số int8) hoặc 'int8' (toàn bộ int8).
+        calibration_images: Ảnh uint8 (N, 32, 32, 3) dùng hiệu chỉnh, bắt buộc với 'int8'.
+    Returns:
+        Nội dung file .tflite (bytes).
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if variant == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif variant == 'int8':
+        if calibration_images is None:
+            raise ValueError("Lượng tử hóa 'int8' cần calibration_images.")
+
+        def representative_dataset():
+            for img in calibration_images:
+                yield [np.expand_dims(img, axis=0).astype(np.float32) / 255.]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        # Ảnh uint8 có thể đưa thẳng vào mô hình: scale đầu vào = 1/255, zero point = 0
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+    elif variant != 'float32':
+        raise ValueError('variant không hợp lệ: %s' % variant)
+    return converter.convert()
+
+
+def export_all(model, x_train, export_dir=EXPORT_DIR, num_calibration=500, seed=0):
+    """
+    Xuất tất cả các biến thể vào export_dir.
+    Returns:
+        dict biến thể -> đường dẫn file .tflite.
+    """
+    if not os.path.isdir(export_dir):
+        os.makedirs(export_dir)
+    rng = np.random.default_rng(seed)
+    calibration = np.asarray(x_train[np.sort(rng.choice(len(x_train), num_calibration, replace=False))])
+
+    paths = {}
+    for variant in VARIANTS:
+        path = os.path.join(export_dir, 'cifar10_cnn_%s.tflite' % variant)
+        with open(path, 'wb') as f:
+            f.write(convert(model, variant, calibration))
+        paths[variant] = path
+        print('Đã xuất %s (%.1f KB)' % (path, os.path.getsize(path) / 1024.))
+    return paths
+
+
+def _latency_ms(predict_fn, images, repeats):
+    predict_fn(images)  # Khởi tạo trước khi đo
+    start = time.perf_counter()
+    for _ in range(repeats):
+        predict_fn(images)
+    return (time.perf_counter() - start) / repeats * 1000.
+
+
+def report(model, paths, x_test, y_test, keras_path=None, batch_size=64, repeats=50):
+    """
+    So sánh độ chính xác, kích thước và độ trễ giữa mô hình Keras và các biến thể TFLite.
+    Args:
+        model: Mô hình Keras gốc.
+        paths: dict biến thể -> đường dẫn .tflite (kết quả của `export_all`).
+        x_test: Ảnh uint8 của tập kiểm tra.
+        y_test: Nhãn (chỉ số lớp hoặc one-hot).
+        keras_path: Đường dẫn file .keras để lấy kích thước.
+    Returns:
+        dict tên -> {'accuracy', 'size_kb', 'latency_1_ms', 'latency_batch_ms'}.
+    """
+    y_true = np.asarray(y_test)
+    y_true = np.argmax(y_true, axis=1) if y_true.ndim == 2 and y_true.shape[1] > 1 else y_true.ravel()
+    single = np.asarray(x_test[:1])
+    batch = np.asarray(x_test[:batch_size])
+
+    def keras_predict(images):
+        return model.predict_on_batch(images.astype(np.float32) / 255.)
+
+    candidates = [('keras float32', keras_predict, keras_path)]
+    for variant, path in paths.items():
+        runner = TFLiteRunner(path)
+        candidates.append(('tflite ' + variant,
+                           lambda images, runner=runner: runner.predict_proba(images, batch_size), path))
+
+    results = {}
+    for name, predict_fn, path in candidates:
+        probs = np.concatenate([predict_fn(np.asarray(x_test[i:i + batch_size]))
+                                for i in range(0, len(x_test), batch_size)])
+        results[name] = {
+            'accuracy': float(np.mean(np.argmax(probs, axis=1) == y_true)),
+            'size_kb': os.path.getsize(path) / 1024. if path else None,
+            'latency_1_ms': _latency_ms(predict_fn, single, repeats),
+            'latency_batch_ms': _latency_ms(predict_fn, batch, max(1, repeats // 5)),
+        }
+
+    print('%-16s %10s %12s %14s %20s' % ('Mô hình', 'Accuracy', 'Kích thước', '1 ảnh (ms)',
+                                         'Batch %d (ms/ảnh)' % batch_size))
+    for name, r in results.items():
+        size = '%9.1f KB' % r['size_kb'] if r['size_kb'] is not None else '%12s' % '-'
+        print('%-16s %10.4f %s %14.3f %20.3f' % (name, r['accuracy'], size, r['latency_1_ms'],
+                                                 r['latency_batch_ms'] / batch_size))
+    return results
+
+
+if __name__ == '__main__':
+    import cifar10_local
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--export-dir', default=EXPORT_DIR)
+    parser.add_argument('--num-calibration', type=int, default=500)
+    args = parser.parse_args()
+
+    (x_train, _), (x_test, y_test) = cifar10_local.load_data()
+    model = tf.keras.models.load_model(args.model)
+    paths = export_all(model, x_train, args.export_dir, args.num_calibration)
+    report(model, paths, x_test, y_test, keras_path=args.model)
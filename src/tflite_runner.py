@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Chạy mô hình TFLite mà không cần import TensorFlow nếu có thể.
+
+Interpreter được chọn theo thứ tự: `ai_edge_litert` (LiteRT), `tflite_runtime`,
+rồi mới tới `tf.lite` của TensorFlow. Hai gói đầu chỉ vài MB và import trong
+vài chục ms, trong khi `import tensorflow` mất nhiều giây.
+"""
+
+import numpy as np
+
+
+def make_interpreter(model_path, num_threads=None):
+    """Tạo interpreter TFLite từ gói nhẹ nhất đang được cài đặt."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=model_path, num_threads=num_threads)
+
+
+class TFLiteRunner(object):
+    """
+    Chạy mô hình TFLite trên CPU, nhận ảnh uint8 và trả về xác suất float32.
+    Args:
+        model_path: Đường dẫn file .tflite.
+        num_threads: Số luồng của interpreter.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        self.interpreter = make_interpreter(model_path, num_threads)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = [batch_size] + list(self._input['shape'][1:])
+            self.interpreter.resize_tensor_input(self._input['index'], shape)
+            self.interpreter.allocate_tensors()
+            self._batch_size = batch_size
+
+    def predict_proba(self, images, batch_size=64):
+        """
+        Dự đoán trên mảng ảnh uint8 (N, 32, 32, 3).
+        Returns:
+            Mảng xác suất float32 (N, số lớp).
+        """
+        images = np.asarray(images)
+        outputs = []
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            self._resize(len(batch))
+            dtype = self._input['dtype']
+            if dtype == np.float32:
+                batch = batch.astype(np.float32) / 255.
+            else:
+                # Lượng tử hóa theo tham số đầu vào của mô hình
+                scale, zero_point = self._input['quantization']
+                batch = np.clip(np.round(batch / 255. / scale + zero_point),
+                                np.iinfo(dtype).min, np.iinfo(dtype).max).astype(dtype)
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])
+            if self._output['dtype'] != np.float32:
+                scale, zero_point = self._output['quantization']
+                output = (output.astype(np.float32) - zero_point) * scale
+            outputs.append(output)
+        return np.concatenate(outputs)
@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""Các chế độ huấn luyện (fp32, XLA, mixed precision) và đo thông lượng.
+
+Chế độ:
+    fp32        float32, không XLA (giống mục 3.1).
+    xla         float32, bước huấn luyện biên dịch bằng XLA (jit_compile=True).
+    mixed_bf16  XLA + chính sách mixed_bfloat16 nếu CPU hỗ trợ bfloat16
+                (AVX512_BF16/AMX), nếu không sẽ quay về float32.
+    mixed_fp16  XLA + chính sách mixed_float16 với LossScaleOptimizer.
+
+bfloat16 có cùng khoảng số mũ với float32 nên không bị tràn dưới gradient;
+loss scaling chỉ bắt buộc với float16 nhưng có thể bật cho bfloat16 bằng
+`loss_scale=True`.
+
+Huấn luyện có checkpoint: `fit_with_checkpoints` áp dụng các callback (EarlyStopping,
+ReduceLROnPlateau, ...) và định kỳ lưu trọng số, trạng thái optimizer, epoch và trạng
+thái của các callback; khi chạy lại sẽ tiếp tục đúng từ checkpoint mới nhất. Checkpoint
+nằm trong thư mục con đặt tên theo hash của kiến trúc và thiết lập compile, nên đổi
+mô hình, siêu tham số hay chế độ huấn luyện sẽ bắt đầu lại thay vì nạp trọng số cũ.
+
+Cách chạy (so sánh các chế độ, mỗi chế độ trong một tiến trình riêng):
+    python training.py --compare --epochs 3
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+MODES = ['fp32', 'xla', 'mixed_bf16', 'mixed_fp16']
+CHECKPOINT_DIR = os.path.join('saved_models', 'checkpoints')
+
+
+def cpu_supports_bfloat16():
+    """Kiểm tra CPU có lệnh bfloat16 (avx512_bf16 hoặc amx_bf16) hay không."""
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+    except IOError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+
+def configure_training_mode(mode='fp32', loss_scale=None):
+    """
+    Đặt chính sách dtype toàn cục cho chế độ huấn luyện. Cần gọi trước khi xây dựng mô hình.
+    Args:
+        mode: Một trong MODES.
+        loss_scale: Bật LossScaleOptimizer; None để tự chọn (chỉ bật với mixed_fp16).
+    Returns:
+        dict tham số cho `cnn_model.compile_model`: {'jit_compile', 'loss_scale'}.
+    """
+    if mode not in MODES:
+        raise ValueError('Chế độ không hợp lệ: %s (chọn một trong %s)' % (mode, MODES))
+
+    policy = 'float32'
+    if mode == 'mixed_bf16':
+        if cpu_supports_bfloat16() or tf.config.list_physical_devices('GPU'):
+            policy = 'mixed_bfloat16'
+        else:
+            print('CPU không hỗ trợ bfloat16, dùng float32.')
+    elif mode == 'mixed_fp16':
+        policy = 'mixed_float16'
+    tf.keras.mixed_precision.set_global_policy(policy)
+
+    if loss_scale is None:
+        loss_scale = policy == 'mixed_float16'
+    return {'jit_compile': mode != 'fp32', 'loss_scale': loss_scale}
+
+
+class ThroughputLogger(tf.keras.callbacks.Callback):
+    """
+    Ghi nhận thời gian mỗi bước, số ảnh/giây và thời gian biên dịch theo từng epoch.
+    Các giá trị được thêm vào logs (và history): step_time_ms, images_per_sec, compile_time_s.
+    Args:
+        batch_size: Kích thước batch dùng để tính số ảnh/giây.
+        verbose: In kết quả sau mỗi epoch.
+    """
+
+    def __init__(self, batch_size, verbose=True):
+        super(ThroughputLogger, self).__init__()
+        self.batch_size = batch_size
+        self.verbose = verbose
+        self._first_step = True
+
+    def on_train_begin(self, logs=None):
+        self._first_step = True
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._step_times = []
+        self._compile_time = 0.
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        duration = time.perf_counter() - self._step_start
+        if self._first_step:
+            # Bước đầu tiên gồm cả trace đồ thị và biên dịch XLA
+            self._compile_time = duration
+            self._first_step = False
+        else:
+            self._step_times.append(duration)
+
+    def on_epoch_end(self, epoch, logs=None):
+        if logs is None or not self._step_times:
+            return
+        step_times = np.asarray(self._step_times)
+        logs['step_time_ms'] = float(np.median(step_times) * 1000.)
+        logs['images_per_sec'] = float(len(step_times) * self.batch_size / step_times.sum())
+        logs['compile_time_s'] = float(self._compile_time)
+        if self.verbose:
+            print('Epoch %d: %.2f ms/bước, %.1f ảnh/giây, biên dịch %.2f s' % (
+                epoch + 1, logs['step_time_ms'], logs['images_per_sec'], logs['compile_time_s']))
+
+
+def _drop_names(config):
+    # Tên lớp/optimizer tự tăng (conv2d_3, ...) khi xây lại mô hình trong cùng tiến trình nên không đưa vào hash
+    if isinstance(config, dict):
+        return {key: _drop_names(value) for key, value in config.items() if key != 'name'}
+    if isinstance(config, list):
+        return [_drop_names(value) for value in config]
+    return config
+
+
+def config_hash(model):
+    """
+    Hash SHA-256 của kiến trúc (gồm dtype policy, regularizer, dropout) và thiết lập compile
+    (optimizer, learning rate ban đầu, loss, metrics, jit_compile) của mô hình đã compile.
+    """
+    config = {'model': json.loads(model.to_json()), 'compile': model.get_compile_config()}
+    text = json.dumps(_drop_names(config), sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class TrainingCheckpoint(tf.keras.callbacks.Callback):
+    """
+    Lưu checkpoint định kỳ và khôi phục khi huấn luyện lại.
+    Mỗi checkpoint gồm file ckpt-<epoch>.npz (trọng số mô hình, biến của optimizer, best_weights
+    của callback) và checkpoint.json (epoch kế tiếp, trạng thái callback, history, thời gian).
+    Cả hai được ghi vào file tạm rồi đổi tên; checkpoint.json được ghi cuối cùng nên một lần
+    ghi dở không làm hỏng checkpoint trước đó.
+    Callback này phải đứng sau các callback cần khôi phục trong danh sách callbacks của fit,
+    vì chúng tự đặt lại trạng thái trong on_train_begin.
+    Args:
+        directory: Thư mục checkpoint.
+        callbacks: Các callback cần lưu trạng thái (EarlyStopping, ReduceLROnPlateau, ...).
+        save_every: Số epoch giữa hai lần lưu.
+        verbose: In thông báo khi lưu/khôi phục.
+        config_hash: Hash cấu hình mô hình (`config_hash`) được ghi vào checkpoint.json; nếu
+            checkpoint có sẵn mang hash khác thì báo lỗi thay vì khôi phục.
+    """
+
+    STATE_FILE = 'checkpoint.json'
+    # Thuộc tính trạng thái của EarlyStopping / ReduceLROnPlateau
+    CALLBACK_ATTRIBUTES = ('wait', 'best', 'best_epoch', 'stopped_epoch', 'cooldown_counter')
+
+    def __init__(self, directory=CHECKPOINT_DIR, callbacks=(), save_every=1, verbose=True, config_hash=None):
+        super(TrainingCheckpoint, self).__init__()
+        self.directory = directory
+        self.callbacks = list(callbacks)
+        self.save_every = save_every
+        self.verbose = verbose
+        self.config_hash = config_hash
+        self.state = self._load_state()
+        if self.state and config_hash and self.state.get('config_hash') != config_hash:
+            raise ValueError('Checkpoint trong %s thuộc về mô hình/cấu hình khác (hash %s, hiện tại %s); '
+                             'xóa thư mục hoặc dùng checkpoint_dir khác.'
+                             % (directory, self.state.get('config_hash'), config_hash))
+        self.history = dict(self.state['history']) if self.state else {}
+        self.epoch_times = list(self.state['epoch_times']) if self.state else []
+
+    def _load_state(self):
+        path = os.path.join(self.directory, self.STATE_FILE)
+        if not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    @property
+    def initial_epoch(self):
+        return self.state['epoch'] if self.state else 0
+
+    @property
+    def finished(self):
+        return bool(self.state and self.state['finished'])
+
+    def _optimizer_variables(self, model):
+        optimizer = model.optimizer
+        if not optimizer.built:
+            optimizer.build(model.trainable_variables)
+        return optimizer.variables
+
+    def restore(self, model):
+        """Nạp trọng số, biến optimizer và trạng thái callback từ checkpoint mới nhất."""
+        with np.load(os.path.join(self.directory, self.state['weights_file'])) as data:
+            model.set_weights([data['w%d' % i] for i in range(self.state['num_weights'])])
+            for i, variable in enumerate(self._optimizer_variables(model)):
+                variable.assign(data['o%d' % i])
+            for index, (callback, saved) in enumerate(zip(self.callbacks, self.state['callbacks'])):
+                for name, value in saved['attributes'].items():
+                    setattr(callback, name, value)
+                if saved['num_best_weights']:
+                    callback.best_weights = [data['c%d_%d' % (index, i)]
+                                             for i in range(saved['num_best_weights'])]
+        if self.verbose:
+            print('Khôi phục checkpoint %s (epoch %d).' % (self.state['weights_file'], self.state['epoch']))
+
+    def save(self, epoch, finished=False):
+        """Ghi checkpoint sau khi đã hoàn thành `epoch` epoch."""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        arrays = {}
+        weights = self.model.get_weights()
+        for i, w in enumerate(weights):
+            arrays['w%d' % i] = w
+        for i, variable in enumerate(self._optimizer_variables(self.model)):
+            arrays['o%d' % i] = np.asarray(variable.numpy())
+        callback_states = []
+        for index, callback in enumerate(self.callbacks):
+            attributes = {}
+            for name in self.CALLBACK_ATTRIBUTES:
+                value = getattr(callback, name, None)
+                if isinstance(value, (int, float, np.number)):
+                    attributes[name] = value.item() if isinstance(value, np.number) else value
+            best_weights = getattr(callback, 'best_weights', None) or []
+            for i, w in enumerate(best_weights):
+                arrays['c%d_%d' % (index, i)] = w
+            callback_states.append({'attributes': attributes, 'num_best_weights': len(best_weights)})
+
+        weights_file = 'ckpt-%05d.npz' % epoch
+        weights_path = os.path.join(self.directory, weights_file)
+        with open(weights_path + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(weights_path + '.tmp', weights_path)
+
+        previous = self.state['weights_file'] if self.state else None
+        self.state = {
+            'epoch': epoch,
+            'finished': finished,
+            'weights_file': weights_file,
+            'num_weights': len(weights),
+            'callbacks': callback_states,
+            'history': self.history,
+            'epoch_times': self.epoch_times,
+            'config_hash': self.config_hash,
+        }
+        state_path = os.path.join(self.directory, self.STATE_FILE)
+        with open(state_path + '.tmp', 'w') as f:
+            json.dump(self.state, f)
+        # checkpoint.json được ghi cuối cùng: nó trỏ tới file trọng số đã hoàn chỉnh
+        os.replace(state_path + '.tmp', state_path)
+        if previous and previous != weights_file:
+            os.remove(os.path.join(self.directory, previous))
+        if self.verbose:
+            print('Đã lưu checkpoint %s.' % weights_path)
+
+    def on_train_begin(self, logs=None):
+        if self.state:
+            self.restore(self.model)
+        self._epoch = self.initial_epoch
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch_times.append(time.perf_counter() - self._epoch_start)
+        for key, value in (logs or {}).items():
+            self.history.setdefault(key, []).append(float(value))
+        self._epoch = epoch + 1
+        if self._epoch % self.save_every == 0:
+            self.save(self._epoch)
+
+    def on_train_end(self, logs=None):
+        # Chạy sau EarlyStopping.on_train_end nên trọng số tốt nhất đã được khôi phục
+        self.save(self._epoch, finished=True)
+
+    def report(self, full_epochs=100):
+        """
+        In thời gian huấn luyện thực tế so với ước lượng khi chạy đủ full_epochs epoch
+        (thời gian trung bình mỗi epoch * full_epochs).
+        Returns:
+            dict gồm epochs, elapsed_s, full_run_s, saved_s.
+        """
+        epochs = len(self.epoch_times)
+        if not epochs:
+            return None
+        elapsed = float(sum(self.epoch_times))
+        full_run = elapsed / epochs * full_epochs
+        result = {'epochs': epochs, 'elapsed_s': elapsed, 'full_run_s': full_run,
+                  'saved_s': full_run - elapsed}
+        print('Đã huấn luyện %d/%d epoch trong %.1f s; chạy đủ %d epoch ước tính %.1f s, tiết kiệm %.1f s (%.1f%%)' % (
+            epochs, full_epochs, elapsed, full_epochs, full_run, result['saved_s'],
+            100. * result['saved_s'] / full_run))
+        return result
+
+
+def fit_with_checkpoints(model, train_ds, epochs, checkpoint_dir=CHECKPOINT_DIR, callbacks=(),
+                         save_every=1, verbose='auto', **fit_kwargs):
+    """
+    Huấn luyện với callbacks (ví dụ EarlyStopping, ReduceLROnPlateau) và checkpoint định kỳ.
+    Checkpoint được lưu trong checkpoint_dir/<16 ký tự đầu của config_hash(model)>, nên mỗi kiến
+    trúc / thiết lập compile có checkpoint riêng. Nếu thư mục đó đã có checkpoint, tiếp tục từ
+    epoch đã lưu với cùng trọng số, trạng thái optimizer (gồm learning rate) và trạng thái
+    callback; nếu lần chạy trước đã kết thúc thì chỉ nạp lại trọng số. Xóa thư mục để huấn
+    luyện lại từ đầu.
+    Args:
+        model: Mô hình đã compile (chưa huấn luyện, để hash lấy learning rate ban đầu).
+        train_ds: Dữ liệu huấn luyện.
+        epochs: Số epoch tối đa.
+        checkpoint_dir: Thư mục gốc chứa checkpoint.
+        callbacks: Các callback truyền cho fit; trạng thái của chúng được lưu trong checkpoint.
+        save_every: Số epoch giữa hai lần lưu checkpoint.
+        fit_kwargs: Tham số khác cho model.fit (validation_data, ...).
+    Returns:
+        History gồm toàn bộ các epoch, kể cả các epoch của lần chạy trước.
+    """
+    callbacks = list(callbacks)
+    key = config_hash(model)
+    checkpoint = TrainingCheckpoint(os.path.join(checkpoint_dir, key[:16]), callbacks, save_every,
+                                    config_hash=key)
+    if checkpoint.finished:
+        print('Huấn luyện đã hoàn tất ở epoch %d.' % checkpoint.initial_epoch)
+        checkpoint.restore(model)
+    else:
+        model.fit(train_ds,
+                  epochs=epochs,
+                  initial_epoch=checkpoint.initial_epoch,
+                  callbacks=callbacks + [checkpoint],
+                  verbose=verbose,
+                  **fit_kwargs)
+    checkpoint.report(epochs)
+
+    history = tf.keras.callbacks.History()
+    history.set_model(model)
+    history.history = checkpoint.history
+    history.epoch = list(range(len(checkpoint.epoch_times)))
+    return history
+
+
+def run_mode(mode, epochs=3, batch_size=32, steps_per_epoch=None):
+    """
+    Huấn luyện mô hình của mục 3 với một chế độ và trả về kết quả của epoch cuối.
+    Returns:
+        dict gồm val_accuracy, step_time_ms, images_per_sec, compile_time_s.
+    """
+    import cifar10_local
+    import cnn_model
+    import input_pipeline
+
+    compile_args = configure_training_mode(mode)
+    (x_train, y_train), (x_test, y_test) = cifar10_local.load_data()
+    y_train = tf.keras.utils.to_categorical(y_train, 10)
+    y_test = tf.keras.utils.to_categorical(y_test, 10)
+
+    model = cnn_model.compile_model(cnn_model.build_model(x_train.shape[1:], 10), **compile_args)
+    train_ds = input_pipeline.make_train_dataset(x_train, y_train, batch_size=batch_size, seed=0)
+    history = model.fit(train_ds.repeat() if steps_per_epoch else train_ds,
+                        steps_per_epoch=steps_per_epoch,
+                        epochs=epochs,
+                        validation_data=input_pipeline.make_eval_dataset(x_test, y_test),
+                        callbacks=[ThroughputLogger(batch_size)],
+                        verbose=0)
+    keys = ['val_accuracy', 'step_time_ms', 'images_per_sec']
+    result = {key: history.history[key][-1] for key in keys}
+    result['compile_time_s'] = history.history['compile_time_s'][0]
+    return result
+
+
+def compare_modes(modes=MODES, epochs=3, batch_size=32, steps_per_epoch=None):
+    """
+    Chạy từng chế độ trong một tiến trình riêng (chính sách dtype là toàn cục) và in bảng so sánh.
+    Returns:
+        dict chế độ -> kết quả của `run_mode`.
+    """
+    results = {}
+    for mode in modes:
+        command = [sys.executable, __file__, '--mode', mode, '--epochs', str(epochs),
+                   '--batch-size', str(batch_size)]
+        if steps_per_epoch:
+            command += ['--steps-per-epoch', str(steps_per_epoch)]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print('%-12s %12s %14s %14s %14s' % ('Chế độ', 'val_acc', 'ms/bước', 'ảnh/giây', 'biên dịch (s)'))
+    for mode, r in results.items():
+        print('%-12s %12.4f %14.2f %14.1f %14.2f' % (mode, r['val_accuracy'], r['step_time_ms'],
+                                                     r['images_per_sec'], r['compile_time_s']))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=MODES)
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--steps-per-epoch', type=int)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_modes(epochs=args.epochs, batch_size=args.batch_size, steps_per_epoch=args.steps_per_epoch)
+    else:
+        print(json.dumps(run_mode(args.mode or 'fp32', args.epochs, args.batch_size, args.steps_per_epoch)))
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Test-time augmentation (TTA): dự đoán trên K phiên bản biến đổi của mỗi ảnh rồi lấy trung bình softmax.
+
+Các phiên bản là phép biến đổi cố định nằm trong khoảng tăng cường lúc huấn luyện
+(AUGMENT_CONFIG: lật ngang, dịch 5% = 1.6 pixel với ảnh 32x32, fill_mode='nearest'):
+    K=1 ảnh gốc; K=2 thêm lật ngang; K=4 thêm dịch trái/phải 1 pixel;
+    K=8 thêm dịch lên/xuống 1 pixel và ảnh lật dịch trái/phải 1 pixel.
+K phiên bản của cả batch được tạo cùng lúc trong đồ thị (một lần pad viền kiểu
+nearest rồi cắt) và ghép thành một batch N*K duy nhất, nên mô hình chỉ chạy một
+lần cho mỗi batch thay vì K lần.
+
+Cách chạy (so sánh độ chính xác và độ trễ với K=1/2/4/8):
+    python tta.py --model saved_models/keras_cifar10_trained_model.keras
+"""
+
+import argparse
+import time
+
+import numpy as np
+import tensorflow as tf
+
+# (lật ngang, dịch dọc, dịch ngang) tính bằng pixel, theo thứ tự được thêm vào khi tăng K
+VIEWS = ((False, 0, 0), (True, 0, 0), (False, 0, 1), (False, 0, -1),
+         (False, 1, 0), (False, -1, 0), (True, 0, 1), (True, 0, -1))
+TTA_SIZES = (1, 2, 4, 8)
+
+
+def tta_views(images, k):
+    """
+    Tạo K phiên bản của batch ảnh.
+    Args:
+        images: Tensor (N, H, W, C).
+        k: Số phiên bản (1..len(VIEWS)).
+    Returns:
+        Tensor (K * N, H, W, C), xếp theo phiên bản: [view 0 của mọi ảnh, view 1 của mọi ảnh, ...].
+    """
+    if not 1 <= k <= len(VIEWS):
+        raise ValueError('Số phiên bản TTA phải từ 1 đến %d' % len(VIEWS))
+    if k == 1:
+        return images
+    height, width = images.shape[1], images.shape[2]
+    flipped = tf.reverse(images, axis=[2])
+    # Pad 1 pixel kiểu SYMMETRIC lặp lại pixel viền, tức fill_mode='nearest' khi dịch 1 pixel
+    padding = [[0, 0], [1, 1], [1, 1], [0, 0]]
+    padded = {False: tf.pad(images, padding, mode='SYMMETRIC'), True: tf.pad(flipped, padding, mode='SYMMETRIC')}
+    views = []
+    for flip, dy, dx in VIEWS[:k]:
+        views.append(padded[flip][:, 1 - dy:1 - dy + height, 1 - dx:1 - dx + width, :])
+    return tf.concat(views, axis=0)
+
+
+def average_views(probabilities, k):
+    """Trung bình xác suất (K * N, C) theo từng ảnh, trả về (N, C)."""
+    if k == 1:
+        return probabilities
+    return tf.reduce_mean(tf.reshape(probabilities, (k, -1, probabilities.shape[-1])), axis=0)
+
+
+def make_tta_forward(model, k, rescale=1. / 255):
+    """tf.function nhận ảnh uint8 (N, H, W, C) và trả về xác suất TTA (N, C) sau một lần chạy mô hình."""
+    @tf.function
+    def forward(images):
+        images = tf.cast(images, tf.float32) * rescale
+        return average_views(model(tta_views(images, k), training=False), k)
+    return forward
+
+
+def predict_tta(model, x, k=4, batch_size=256, forward=None):
+    """
+    Dự đoán xác suất TTA cho ảnh uint8 x (N, H, W, C).
+    Args:
+        batch_size: Số ảnh gốc mỗi batch (mô hình nhận batch_size * k ảnh).
+        forward: Hàm tạo bởi `make_tta_forward` (để dùng lại đồ thị đã trace).
+    Returns:
+        Mảng float32 (N, số lớp).
+    """
+    forward = forward or make_tta_forward(model, k)
+    outputs = [forward(np.asarray(x[start:start + batch_size])).numpy() for start in range(0, len(x), batch_size)]
+    if not outputs:
+        return np.zeros((0, model.output_shape[-1]), dtype=np.float32)
+    return np.concatenate(outputs)
+
+
+def tta_report(model, x, y, sizes=TTA_SIZES, batch_size=256, repeats=20):
+    """
+    So sánh độ chính xác, độ trễ (batch 1 ảnh) và thông lượng theo số phiên bản K.
+    Returns:
+        Danh sách dict: k, accuracy, loss, latency_b1_ms, images_per_sec.
+    """
+    import evaluation
+
+    extra_loss = float(sum(np.asarray(loss) for loss in model.losses)) if model.losses else 0.
+    rows = []
+    for k in sizes:
+        forward = make_tta_forward(model, k)
+        forward(np.asarray(x[:batch_size]))  # trace trước khi đo
+        start = time.perf_counter()
+        probabilities = predict_tta(model, x, k, batch_size, forward)
+        elapsed = time.perf_counter() - start
+        result = evaluation.evaluate_predictions(probabilities, y, extra_loss=extra_loss)
+
+        single = tf.constant(np.asarray(x[:1]))
+        forward(single)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            forward(single).numpy()
+            times.append(time.perf_counter() - start)
+        rows.append({'k': k, 'accuracy': result.accuracy, 'loss': result.loss,
+                     'latency_b1_ms': float(np.median(times) * 1000.), 'images_per_sec': len(x) / elapsed})
+
+    base = rows[0]
+    print('%3s %10s %10s %10s %12s %12s %10s' % ('K', 'accuracy', 'Δ acc', 'loss', 'ms (b=1)', 'ảnh/giây',
+                                                  'chi phí'))
+    for row in rows:
+        print('%3d %10.4f %+10.4f %10.4f %12.2f %12.1f %9.2fx' % (
+            row['k'], row['accuracy'], row['accuracy'] - base['accuracy'], row['loss'], row['latency_b1_ms'],
+            row['images_per_sec'], base['images_per_sec'] / row['images_per_sec']))
+    return rows
+
+
+if __name__ == '__main__':
+    import cifar10_local
+    from predictor import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(TTA_SIZES))
+    parser.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    _, (x_test, y_test) = cifar10_local.load_data()
+    tta_report(tf.keras.models.load_model(args.model), x_test, y_test, args.sizes, args.batch_size)